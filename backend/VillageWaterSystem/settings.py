@@ -218,3 +218,35 @@ CORS_ALLOW_HEADERS = [
 AFRICASTALKING_USERNAME = 'sandbox'
 AFRICASTALKING_API_KEY = 'sandbox'  # Sandbox API key is usually just 'sandbox' or provided in dashboard
 AFRICASTALKING_ENVIRONMENT = 'sandbox'
+
+# Tariff index invalidation stamp, shared by all gunicorn workers on this host;
+# use a shared volume when the API runs on more than one host
+TARIFF_INDEX_STAMP = os.environ.get('TARIFF_INDEX_STAMP', os.path.join(BASE_DIR, 'tariff_index.stamp'))
+
+# Rendered receipt PDFs, reused until the payment changes
+RECEIPT_CACHE_DIR = os.environ.get('RECEIPT_CACHE_DIR', os.path.join(BASE_DIR, 'receipt_cache'))
+
+# Billing jobs left Running this many seconds (their worker crashed) are queued again.
+# Keep it above the longest billing run; re-running a job never bills a household twice
+BILLING_JOB_TIMEOUT = int(os.environ.get('BILLING_JOB_TIMEOUT', '3600'))
+
+# Late penalty added once when the overdue sweep (manage.py sweep_overdue_bills,
+# scheduled hourly) moves a bill past its due date: a flat amount (RWF) plus a
+# percentage of the bill subtotal. No penalty unless configured
+OVERDUE_PENALTY_FLAT = os.environ.get('OVERDUE_PENALTY_FLAT', '0')
+OVERDUE_PENALTY_PERCENT = os.environ.get('OVERDUE_PENALTY_PERCENT', '0')
+
+# Shared secret Mobile Money providers send in the X-Callback-Token header.
+# Payment callbacks are refused while it is empty.
+PAYMENT_CALLBACK_TOKEN = os.environ.get('PAYMENT_CALLBACK_TOKEN', '')
+# Callbacks a worker claimed this many seconds ago without finishing (it crashed or
+# failed mid-batch) go back to Pending for the next worker
+PAYMENT_CALLBACK_CLAIM_TIMEOUT = int(os.environ.get('PAYMENT_CALLBACK_CLAIM_TIMEOUT', '600'))
+
+# Device sync: each pass re-reads rows changed in the SYNC_OVERLAP_SECONDS before the
+# previous pass, so rows of transactions still open then are not skipped. Keep it above
+# the longest write transaction (a single-process billing run, a payment or usage import).
+# Tombstones of deleted rows are kept SYNC_TOMBSTONE_DAYS, and devices that stay offline
+# longer download everything again
+SYNC_OVERLAP_SECONDS = int(os.environ.get('SYNC_OVERLAP_SECONDS', '900'))
+SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', '90'))
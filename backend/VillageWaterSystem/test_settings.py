@@ -4,6 +4,7 @@ This avoids MySQL database conflicts during testing
 """
 import os
 import sys
+import tempfile
 
 # Import settings but override database
 from pathlib import Path
@@ -15,13 +16,16 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Import everything from main settings except database
 from .settings import *
 
-# Override database to use SQLite for tests (no MySQL needed)
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': ':memory:',  # Use in-memory database for fastest tests
+# Override database to use SQLite for tests (no MySQL needed).
+# TEST_DATABASE=mysql keeps the MySQL database from settings.py (Django creates
+# test_<DB_NAME>), which the row-locking tests such as PaymentConcurrencyTests need
+if os.environ.get('TEST_DATABASE') != 'mysql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',  # Use in-memory database for fastest tests
+        }
     }
-}
 
 # Disable migrations for faster test setup
 class DisableMigrations:
@@ -31,3 +35,8 @@ class DisableMigrations:
         return None
 
 MIGRATION_MODULES = DisableMigrations()
+
+# Keep the tariff index stamp out of the source tree during tests
+TARIFF_INDEX_STAMP = os.path.join(tempfile.gettempdir(), 'village_water_test_tariff_index.stamp')
+RECEIPT_CACHE_DIR = tempfile.mkdtemp(prefix='village_water_test_receipts_')
+PAYMENT_CALLBACK_TOKEN = 'test-callback-token'
@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import User, Household, TariffRate, WaterUsage, Bill, Payment
+from .models import (
+    User, Household, TariffRate, WaterUsage, Bill, BillingJob, OverdueSweep, Payment, ReconciliationReport,
+    PaymentCallback, HouseholdAccountSummary, BalanceSnapshot,
+    HouseholdUsageStats, SyncTombstone
+)
 
 # Register models with admin site
 admin.site.register(User)
@@ -7,4 +11,12 @@ admin.site.register(Household)
 admin.site.register(TariffRate)
 admin.site.register(WaterUsage)
 admin.site.register(Bill)
+admin.site.register(BillingJob)
+admin.site.register(OverdueSweep)
 admin.site.register(Payment)
+admin.site.register(ReconciliationReport)
+admin.site.register(PaymentCallback)
+admin.site.register(HouseholdAccountSummary)
+admin.site.register(BalanceSnapshot)
+admin.site.register(HouseholdUsageStats)
+admin.site.register(SyncTombstone)
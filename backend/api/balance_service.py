@@ -0,0 +1,168 @@
+"""
+Historical balances for Village Water System
+
+Month-end BalanceSnapshot rows hold each household's cumulative billed and
+paid totals. A balance "as of" any date is the nearest snapshot on or
+before it plus the bills and payments dated after the snapshot, so the
+cost depends on the gap since the last month end, not on the length of
+the history.
+
+Bills count from their bill_date at their current total (penalties and
+re-bills included); cancelled bills are left out. Payments count from
+their payment_date when Completed. Later changes to bills and payments
+dated on or before a snapshot (overdue penalties, re-bills,
+cancellations, back-dated payments) are carried into it by
+BalanceSnapshot.apply_changes on the same write path, so an as-of answer
+does not depend on which snapshots exist.
+"""
+import calendar
+import logging
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+
+from .models import BalanceSnapshot, Bill, Payment
+
+logger = logging.getLogger(__name__)
+
+
+def month_end(period):
+    """Last day of a YYYY-MM period"""
+    year, month = int(period[:4]), int(period[5:7])
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+def previous_month_end(today=None):
+    today = today or date.today()
+    return today.replace(day=1) - timedelta(days=1)
+
+
+class BalanceService:
+    """Month-end balance snapshots and as-of balance queries"""
+
+    BATCH_SIZE = 1000
+
+    @staticmethod
+    def _billed(since=None, until=None, household_id=None):
+        bills = Bill.objects.exclude(status='Cancelled')
+        if household_id is not None:
+            bills = bills.filter(household_id=household_id)
+        if since:
+            bills = bills.filter(bill_date__gt=since)
+        if until:
+            bills = bills.filter(bill_date__lte=until)
+        return bills
+
+    @staticmethod
+    def _paid(since=None, until=None, household_id=None):
+        payments = Payment.objects.filter(payment_status='Completed')
+        if household_id is not None:
+            payments = payments.filter(bill__household_id=household_id)
+        if since:
+            payments = payments.filter(payment_date__gt=since)
+        if until:
+            payments = payments.filter(payment_date__lte=until)
+        return payments
+
+    @classmethod
+    def take_snapshot(cls, as_of):
+        """
+        Write (or rewrite) the snapshot of every household with any bills or
+        payments up to as_of. Starts from the previous snapshot date and
+        aggregates only the bills and payments since then.
+        Returns a summary.
+        """
+        previous = BalanceSnapshot.objects.filter(as_of__lt=as_of).aggregate(last=Max('as_of'))['last']
+
+        totals = {}
+        if previous:
+            for household_id, billed, paid in BalanceSnapshot.objects.filter(as_of=previous).values_list(
+                'household_id', 'billed_total', 'paid_total'
+            ):
+                totals[household_id] = [billed, paid]
+
+        for row in cls._billed(previous, as_of).values('household_id').annotate(
+            total=Sum('total_amount')
+        ).order_by():
+            totals.setdefault(row['household_id'], [Decimal('0'), Decimal('0')])[0] += row['total']
+
+        for row in cls._paid(previous, as_of).values('bill__household_id').annotate(
+            total=Sum('amount_paid')
+        ).order_by():
+            totals.setdefault(row['bill__household_id'], [Decimal('0'), Decimal('0')])[1] += row['total']
+
+        snapshots = [
+            BalanceSnapshot(
+                household_id=household_id,
+                as_of=as_of,
+                billed_total=billed,
+                paid_total=paid,
+                balance=billed - paid,
+            )
+            for household_id, (billed, paid) in sorted(totals.items())
+        ]
+        with transaction.atomic():
+            BalanceSnapshot.objects.bulk_create(
+                snapshots,
+                batch_size=cls.BATCH_SIZE,
+                update_conflicts=True,
+                # MySQL upserts on any unique key and rejects a conflict target
+                unique_fields=['household', 'as_of'] if connection.features.supports_update_conflicts_with_target else None,
+                update_fields=['billed_total', 'paid_total', 'balance'],
+            )
+
+        receivables = sum((snapshot.balance for snapshot in snapshots), Decimal('0.00'))
+        logger.info(f"Balance snapshot {as_of}: {len(snapshots)} households, {receivables} RWF receivable")
+        return {
+            'as_of': as_of,
+            'previous_snapshot': previous,
+            'households': len(snapshots),
+            'receivables': receivables,
+        }
+
+    @classmethod
+    def household_balance(cls, household_id, as_of):
+        """What the household owed at the end of as_of: one snapshot row plus the bills and payments since"""
+        snapshot = BalanceSnapshot.objects.filter(
+            household_id=household_id, as_of__lte=as_of
+        ).order_by('-as_of').first()
+        since = snapshot.as_of if snapshot else None
+
+        billed = cls._billed(since, as_of, household_id).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
+        paid = cls._paid(since, as_of, household_id).aggregate(total=Sum('amount_paid'))['total'] or Decimal('0')
+        if snapshot:
+            billed += snapshot.billed_total
+            paid += snapshot.paid_total
+
+        return {
+            'household_id': household_id,
+            'as_of': as_of,
+            'snapshot_date': since,
+            'billed_total': billed,
+            'paid_total': paid,
+            'balance': billed - paid,
+        }
+
+    @classmethod
+    def receivables(cls, as_of):
+        """Total owed by all households at the end of as_of, from the nearest snapshot date plus the delta"""
+        since = BalanceSnapshot.objects.filter(as_of__lte=as_of).aggregate(last=Max('as_of'))['last']
+
+        billed = cls._billed(since, as_of).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
+        paid = cls._paid(since, as_of).aggregate(total=Sum('amount_paid'))['total'] or Decimal('0')
+        if since:
+            base = BalanceSnapshot.objects.filter(as_of=since).aggregate(
+                billed=Sum('billed_total'), paid=Sum('paid_total')
+            )
+            billed += base['billed'] or Decimal('0')
+            paid += base['paid'] or Decimal('0')
+
+        return {
+            'as_of': as_of,
+            'snapshot_date': since,
+            'billed_total': billed,
+            'paid_total': paid,
+            'receivables': billed - paid,
+        }
@@ -0,0 +1,670 @@
+"""
+Monthly billing engine for Village Water System
+"""
+import logging
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, Max, Min, Sum, Value, When
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from .models import BalanceSnapshot, Household, HouseholdAccountSummary, WaterUsage, Bill, BillingJob, OverdueSweep
+from .notification_service import NotificationService
+from .sequences import bill_numbers
+from .tariff_service import get_tariff_index, period_end
+from .tariff_calculator import ChargeCalculator
+from .sms_service import sms_service
+
+logger = logging.getLogger(__name__)
+
+BILLING_PERIOD = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+
+class BillingError(Exception):
+    """Raised when a billing run cannot start (e.g. no active tariff)"""
+
+
+class BillingService:
+    """
+    Set-based billing for one billing period.
+
+    The whole run loads households, usages and existing bills in a fixed
+    number of queries, computes charges in memory and writes everything
+    back with bulk statements inside a single transaction.
+    """
+
+    BATCH_SIZE = 1000
+
+    SHARD_FIELDS = {
+        'sector': ['sector'],
+        'cell': ['sector', 'cell'],
+        'village': ['sector', 'cell', 'village'],
+    }
+
+    SKIP_MESSAGES = {
+        'already_billed': 'Bill already exists for {code}',
+        'missing_usage': 'No usage record found for {code}',
+    }
+
+    def __init__(self, billing_period, generated_by=None, household_id=None, shard_filters=None, billing_job_id=None):
+        self.validate_period(billing_period)
+        self.billing_period = billing_period
+        self.generated_by = generated_by
+        self.household_id = household_id
+        self.billing_job_id = billing_job_id
+        # Household lookups restricting the run to one shard, e.g. {'sector': 'Kimironko'}
+        self.shard_filters = shard_filters or {}
+
+    @staticmethod
+    def validate_period(billing_period):
+        """Raise BillingError unless billing_period is a YYYY-MM month"""
+        if not isinstance(billing_period, str) or not BILLING_PERIOD.match(billing_period):
+            raise BillingError(f"Invalid billing period '{billing_period}' (format: YYYY-MM)")
+
+    def get_households(self):
+        """Active households in scope, with only the columns billing needs"""
+        households = Household.objects.filter(status='Active').only(
+            'household_id', 'household_code', 'phone_number', 'number_of_members', 'user_id'
+        )
+        if self.household_id:
+            households = households.filter(household_id=self.household_id)
+        if self.shard_filters:
+            households = households.filter(**self.shard_filters)
+        return list(households.order_by('household_id'))
+
+    def plan(self, tariff=None):
+        """
+        Work out the run in memory without writing anything.
+
+        `tariff` bills the whole period at one (possibly inactive) tariff
+        instead of the effective-dated ones, for trying out a new tariff.
+        Returns a dict with the tariff, the billable households with their
+        charges, and the skipped households as (household, reason) pairs,
+        reason being 'already_billed' or 'missing_usage'.
+        """
+        if tariff is not None:
+            segments = [(tariff, period_end(self.billing_period).day)]
+        else:
+            segments = get_tariff_index().segments_for_period(self.billing_period)
+        if not segments:
+            raise BillingError(f'No active tariff rate found for {self.billing_period}')
+        calculator = ChargeCalculator(segments)
+
+        households = self.get_households()
+
+        bills_qs = Bill.objects.filter(billing_period=self.billing_period)
+        usages_qs = WaterUsage.objects.filter(reading_month=self.billing_period)
+        if self.household_id:
+            bills_qs = bills_qs.filter(household_id=self.household_id)
+            usages_qs = usages_qs.filter(household_id=self.household_id)
+        if self.shard_filters:
+            related = {f'household__{key}': value for key, value in self.shard_filters.items()}
+            bills_qs = bills_qs.filter(**related)
+            usages_qs = usages_qs.filter(**related)
+
+        billed = set(bills_qs.values_list('household_id', flat=True))
+        usages = {
+            household_id: (usage_id, liters_used)
+            for usage_id, household_id, liters_used
+            in usages_qs.values_list('usage_id', 'household_id', 'liters_used')
+        }
+
+        billable = []
+        skipped = []
+        for household in households:
+            if household.household_id in billed:
+                skipped.append((household, 'already_billed'))
+                continue
+
+            usage = usages.get(household.household_id)
+            if usage is None:
+                skipped.append((household, 'missing_usage'))
+                continue
+
+            billable.append((household, usage))
+
+        # One vectorized pass over every billable household
+        charges = calculator.calculate(
+            [liters for household, (usage_id, liters) in billable],
+            [household.number_of_members for household, usage in billable]
+        )
+
+        return {
+            'tariff': calculator.primary_tariff,
+            'households_processed': len(households),
+            'billable': [
+                (household, usage_id, liters, rate_applied, subtotal, discount, total)
+                for (household, (usage_id, liters)), rate_applied, subtotal, discount, total in zip(
+                    billable, charges['rate_applied'], charges['subtotal'], charges['discount'], charges['total']
+                )
+            ],
+            'skipped': skipped,
+        }
+
+    def run(self):
+        """
+        Bill every active household in scope for the period.
+        Returns a dict with the created bills and a list of error strings.
+        """
+        plan = self.plan()
+        bill_date = date.today()
+        due_date = bill_date + timedelta(days=30)
+
+        errors = [
+            self.SKIP_MESSAGES[reason].format(code=household.household_code)
+            for household, reason in plan['skipped']
+        ]
+
+        bills = [
+            Bill(
+                household=household,
+                usage_id=usage_id,
+                tariff=plan['tariff'],
+                liters_consumed=liters_consumed,
+                rate_applied=rate_applied,
+                subtotal=subtotal,
+                discount_amount=discount,
+                total_amount=total,
+                balance_due=total,
+                bill_date=bill_date,
+                due_date=due_date,
+                billing_period=self.billing_period,
+                generated_by=self.generated_by,
+                billing_job_id=self.billing_job_id,
+            )
+            for household, usage_id, liters_consumed, rate_applied, subtotal, discount, total in plan['billable']
+        ]
+
+        if bills:
+            with transaction.atomic():
+                # Lock the households, then drop those a concurrent run billed
+                # since plan(); the (household, billing_period) constraint only
+                # backs this up, so any insert error fails the run
+                billed = self.lock_households([bill.household_id for bill in bills])
+                created = []
+                for bill in bills:
+                    if bill.household_id in billed:
+                        errors.append(self.SKIP_MESSAGES['already_billed'].format(code=bill.household.household_code))
+                    else:
+                        created.append(bill)
+                bills = created
+
+                for bill, bill_number in zip(bills, bill_numbers(len(bills))):
+                    bill.bill_number = bill_number
+                Bill.objects.bulk_create(bills, batch_size=self.BATCH_SIZE)
+                # MySQL does not return the new ids from a bulk insert
+                inserted = {}
+                for start in range(0, len(bills), self.BATCH_SIZE):
+                    inserted.update(Bill.objects.filter(
+                        bill_number__in=[bill.bill_number for bill in bills[start:start + self.BATCH_SIZE]]
+                    ).values_list('bill_number', 'bill_id'))
+                for bill in bills:
+                    bill.bill_id = inserted[bill.bill_number]
+
+                WaterUsage.objects.filter(
+                    usage_id__in=[bill.usage_id for bill in bills]
+                ).update(status='Billed', updated_at=timezone.now())
+                HouseholdAccountSummary.record_bills(bills)
+                BalanceSnapshot.apply_changes(
+                    (bill.household_id, bill.bill_date, bill.total_amount, Decimal('0')) for bill in bills
+                )
+                # Notify once the bills are committed, not while the households are locked
+                transaction.on_commit(lambda: self.notify_bills(bills))
+
+        logger.info(
+            f"Billing run {self.billing_period}: {len(bills)} bills created, "
+            f"{len(errors)} households skipped"
+        )
+
+        return {
+            'households_processed': plan['households_processed'],
+            'bills': bills,
+            'total_amount': sum((bill.total_amount for bill in bills), Decimal('0.00')),
+            'errors': errors,
+        }
+
+    @staticmethod
+    def notify_bills(bills):
+        """Send the SMS and admin notifications for newly created bills"""
+        try:
+            sms_service.send_bill_notifications(bills)
+            NotificationService.notify_new_bills(bills)
+        except Exception as e:
+            logger.error(f"Failed to send bill notifications: {e}")
+
+    def lock_households(self, household_ids):
+        """
+        Lock the households (in household_id order, so concurrent runs do not
+        deadlock) and return the ids of those that already have a bill for
+        the period. Must run inside a transaction; the bill lookup is a
+        locking read so it sees bills committed after the transaction began.
+        """
+        household_ids = sorted(household_ids)
+        billed = set()
+        for start in range(0, len(household_ids), self.BATCH_SIZE):
+            batch = household_ids[start:start + self.BATCH_SIZE]
+            list(Household.objects.select_for_update().filter(household_id__in=batch)
+                 .order_by('household_id').values_list('household_id', flat=True))
+            billed.update(Bill.objects.select_for_update().filter(
+                household_id__in=batch, billing_period=self.billing_period
+            ).values_list('household_id', flat=True))
+        return billed
+
+    def rebill(self):
+        """
+        Recompute the Pending bills of the period flagged needs_rebill (after a
+        reading correction or tariff edit) and update them in bulk.
+        Only the flagged bills are read and written.
+        """
+        segments = get_tariff_index().segments_for_period(self.billing_period)
+        if not segments:
+            raise BillingError(f'No active tariff rate found for {self.billing_period}')
+        calculator = ChargeCalculator(segments)
+
+        bills_qs = Bill.objects.filter(
+            billing_period=self.billing_period, status='Pending', needs_rebill=True
+        ).select_related('usage', 'household')
+        if self.household_id:
+            bills_qs = bills_qs.filter(household_id=self.household_id)
+        if self.shard_filters:
+            bills_qs = bills_qs.filter(**{f'household__{key}': value for key, value in self.shard_filters.items()})
+
+        with transaction.atomic():
+            bills = list(bills_qs.order_by('bill_id'))
+            liters = [bill.usage.liters_used if bill.usage else bill.liters_consumed for bill in bills]
+            charges = calculator.calculate(liters, [bill.household.number_of_members for bill in bills])
+
+            changes = []
+            snapshot_changes = []
+            for bill, liters_consumed, rate_applied, subtotal, discount in zip(
+                bills, liters, charges['rate_applied'], charges['subtotal'], charges['discount']
+            ):
+                old_total = bill.total_amount
+                bill.tariff = calculator.primary_tariff
+                bill.liters_consumed = liters_consumed
+                bill.rate_applied = rate_applied
+                bill.subtotal = subtotal
+                bill.discount_amount = discount
+                bill.total_amount = subtotal + bill.penalty_amount - discount
+                bill.needs_rebill = False
+                snapshot_changes.append((bill.household_id, bill.bill_date, bill.total_amount - old_total, Decimal('0')))
+                changes.append({
+                    'bill_number': bill.bill_number,
+                    'household_code': bill.household.household_code,
+                    'old_total': old_total,
+                    'new_total': bill.total_amount,
+                })
+
+            Bill.objects.bulk_update(
+                bills,
+                ['tariff', 'liters_consumed', 'rate_applied', 'subtotal', 'discount_amount',
+                 'total_amount', 'needs_rebill'],
+                batch_size=self.BATCH_SIZE
+            )
+            # Derive the balance in SQL so payments posted meanwhile are not overwritten;
+            # a bill whose new total is already covered by its payments becomes Paid
+            for start in range(0, len(bills), self.BATCH_SIZE):
+                Bill.objects.filter(
+                    bill_id__in=[bill.bill_id for bill in bills[start:start + self.BATCH_SIZE]]
+                ).update(
+                    status=Case(When(total_amount__lte=F('amount_paid'), then=Value('Paid')), default=F('status')),
+                    balance_due=F('total_amount') - F('amount_paid'),
+                    updated_at=timezone.now(),
+                )
+            HouseholdAccountSummary.refresh(bill.household_id for bill in bills)
+            BalanceSnapshot.apply_changes(snapshot_changes)
+
+        logger.info(f"Re-billed {len(bills)} bills for {self.billing_period}")
+
+        return {
+            'billing_period': self.billing_period,
+            'bills_updated': len(bills),
+            'bills': changes,
+        }
+
+    def preview(self, tariff=None):
+        """
+        Dry run: the lines a run would produce, without writing bills or
+        sending SMS. The plan is computed up front (so errors such as a
+        missing tariff raise before anything is yielded); the returned
+        generator then yields one dict per household and a summary last.
+        """
+        plan = self.plan(tariff=tariff)
+        return self._preview_lines(plan)
+
+    def _preview_lines(self, plan):
+        counts = {'already_billed': 0, 'missing_usage': 0}
+        subtotal_sum = Decimal('0.00')
+        discount_sum = Decimal('0.00')
+        grand_total = Decimal('0.00')
+
+        for household, usage_id, liters_consumed, rate_applied, subtotal, discount, total in plan['billable']:
+            subtotal_sum += subtotal
+            discount_sum += discount
+            grand_total += total
+            yield {
+                'type': 'bill',
+                'household_id': household.household_id,
+                'household_code': household.household_code,
+                'usage_id': usage_id,
+                'liters_consumed': liters_consumed,
+                'rate_applied': rate_applied,
+                'subtotal': subtotal,
+                'discount_amount': discount,
+                'total_amount': total,
+            }
+
+        for household, reason in plan['skipped']:
+            counts[reason] += 1
+            yield {
+                'type': reason,
+                'household_id': household.household_id,
+                'household_code': household.household_code,
+                'message': self.SKIP_MESSAGES[reason].format(code=household.household_code),
+            }
+
+        yield {
+            'type': 'summary',
+            'dry_run': True,
+            'billing_period': self.billing_period,
+            'tariff_id': plan['tariff'].tariff_id,
+            'rate_name': plan['tariff'].rate_name,
+            'households_processed': plan['households_processed'],
+            'bills': len(plan['billable']),
+            'already_billed': counts['already_billed'],
+            'missing_usage': counts['missing_usage'],
+            'subtotal': subtotal_sum,
+            'discount_amount': discount_sum,
+            'grand_total': grand_total,
+        }
+
+    @classmethod
+    def sweep_overdue(cls, as_of=None, batch_size=10000):
+        """
+        Move every Pending bill whose due_date has passed to Overdue and add
+        the late penalty: OVERDUE_PENALTY_FLAT plus OVERDUE_PENALTY_PERCENT
+        of the subtotal. Bills are updated with one UPDATE per bill_id range
+        of batch_size rows, never loaded. Overdue bills no longer match, so
+        the penalty is applied once and the sweep is safe to repeat.
+        Returns the OverdueSweep record.
+        """
+        as_of = as_of or date.today()
+        flat = Decimal(str(getattr(settings, 'OVERDUE_PENALTY_FLAT', '0')))
+        percent = Decimal(str(getattr(settings, 'OVERDUE_PENALTY_PERCENT', '0')))
+        sweep = OverdueSweep.objects.create(as_of=as_of, penalty_flat=flat, penalty_percent=percent)
+
+        money = DecimalField(max_digits=10, decimal_places=2)
+        penalty = ExpressionWrapper(
+            Value(flat, output_field=money) + Round(F('subtotal') * Value(percent) / Value(100), 2),
+            output_field=money
+        )
+
+        past_due = Bill.objects.filter(status='Pending', due_date__lt=as_of)
+        bounds = past_due.aggregate(first=Min('bill_id'), last=Max('bill_id'))
+        last_snapshot = BalanceSnapshot.objects.aggregate(last=Max('as_of'))['last']
+
+        updated = 0
+        if bounds['first'] is not None:
+            for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+                in_range = past_due.filter(bill_id__gte=start, bill_id__lt=start + batch_size)
+                with transaction.atomic():
+                    # Every swept bill moves from pending to overdue and adds its penalty
+                    # to the household's outstanding balance
+                    deltas = {
+                        row['household_id']: {
+                            'pending_bills_count': -row['bills'],
+                            'overdue_bills_count': row['bills'],
+                            'outstanding_balance': row['penalty'],
+                        }
+                        for row in in_range.values('household_id').annotate(
+                            bills=Count('bill_id'), penalty=Sum(penalty)
+                        ).order_by()
+                    }
+                    # Penalties on bills dated before the last snapshot change the snapshots too
+                    snapshot_changes = [] if last_snapshot is None else [
+                        (row['household_id'], row['bill_date'], row['penalty'], Decimal('0'))
+                        for row in in_range.filter(bill_date__lte=last_snapshot).values(
+                            'household_id', 'bill_date'
+                        ).annotate(penalty=Sum(penalty)).order_by()
+                    ]
+                    # Both assignments read only columns this UPDATE leaves alone (or
+                    # themselves), so the result does not depend on SET evaluation order
+                    updated += in_range.update(
+                        status='Overdue',
+                        penalty_amount=F('penalty_amount') + penalty,
+                        total_amount=F('total_amount') + penalty,
+                        balance_due=F('balance_due') + penalty,
+                        updated_at=timezone.now(),
+                    )
+                    HouseholdAccountSummary.apply_deltas(deltas)
+                    BalanceSnapshot.apply_changes(snapshot_changes)
+
+        sweep.bills_updated = updated
+        sweep.finished_at = timezone.now()
+        sweep.save(update_fields=['bills_updated', 'finished_at'])
+
+        logger.info(f"Overdue sweep as of {as_of}: {updated} bills moved to Overdue")
+        return sweep
+
+    @staticmethod
+    def release_stale_jobs():
+        """
+        Put jobs left Running for more than BILLING_JOB_TIMEOUT seconds (their
+        worker died) back to Queued. Returns how many. Re-running a job is
+        safe: households billed by the first attempt are skipped as already
+        billed, and the first worker's outcome is dropped if it finishes late.
+        """
+        stale = timezone.now() - timedelta(seconds=settings.BILLING_JOB_TIMEOUT)
+        released = BillingJob.objects.filter(status='Running', started_at__lt=stale).update(
+            status='Queued',
+            started_at=None
+        )
+        if released:
+            logger.warning(f"Requeued {released} billing jobs from stale claims")
+        return released
+
+    @classmethod
+    def claim_next_job(cls):
+        """
+        Atomically move the oldest queued job to Running and return it.
+        The conditional UPDATE lets several workers poll the same queue.
+        """
+        cls.release_stale_jobs()
+        queued = BillingJob.objects.filter(status='Queued').order_by('created_date', 'job_id')
+        for job_id in queued.values_list('job_id', flat=True)[:10]:
+            claimed = BillingJob.objects.filter(job_id=job_id, status='Queued').update(
+                status='Running',
+                started_at=timezone.now()
+            )
+            if claimed:
+                return BillingJob.objects.get(job_id=job_id)
+        return None
+
+    @classmethod
+    def process_job(cls, job, workers=1, shard_by=None):
+        """
+        Run a claimed billing job and record its outcome on the job row.
+        Whole-village jobs are sharded across worker processes when shard_by is given.
+        """
+        try:
+            if shard_by and not job.household_id:
+                result = cls.run_parallel(
+                    job.billing_period,
+                    generated_by_id=job.requested_by_id,
+                    shard_by=shard_by,
+                    workers=workers,
+                    billing_job_id=job.job_id
+                )
+            else:
+                result = cls(
+                    job.billing_period,
+                    generated_by=job.requested_by,
+                    household_id=job.household_id,
+                    billing_job_id=job.job_id
+                ).run()
+                result = {
+                    'households_processed': result['households_processed'],
+                    'bills_created': len(result['bills']),
+                    'total_amount': result['total_amount'],
+                    'errors': result['errors'],
+                    'shards': [],
+                }
+        except Exception as e:
+            logger.error(f"Billing job {job.job_id} failed: {e}")
+            job.status = 'Failed'
+            job.errors = [str(e)]
+        else:
+            job.status = 'Completed'
+            job.households_processed = result['households_processed']
+            job.bills_created = result['bills_created']
+            job.total_amount = result['total_amount']
+            job.errors = result['errors']
+            job.shards = result['shards']
+
+        job.finished_at = timezone.now()
+        # Only the worker holding the current claim records the outcome
+        BillingJob.objects.filter(job_id=job.job_id, status='Running', started_at=job.started_at).update(
+            status=job.status,
+            households_processed=job.households_processed,
+            bills_created=job.bills_created,
+            total_amount=job.total_amount,
+            errors=job.errors,
+            shards=job.shards,
+            finished_at=job.finished_at
+        )
+        return job
+
+    @classmethod
+    def plan_shards(cls, shard_by='sector', shard_count=8):
+        """
+        Split the active households into shards.
+        shard_by is 'sector', 'cell' or 'village' (one shard per distinct area)
+        or 'pk' (shard_count contiguous household_id ranges of equal size).
+        Returns a list of {'label': str, 'filters': dict} specs.
+        """
+        households = Household.objects.filter(status='Active')
+
+        if shard_by == 'pk':
+            ids = list(households.order_by('household_id').values_list('household_id', flat=True))
+            if not ids:
+                return []
+            size = -(-len(ids) // max(shard_count, 1))
+            shards = []
+            for start in range(0, len(ids), size):
+                chunk = ids[start:start + size]
+                shards.append({
+                    'label': f'households {chunk[0]}-{chunk[-1]}',
+                    'filters': {'household_id__gte': chunk[0], 'household_id__lte': chunk[-1]},
+                })
+            return shards
+
+        if shard_by not in cls.SHARD_FIELDS:
+            raise BillingError(f"Unknown shard key '{shard_by}' (use sector, cell, village or pk)")
+
+        fields = cls.SHARD_FIELDS[shard_by]
+        areas = households.order_by(*fields).values_list(*fields).distinct()
+        return [
+            {
+                'label': ' / '.join(value or 'Unassigned' for value in area),
+                'filters': dict(zip(fields, area)),
+            }
+            for area in areas
+        ]
+
+    @classmethod
+    def run_parallel(cls, billing_period, generated_by_id=None, shard_by='sector', workers=8, billing_job_id=None):
+        """
+        Bill the period shard by shard in a pool of worker processes.
+        Every shard runs in its own process, connection and transaction and
+        reports its own errors; the shard reports are merged into one summary.
+        """
+        cls.validate_period(billing_period)
+        if not get_tariff_index().segments_for_period(billing_period):
+            raise BillingError(f'No active tariff rate found for {billing_period}')
+
+        started = time.monotonic()
+        shards = cls.plan_shards(shard_by, shard_count=workers)
+        reports = []
+
+        if workers <= 1:
+            reports = [_bill_shard(billing_period, generated_by_id, shard, billing_job_id) for shard in shards]
+        else:
+            # Forked workers must not share the parent's database sockets
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_shard_worker) as pool:
+                futures = {
+                    pool.submit(_bill_shard, billing_period, generated_by_id, shard, billing_job_id): shard
+                    for shard in shards
+                }
+                for future in as_completed(futures):
+                    try:
+                        reports.append(future.result())
+                    except Exception as e:
+                        reports.append(_shard_report(futures[future], errors=[f"Shard crashed: {e}"]))
+
+        reports.sort(key=lambda report: report['shard'])
+        summary = {
+            'households_processed': sum(report['households_processed'] for report in reports),
+            'bills_created': sum(report['bills_created'] for report in reports),
+            'total_amount': sum((Decimal(report['total_amount']) for report in reports), Decimal('0.00')),
+            'errors': [error for report in reports for error in report['errors']],
+            'shards': reports,
+            'elapsed_seconds': round(time.monotonic() - started, 3),
+        }
+        logger.info(
+            f"Parallel billing run {billing_period}: {len(reports)} shards, "
+            f"{summary['bills_created']} bills created in {summary['elapsed_seconds']}s"
+        )
+        return summary
+
+
+def _init_shard_worker():
+    """Process pool initializer: make sure Django is ready and holds no inherited connections"""
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _shard_report(shard, households_processed=0, bills_created=0, total_amount=0, errors=None, elapsed_seconds=0):
+    return {
+        'shard': shard['label'],
+        'households_processed': households_processed,
+        'bills_created': bills_created,
+        'total_amount': str(total_amount),
+        'errors': errors or [],
+        'elapsed_seconds': elapsed_seconds,
+    }
+
+
+def _bill_shard(billing_period, generated_by_id, shard, billing_job_id=None):
+    """Bill one shard; runs inside a pool worker so it must stay module-level and picklable"""
+    from .models import User
+
+    started = time.monotonic()
+    try:
+        generated_by = User.objects.filter(user_id=generated_by_id).first() if generated_by_id else None
+        result = BillingService(
+            billing_period,
+            generated_by=generated_by,
+            shard_filters=shard['filters'],
+            billing_job_id=billing_job_id
+        ).run()
+    except Exception as e:
+        logger.error(f"Billing shard {shard['label']} failed: {e}")
+        return _shard_report(shard, errors=[f"{shard['label']}: {e}"],
+                             elapsed_seconds=round(time.monotonic() - started, 3))
+
+    return _shard_report(
+        shard,
+        households_processed=result['households_processed'],
+        bills_created=len(result['bills']),
+        total_amount=result['total_amount'],
+        errors=result['errors'],
+        elapsed_seconds=round(time.monotonic() - started, 3),
+    )
@@ -0,0 +1,53 @@
+"""
+Backfill of Bill.amount_paid and Bill.balance_due from existing payments.
+Migration 0011 runs the same backfill; use this after bulk data fixes done
+outside the application.
+
+Usage:
+    python manage.py backfill_bill_balances
+    python manage.py backfill_bill_balances --batch-size 5000
+
+Runs one UPDATE per bill_id range; safe to re-run.
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import DecimalField, F, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from api.models import Bill, HouseholdAccountSummary, Payment
+
+
+class Command(BaseCommand):
+    help = 'Recompute amount_paid and balance_due on every bill from its completed payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Bills per UPDATE statement')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        money = DecimalField(max_digits=10, decimal_places=2)
+        paid = Coalesce(
+            Subquery(
+                Payment.objects.filter(bill_id=OuterRef('bill_id'), payment_status='Completed')
+                .values('bill_id')
+                .annotate(total=Sum('amount_paid'))
+                .values('total'),
+                output_field=money
+            ),
+            Value(0, output_field=money)
+        )
+
+        bounds = Bill.objects.aggregate(first=Min('bill_id'), last=Max('bill_id'))
+        updated = 0
+        if bounds['first'] is not None:
+            for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+                # balance_due is assigned from total_amount and the subquery only,
+                # so it does not depend on amount_paid being updated first
+                updated += Bill.objects.filter(bill_id__gte=start, bill_id__lt=start + batch_size).update(
+                    balance_due=F('total_amount') - paid,
+                    amount_paid=paid,
+                    updated_at=timezone.now(),
+                )
+
+        HouseholdAccountSummary.refresh()
+        self.stdout.write(f'Backfilled balances on {updated} bills')
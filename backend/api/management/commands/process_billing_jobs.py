@@ -0,0 +1,54 @@
+"""
+Billing worker: processes queued BillingJob rows out of band
+
+Usage:
+    python manage.py process_billing_jobs            # poll forever
+    python manage.py process_billing_jobs --once     # drain the queue and exit
+    python manage.py process_billing_jobs --workers 8 --shard-by sector
+                                                     # bill whole-village jobs in 8 processes
+
+Run it as its own supervised service (it is not started by the web process).
+Jobs left Running by a worker that died are requeued after BILLING_JOB_TIMEOUT.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.billing_service import BillingService
+
+
+class Command(BaseCommand):
+    help = 'Process queued billing jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when idle')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes for sharded runs')
+        parser.add_argument('--shard-by', choices=['sector', 'cell', 'village', 'pk'],
+                            help='Split whole-village jobs into shards billed in parallel')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Billing worker started')
+
+        while True:
+            close_old_connections()
+            job = BillingService.claim_next_job()
+
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Processing billing job {job.job_id} ({job.billing_period})...')
+            job = BillingService.process_job(job, workers=options['workers'], shard_by=options['shard_by'])
+            self.stdout.write(
+                f'Job {job.job_id} {job.status}: {job.bills_created} bills created, '
+                f'{len(job.errors)} errors in {job.elapsed_seconds}s'
+            )
+            for shard in job.shards:
+                self.stdout.write(
+                    f"  {shard['shard']}: {shard['bills_created']} bills, "
+                    f"{len(shard['errors'])} errors in {shard['elapsed_seconds']}s"
+                )
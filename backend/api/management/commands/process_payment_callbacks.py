@@ -0,0 +1,49 @@
+"""
+Payment callback worker: applies queued Mobile Money callbacks to bills
+
+Usage:
+    python manage.py process_payment_callbacks                 # poll forever
+    python manage.py process_payment_callbacks --once          # drain the inbox and exit
+    python manage.py process_payment_callbacks --batch-size 2000
+
+Callbacks left in Processing by a worker that died mid-batch are put back
+to Pending after PAYMENT_CALLBACK_CLAIM_TIMEOUT seconds and applied again.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.payment_service import PaymentService
+
+
+class Command(BaseCommand):
+    help = 'Apply queued payment callbacks to bills in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the inbox is empty')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when idle')
+        parser.add_argument('--batch-size', type=int, default=PaymentService.BATCH_SIZE,
+                            help='Callbacks applied per batch')
+        parser.add_argument('--no-notify', action='store_true', help='Do not send SMS or admin notifications')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Payment callback worker started')
+
+        while True:
+            close_old_connections()
+            callbacks = PaymentService.claim_callbacks(options['batch_size'])
+
+            if not callbacks:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            started = time.monotonic()
+            summary = PaymentService.apply_callbacks(callbacks, notify=not options['no_notify'])
+            self.stdout.write(
+                f"Applied {summary['applied']} of {summary['callbacks']} callbacks "
+                f"({summary['duplicates']} duplicates, {summary['rejected']} rejected) "
+                f"in {time.monotonic() - started:.3f}s"
+            )
@@ -0,0 +1,29 @@
+"""
+Delete sync tombstones older than the retention period
+
+Usage:
+    python manage.py prune_sync_tombstones              # older than SYNC_TOMBSTONE_DAYS
+    python manage.py prune_sync_tombstones --days 180
+
+Devices whose last sync is older than SYNC_TOMBSTONE_DAYS are told to
+download everything again, so they never need the pruned tombstones.
+Schedule daily.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.sync_service import SyncService
+
+
+class Command(BaseCommand):
+    help = 'Delete tombstones of deleted rows that no device can still need'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SYNC_TOMBSTONE_DAYS,
+                            help='Keep tombstones this many days')
+
+    def handle(self, *args, **options):
+        if options['days'] < settings.SYNC_TOMBSTONE_DAYS:
+            raise CommandError(f'--days must be at least SYNC_TOMBSTONE_DAYS ({settings.SYNC_TOMBSTONE_DAYS})')
+        deleted = SyncService.prune_tombstones(options['days'])
+        self.stdout.write(f'Deleted {deleted} sync tombstones')
@@ -0,0 +1,41 @@
+"""
+Rebuild the household account summaries from usages, bills and payments
+
+Usage:
+    python manage.py rebuild_account_summaries
+    python manage.py rebuild_account_summaries --household HH-2024-0001
+    python manage.py rebuild_account_summaries --batch-size 5000
+
+Migration 0016 fills the summaries and they are maintained as data
+changes; run this after bulk data fixes done outside the application, or
+whenever a summary is suspected to have drifted. Safe to re-run.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Household, HouseholdAccountSummary
+
+
+class Command(BaseCommand):
+    help = 'Recompute household account summaries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--household', action='append', help='Household code (repeatable); default all')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Households per batch')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['household']:
+            household_ids = list(Household.objects.filter(
+                household_code__in=options['household']
+            ).values_list('household_id', flat=True))
+            if len(household_ids) != len(set(options['household'])):
+                raise CommandError('Unknown household code')
+        else:
+            household_ids = list(Household.objects.order_by('household_id').values_list('household_id', flat=True))
+
+        HouseholdAccountSummary.refresh(household_ids, batch_size=options['batch_size'])
+        self.stdout.write(
+            f'Rebuilt {len(household_ids)} account summaries in {time.monotonic() - started:.3f}s'
+        )
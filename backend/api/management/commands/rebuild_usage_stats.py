@@ -0,0 +1,46 @@
+"""
+Rebuild the per-household usage statistics and the usage anomaly flags
+
+Usage:
+    python manage.py rebuild_usage_stats
+    python manage.py rebuild_usage_stats --household HH-2024-0001
+    python manage.py rebuild_usage_stats --batch-size 5000
+
+New readings update the statistics as they are saved, and migration 0018
+builds them for existing readings; run this after bulk data fixes done
+outside the application, or after changing HouseholdUsageStats.ANOMALY_FACTOR.
+Safe to re-run.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Household, HouseholdUsageStats, WaterUsage
+
+
+class Command(BaseCommand):
+    help = 'Recompute household usage statistics and usage anomaly flags'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--household', action='append', help='Household code (repeatable); default all')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Households per batch')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['household']:
+            household_ids = list(Household.objects.filter(
+                household_code__in=options['household']
+            ).values_list('household_id', flat=True))
+            if len(household_ids) != len(set(options['household'])):
+                raise CommandError('Unknown household code')
+        else:
+            household_ids = list(Household.objects.order_by('household_id').values_list('household_id', flat=True))
+
+        HouseholdUsageStats.refresh(household_ids, batch_size=options['batch_size'])
+        anomalies = WaterUsage.objects.filter(is_anomaly=True)
+        if options['household']:
+            anomalies = anomalies.filter(household_id__in=household_ids)
+        self.stdout.write(
+            f'Rebuilt usage statistics of {len(household_ids)} households '
+            f'({anomalies.count()} anomalous readings) in {time.monotonic() - started:.3f}s'
+        )
@@ -0,0 +1,54 @@
+"""
+Reconcile a provider statement CSV against recorded payments
+
+Usage:
+    python manage.py reconcile_statement statement.csv --from 2024-01-01 --to 2024-01-31
+    python manage.py reconcile_statement statement.csv --from 2024-01-01 --to 2024-01-31 \
+        --provider "MTN MoMo" --payment-method "Mobile Money"
+
+Only payments of the provider's own method (Bank Transfer for a bank,
+Mobile Money otherwise) are compared unless --payment-method says
+otherwise; --payment-method all compares every method.
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.reconciliation_service import ReconciliationService, ReconciliationError
+
+
+class Command(BaseCommand):
+    help = 'Reconcile a provider statement against payments and store the report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help='Path to the statement CSV')
+        parser.add_argument('--from', dest='date_from', required=True, help='Window start (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', required=True, help='Window end (YYYY-MM-DD)')
+        parser.add_argument('--provider', default='Mobile Money', help='Statement provider name')
+        parser.add_argument('--payment-method', help='Only compare payments with this method ("all" for every method)')
+
+    def handle(self, *args, **options):
+        try:
+            date_from = datetime.strptime(options['date_from'], '%Y-%m-%d').date()
+            date_to = datetime.strptime(options['date_to'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('--from and --to must be dates in YYYY-MM-DD format')
+
+        try:
+            with open(options['statement'], 'rb') as statement:
+                report = ReconciliationService.reconcile(
+                    ReconciliationService.read_statement(statement),
+                    date_from,
+                    date_to,
+                    provider=options['provider'],
+                    payment_method=options['payment_method']
+                )
+        except (OSError, ReconciliationError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f'Reconciliation report {report.report_id}: {report.statement_rows} statement lines, '
+            f'{report.matched_count} matched, {report.amount_mismatch_count} amount mismatches, '
+            f'{report.missing_in_system_count} missing in system, '
+            f'{report.missing_at_provider_count} missing at provider'
+        )
@@ -0,0 +1,65 @@
+"""
+Render printable bill statements for a billing period
+
+Usage:
+    python manage.py render_bill_statements 2024-01 --output statements_2024-01.zip
+    python manage.py render_bill_statements 2024-01 --by-village --output statements/2024-01 --workers 8
+    python manage.py render_bill_statements 2024-01 --village Kagarama --output kagarama.zip
+"""
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.statement_service import StatementService
+
+
+class Command(BaseCommand):
+    help = 'Render one statement per bill into a ZIP, or one merged PDF per village'
+
+    def add_arguments(self, parser):
+        parser.add_argument('billing_period', help='Billing period (YYYY-MM)')
+        parser.add_argument('--output', help='ZIP file, or directory with --by-village')
+        parser.add_argument('--by-village', action='store_true', help='Write one merged PDF per village')
+        parser.add_argument('--village', help='Only render bills of this village')
+        parser.add_argument('--workers', type=int, default=4, help='Rendering processes')
+        parser.add_argument('--chunk-size', type=int, default=StatementService.CHUNK_SIZE,
+                            help='Statements per worker task (ZIP output)')
+
+    def handle(self, *args, **options):
+        billing_period = options['billing_period']
+        if not re.match(r'^\d{4}-\d{2}$', billing_period):
+            raise CommandError('billing_period must be in YYYY-MM format')
+
+        last_reported = [0]
+
+        def progress(done, total):
+            # Report roughly every 5%
+            if done == total or done - last_reported[0] >= max(total // 20, 1):
+                last_reported[0] = done
+                self.stdout.write(f'  {done}/{total} statements rendered')
+
+        try:
+            if options['by_village']:
+                summary = StatementService.render_by_village(
+                    billing_period,
+                    options['output'] or f'statements_{billing_period}',
+                    workers=options['workers'],
+                    village=options['village'],
+                    progress=progress
+                )
+            else:
+                summary = StatementService.render_zip(
+                    billing_period,
+                    options['output'] or f'statements_{billing_period}.zip',
+                    workers=options['workers'],
+                    chunk_size=options['chunk_size'],
+                    village=options['village'],
+                    progress=progress
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"Rendered {summary['statements']} statements for {billing_period} into "
+            f"{summary['files']} files in {summary['elapsed_seconds']}s"
+        )
@@ -0,0 +1,47 @@
+"""
+Month-end balance snapshots per household
+
+Usage:
+    python manage.py snapshot_balances                    # end of last month
+    python manage.py snapshot_balances --as-of 2024-03-31
+    python manage.py snapshot_balances --from 2023-01      # every month end from Jan 2023 to last month
+
+Each snapshot builds on the previous one, so run month ends in order
+(--from does). Re-running a date rewrites it.
+"""
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.balance_service import BalanceService, month_end, previous_month_end
+
+
+class Command(BaseCommand):
+    help = 'Write month-end balance snapshots used by as-of balance queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', help='Snapshot date (YYYY-MM-DD); default the end of last month')
+        parser.add_argument('--from', dest='from_period', help='First month (YYYY-MM) of a run of month ends')
+
+    def handle(self, *args, **options):
+        last = previous_month_end()
+        try:
+            if options['from_period']:
+                dates = [month_end(datetime.strptime(options['from_period'], '%Y-%m').strftime('%Y-%m'))]
+                while dates[-1] < last:
+                    dates.append(month_end((dates[-1] + timedelta(days=1)).strftime('%Y-%m')))
+            elif options['as_of']:
+                dates = [datetime.strptime(options['as_of'], '%Y-%m-%d').date()]
+            else:
+                dates = [last]
+        except ValueError:
+            raise CommandError('Use YYYY-MM-DD for --as-of and YYYY-MM for --from')
+        if dates[0] > last and options['from_period']:
+            raise CommandError('--from must be a month that has already ended')
+
+        for as_of in dates:
+            summary = BalanceService.take_snapshot(as_of)
+            self.stdout.write(
+                f"Snapshot {as_of}: {summary['households']} households, "
+                f"{summary['receivables']} RWF receivable"
+            )
@@ -0,0 +1,36 @@
+"""
+Overdue sweep: moves past-due Pending bills to Overdue and applies the late penalty
+
+Usage:
+    python manage.py sweep_overdue_bills                      # as of today
+    python manage.py sweep_overdue_bills --as-of 2024-02-15
+
+Safe to run repeatedly (e.g. hourly from cron); each bill is penalized once.
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.billing_service import BillingService
+
+
+class Command(BaseCommand):
+    help = 'Move past-due Pending bills to Overdue and apply the late penalty'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', help='Sweep date (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Bills per UPDATE statement')
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options['as_of']:
+            try:
+                as_of = datetime.strptime(options['as_of'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--as-of must be a date in YYYY-MM-DD format')
+
+        sweep = BillingService.sweep_overdue(as_of=as_of, batch_size=options['batch_size'])
+        self.stdout.write(
+            f'Overdue sweep {sweep.sweep_id} as of {sweep.as_of}: '
+            f'{sweep.bills_updated} bills moved to Overdue'
+        )
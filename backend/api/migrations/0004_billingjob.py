@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_payment_submitted_by_alter_payment_received_by_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='payment_method',
+            field=models.CharField(choices=[('Cash', 'Cash'), ('Mobile Money', 'Mobile Money'), ('Bank Transfer', 'Bank Transfer'), ('Card', 'Card')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='BillingJob',
+            fields=[
+                ('job_id', models.AutoField(primary_key=True, serialize=False)),
+                ('billing_period', models.CharField(max_length=7)),
+                ('status', models.CharField(choices=[('Queued', 'Queued'), ('Running', 'Running'), ('Completed', 'Completed'), ('Failed', 'Failed')], default='Queued', max_length=20)),
+                ('households_processed', models.IntegerField(default=0)),
+                ('bills_created', models.IntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('household', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='billing_jobs', to='api.household')),
+                ('requested_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='billing_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'billing_jobs',
+                'indexes': [models.Index(fields=['status', 'created_date'], name='billing_job_status_2940f5_idx')],
+            },
+        ),
+    ]
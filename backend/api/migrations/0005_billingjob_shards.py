@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_billingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billingjob',
+            name='shards',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_billingjob_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('prefix', models.CharField(max_length=30, primary_key=True, serialize=False)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'number_sequences',
+            },
+        ),
+    ]
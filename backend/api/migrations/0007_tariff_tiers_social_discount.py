@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_numbersequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tariffrate',
+            name='social_discount_min_members',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tariffrate',
+            name='social_discount_percent',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AddField(
+            model_name='tariffrate',
+            name='tiers',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
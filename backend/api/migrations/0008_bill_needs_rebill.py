@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_tariff_tiers_social_discount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='needs_rebill',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['billing_period', 'needs_rebill'], name='bills_billing_20886f_idx'),
+        ),
+    ]
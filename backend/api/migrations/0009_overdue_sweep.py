@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_bill_needs_rebill'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueSweep',
+            fields=[
+                ('sweep_id', models.AutoField(primary_key=True, serialize=False)),
+                ('as_of', models.DateField()),
+                ('bills_updated', models.IntegerField(default=0)),
+                ('penalty_flat', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('penalty_percent', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'overdue_sweeps',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['status', 'due_date'], name='bills_status_2d6121_idx'),
+        ),
+    ]
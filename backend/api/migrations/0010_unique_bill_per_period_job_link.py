@@ -0,0 +1,69 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def drop_duplicate_bills(apps, schema_editor):
+    """
+    Keep one bill per (household, billing_period) before the constraint is
+    added: the one with payments, else the first issued. Duplicates are
+    deleted only when nothing was paid on them; paid duplicates stop the
+    migration so they can be merged by hand.
+    """
+    Bill = apps.get_model('api', 'Bill')
+    Payment = apps.get_model('api', 'Payment')
+
+    duplicated = list(
+        Bill.objects.values('household_id', 'billing_period')
+        .annotate(bills=models.Count('bill_id'))
+        .filter(bills__gt=1)
+        .order_by()
+    )
+    paid_bills = set(Payment.objects.filter(
+        bill__household_id__in={group['household_id'] for group in duplicated}
+    ).values_list('bill_id', flat=True))
+
+    extra, conflicts = [], []
+    for group in duplicated:
+        bills = list(Bill.objects.filter(
+            household_id=group['household_id'], billing_period=group['billing_period']
+        ).order_by('bill_id').values_list('bill_id', 'bill_number'))
+        bills.sort(key=lambda bill: bill[0] not in paid_bills)
+        for bill_id, bill_number in bills[1:]:
+            if bill_id in paid_bills:
+                conflicts.append(bill_number)
+            else:
+                extra.append(bill_id)
+    if conflicts:
+        raise RuntimeError(
+            'Bills duplicating another bill of the same household and period have payments; '
+            f'move the payments and delete them before migrating: {", ".join(conflicts)}'
+        )
+    for start in range(0, len(extra), 1000):
+        Bill.objects.filter(bill_id__in=extra[start:start + 1000]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_overdue_sweep'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='billing_job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bills', to='api.billingjob'),
+        ),
+        migrations.AddField(
+            model_name='billingjob',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(drop_duplicate_bills, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='bill',
+            constraint=models.UniqueConstraint(fields=('household', 'billing_period'), name='unique_bill_per_household_period'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:46
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_bill_balances(apps, schema_editor):
+    """Fill amount_paid and balance_due from the completed payments, one UPDATE per bill_id range"""
+    Bill = apps.get_model('api', 'Bill')
+    Payment = apps.get_model('api', 'Payment')
+
+    money = models.DecimalField(max_digits=10, decimal_places=2)
+    paid = Coalesce(
+        models.Subquery(
+            Payment.objects.filter(bill_id=models.OuterRef('bill_id'), payment_status='Completed')
+            .values('bill_id')
+            .annotate(total=models.Sum('amount_paid'))
+            .values('total'),
+            output_field=money
+        ),
+        models.Value(0, output_field=money)
+    )
+    bounds = Bill.objects.aggregate(first=models.Min('bill_id'), last=models.Max('bill_id'))
+    if bounds['first'] is None:
+        return
+    batch_size = 10000
+    for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+        Bill.objects.filter(bill_id__gte=start, bill_id__lt=start + batch_size).update(
+            balance_due=models.F('total_amount') - paid,
+            amount_paid=paid,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_unique_bill_per_period_job_link'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='balance_due',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['household', 'balance_due'], name='bills_househo_ec6949_idx'),
+        ),
+        migrations.RunPython(backfill_bill_balances, migrations.RunPython.noop),
+    ]
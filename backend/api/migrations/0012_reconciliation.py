@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_bill_amount_paid_balance_due'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationReport',
+            fields=[
+                ('report_id', models.AutoField(primary_key=True, serialize=False)),
+                ('provider', models.CharField(max_length=50)),
+                ('payment_method', models.CharField(blank=True, max_length=20, null=True)),
+                ('date_from', models.DateField()),
+                ('date_to', models.DateField()),
+                ('statement_rows', models.IntegerField(default=0)),
+                ('matched_count', models.IntegerField(default=0)),
+                ('missing_in_system_count', models.IntegerField(default=0)),
+                ('missing_at_provider_count', models.IntegerField(default=0)),
+                ('amount_mismatch_count', models.IntegerField(default=0)),
+                ('statement_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('system_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reconciliation_reports', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'reconciliation_reports',
+                'ordering': ['-created_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReconciliationItem',
+            fields=[
+                ('item_id', models.AutoField(primary_key=True, serialize=False)),
+                ('result', models.CharField(choices=[('Matched', 'Matched'), ('Missing in System', 'Missing in System'), ('Missing at Provider', 'Missing at Provider'), ('Amount Mismatch', 'Amount Mismatch')], max_length=20)),
+                ('transaction_reference', models.CharField(blank=True, max_length=100, null=True)),
+                ('statement_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('statement_date', models.DateField(blank=True, null=True)),
+                ('system_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('statement_line', models.IntegerField(blank=True, null=True)),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reconciliation_items', to='api.payment')),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='api.reconciliationreport')),
+            ],
+            options={
+                'db_table': 'reconciliation_items',
+                'indexes': [models.Index(fields=['report', 'result'], name='reconciliat_report__0979c8_idx')],
+            },
+        ),
+    ]
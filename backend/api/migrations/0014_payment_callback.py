@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_payment_updated_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentCallback',
+            fields=[
+                ('callback_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('provider', models.CharField(default='Mobile Money', max_length=50)),
+                ('provider_transaction_id', models.CharField(max_length=100)),
+                ('bill_number', models.CharField(blank=True, max_length=30, null=True)),
+                ('household_code', models.CharField(blank=True, max_length=20, null=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payer_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('payer_phone', models.CharField(blank=True, max_length=15, null=True)),
+                ('payment_date', models.DateField(blank=True, null=True)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Processing', 'Processing'), ('Applied', 'Applied'), ('Duplicate', 'Duplicate'), ('Rejected', 'Rejected')], default='Pending', max_length=20)),
+                ('claim_token', models.CharField(blank=True, max_length=32, null=True)),
+                ('message', models.TextField(blank=True, null=True)),
+                ('received_date', models.DateTimeField(auto_now_add=True)),
+                ('processed_date', models.DateTimeField(blank=True, null=True)),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='callbacks', to='api.payment')),
+            ],
+            options={
+                'db_table': 'payment_callbacks',
+                'ordering': ['-callback_id'],
+                'indexes': [models.Index(fields=['status', 'callback_id'], name='payment_cal_status_7b0a60_idx'), models.Index(fields=['claim_token'], name='payment_cal_claim_t_6cdc06_idx'), models.Index(fields=['provider_transaction_id'], name='payment_cal_provide_66454c_idx')],
+            },
+        ),
+    ]
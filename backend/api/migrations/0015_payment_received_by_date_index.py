@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_payment_callback'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['received_by', 'payment_date'], name='payments_receive_1eccd8_idx'),
+        ),
+    ]
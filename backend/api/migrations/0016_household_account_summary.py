@@ -0,0 +1,123 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:08
+
+from datetime import date
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_account_summaries(apps, schema_editor):
+    """Fill every household's summary from its usages, bills and payments, like HouseholdAccountSummary.refresh"""
+    Household = apps.get_model('api', 'Household')
+    HouseholdAccountSummary = apps.get_model('api', 'HouseholdAccountSummary')
+    WaterUsage = apps.get_model('api', 'WaterUsage')
+    Bill = apps.get_model('api', 'Bill')
+    Payment = apps.get_model('api', 'Payment')
+
+    batch_size = 1000
+    month_start = date.today().replace(day=1)
+    household_ids = list(Household.objects.order_by('household_id').values_list('household_id', flat=True))
+    for start in range(0, len(household_ids), batch_size):
+        batch = household_ids[start:start + batch_size]
+        summaries = {
+            household_id: HouseholdAccountSummary(household_id=household_id, paid_month=month_start.strftime('%Y-%m'))
+            for household_id in batch
+        }
+
+        latest = list(Household.objects.filter(household_id__in=batch).annotate(
+            last_usage_id=models.Subquery(WaterUsage.objects.filter(
+                household=models.OuterRef('pk')
+            ).order_by('-reading_month', '-usage_id').values('usage_id')[:1]),
+            last_bill_id=models.Subquery(Bill.objects.filter(
+                household=models.OuterRef('pk')
+            ).order_by('-billing_period', '-bill_id').values('bill_id')[:1]),
+            last_payment_id=models.Subquery(Payment.objects.filter(
+                bill__household=models.OuterRef('pk'), payment_status='Completed'
+            ).order_by('-payment_date', '-payment_id').values('payment_id')[:1]),
+        ).values_list('household_id', 'last_usage_id', 'last_bill_id', 'last_payment_id'))
+        usages = WaterUsage.objects.in_bulk([row[1] for row in latest if row[1]])
+        bills = Bill.objects.in_bulk([row[2] for row in latest if row[2]])
+        payments = Payment.objects.in_bulk([row[3] for row in latest if row[3]])
+        for household_id, usage_id, bill_id, payment_id in latest:
+            summary = summaries[household_id]
+            if usage_id:
+                summary.last_reading = usages[usage_id].current_reading
+                summary.last_reading_date = usages[usage_id].reading_date
+                summary.last_reading_month = usages[usage_id].reading_month
+            if bill_id:
+                summary.last_bill_id = bill_id
+                summary.last_billing_period = bills[bill_id].billing_period
+            if payment_id:
+                summary.last_payment_id = payment_id
+                summary.last_payment_date = payments[payment_id].payment_date
+                summary.last_payment_amount = payments[payment_id].amount_paid
+
+        for row in WaterUsage.objects.filter(household_id__in=batch).values('household_id').annotate(
+            total=models.Sum('liters_used')
+        ).order_by():
+            summaries[row['household_id']].total_liters_used = row['total'] or 0
+
+        for row in Bill.objects.filter(household_id__in=batch).values('household_id').annotate(
+            bills=models.Count('bill_id'),
+            pending=models.Count('bill_id', filter=models.Q(status='Pending')),
+            overdue=models.Count('bill_id', filter=models.Q(status='Overdue')),
+            outstanding=models.Sum('balance_due', filter=~models.Q(status='Cancelled')),
+        ).order_by():
+            summary = summaries[row['household_id']]
+            summary.bills_count = row['bills']
+            summary.pending_bills_count = row['pending']
+            summary.overdue_bills_count = row['overdue']
+            summary.outstanding_balance = row['outstanding'] or 0
+
+        for row in Payment.objects.filter(
+            bill__household_id__in=batch, payment_status='Completed'
+        ).values('bill__household_id').annotate(
+            payments=models.Count('payment_id'),
+            total=models.Sum('amount_paid'),
+            month_total=models.Sum('amount_paid', filter=models.Q(payment_date__gte=month_start)),
+        ).order_by():
+            summary = summaries[row['bill__household_id']]
+            summary.payments_count = row['payments']
+            summary.total_paid = row['total'] or 0
+            summary.paid_this_month = row['month_total'] or 0
+
+        HouseholdAccountSummary.objects.bulk_create(summaries.values(), batch_size=batch_size)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_payment_received_by_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HouseholdAccountSummary',
+            fields=[
+                ('household', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='account_summary', serialize=False, to='api.household')),
+                ('last_reading', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('last_reading_date', models.DateField(blank=True, null=True)),
+                ('last_reading_month', models.CharField(blank=True, max_length=7, null=True)),
+                ('total_liters_used', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_billing_period', models.CharField(blank=True, max_length=7, null=True)),
+                ('bills_count', models.IntegerField(default=0)),
+                ('pending_bills_count', models.IntegerField(default=0)),
+                ('overdue_bills_count', models.IntegerField(default=0)),
+                ('outstanding_balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payments_count', models.IntegerField(default=0)),
+                ('total_paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid_this_month', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid_month', models.CharField(blank=True, max_length=7, null=True)),
+                ('last_payment_date', models.DateField(blank=True, null=True)),
+                ('last_payment_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_bill', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.bill')),
+                ('last_payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.payment')),
+            ],
+            options={
+                'db_table': 'household_accounts',
+                'indexes': [models.Index(fields=['outstanding_balance'], name='household_a_outstan_363641_idx'), models.Index(fields=['overdue_bills_count'], name='household_a_overdue_da9114_idx')],
+            },
+        ),
+        migrations.RunPython(build_account_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_household_account_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('snapshot_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('as_of', models.DateField()),
+                ('billed_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'balance_snapshots',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['household', 'bill_date'], name='bills_househo_0f99e6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['bill_date'], name='bills_bill_da_26cb91_idx'),
+        ),
+        migrations.AddField(
+            model_name='balancesnapshot',
+            name='household',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='api.household'),
+        ),
+        migrations.AddIndex(
+            model_name='balancesnapshot',
+            index=models.Index(fields=['as_of'], name='balance_sna_as_of_7f3099_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='balancesnapshot',
+            constraint=models.UniqueConstraint(fields=('household', 'as_of'), name='unique_balance_snapshot_per_date'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:14
+
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# HouseholdUsageStats.ANOMALY_FACTOR and RECENT_READINGS as of this migration
+ANOMALY_FACTOR = Decimal('2.0')
+RECENT_READINGS = 12
+
+
+def build_usage_stats(apps, schema_editor):
+    """
+    Build every household's statistics and flag anomalous readings, replaying
+    the usages in the order they were recorded like HouseholdUsageStats.refresh
+    """
+    HouseholdUsageStats = apps.get_model('api', 'HouseholdUsageStats')
+    WaterUsage = apps.get_model('api', 'WaterUsage')
+
+    batch_size = 1000
+    stats = {}
+    flagged = []
+
+    def flush():
+        HouseholdUsageStats.objects.bulk_create(stats.values(), batch_size=batch_size)
+        stats.clear()
+        for start in range(0, len(flagged), batch_size):
+            WaterUsage.objects.filter(usage_id__in=flagged[start:start + batch_size]).update(is_anomaly=True)
+        flagged.clear()
+
+    for usage_id, household_id, liters in WaterUsage.objects.order_by('household_id', 'usage_id').values_list(
+        'usage_id', 'household_id', 'liters_used'
+    ).iterator(chunk_size=2000):
+        household_stats = stats.get(household_id)
+        if household_stats is None:
+            if len(stats) >= batch_size:
+                flush()
+            household_stats = stats[household_id] = HouseholdUsageStats(household_id=household_id, recent_liters=[])
+        if household_stats.liters_total > 0 and liters * household_stats.readings_count > ANOMALY_FACTOR * household_stats.liters_total:
+            flagged.append(usage_id)
+        household_stats.readings_count += 1
+        household_stats.liters_total += liters
+        household_stats.liters_squared_total += liters * liters
+        household_stats.recent_liters = (household_stats.recent_liters + [f'{liters:.2f}'])[-RECENT_READINGS:]
+    flush()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_balance_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HouseholdUsageStats',
+            fields=[
+                ('household', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='usage_stats', serialize=False, to='api.household')),
+                ('readings_count', models.IntegerField(default=0)),
+                ('liters_total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('liters_squared_total', models.DecimalField(decimal_places=4, default=0, max_digits=24)),
+                ('recent_liters', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'household_usage_stats',
+            },
+        ),
+        migrations.AddField(
+            model_name='waterusage',
+            name='is_anomaly',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(build_usage_stats, migrations.RunPython.noop),
+    ]
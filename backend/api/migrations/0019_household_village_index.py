@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_household_usage_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='household',
+            index=models.Index(fields=['village', 'household_code'], name='households_village_2bb3c7_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:22
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_household_village_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('tombstone_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(choices=[('households', 'Household'), ('usages', 'Water Usage'), ('tariffs', 'Tariff Rate'), ('bills', 'Bill')], max_length=20)),
+                ('object_id', models.IntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'sync_tombstones',
+            },
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='household',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='tariffrate',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='waterusage',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['updated_at', 'bill_id'], name='bills_updated_d805b1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='household',
+            index=models.Index(fields=['updated_at', 'household_id'], name='households_updated_829128_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tariffrate',
+            index=models.Index(fields=['updated_at', 'tariff_id'], name='tariff_rate_updated_a79033_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='waterusage',
+            index=models.Index(fields=['updated_at', 'usage_id'], name='water_usage_updated_1e2689_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['deleted_at', 'tombstone_id'], name='sync_tombst_deleted_7a4fca_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+def last_reading_by_month(apps, schema_editor):
+    """Point every account summary at the reading of its latest month, not of its latest reading date"""
+    HouseholdAccountSummary = apps.get_model('api', 'HouseholdAccountSummary')
+    WaterUsage = apps.get_model('api', 'WaterUsage')
+
+    latest = WaterUsage.objects.filter(household_id=models.OuterRef('household_id')).order_by('-reading_month', '-usage_id')
+    HouseholdAccountSummary.objects.update(
+        last_reading=models.Subquery(latest.values('current_reading')[:1]),
+        last_reading_date=models.Subquery(latest.values('reading_date')[:1]),
+        last_reading_month=models.Subquery(latest.values('reading_month')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_sync_change_tracking'),
+    ]
+
+    operations = [
+        migrations.RunPython(last_reading_by_month, migrations.RunPython.noop),
+    ]
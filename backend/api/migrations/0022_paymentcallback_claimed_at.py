@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_last_reading_by_month'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentcallback',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_paymentcallback_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='synctombstone',
+            name='village',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+    ]
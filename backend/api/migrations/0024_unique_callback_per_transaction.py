@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:22
+
+from django.db import migrations, models
+
+
+def drop_duplicate_callbacks(apps, schema_editor):
+    """
+    Keep one callback per (provider, provider_transaction_id) before the
+    constraint is added: the applied one, else the first received. A
+    transaction applied more than once stops the migration so the extra
+    payments can be reversed by hand.
+    """
+    PaymentCallback = apps.get_model('api', 'PaymentCallback')
+
+    duplicated = list(
+        PaymentCallback.objects.values('provider', 'provider_transaction_id')
+        .annotate(callbacks=models.Count('callback_id'))
+        .filter(callbacks__gt=1)
+        .order_by()
+    )
+
+    extra, conflicts = [], []
+    for group in duplicated:
+        callbacks = list(PaymentCallback.objects.filter(
+            provider=group['provider'], provider_transaction_id=group['provider_transaction_id']
+        ).order_by('callback_id').values_list('callback_id', 'status'))
+        callbacks.sort(key=lambda callback: callback[1] != 'Applied')
+        for callback_id, status in callbacks[1:]:
+            if status == 'Applied':
+                conflicts.append(f"{group['provider']} {group['provider_transaction_id']}")
+            else:
+                extra.append(callback_id)
+    if conflicts:
+        raise RuntimeError(
+            'Provider transactions were applied more than once; reverse the extra payments and '
+            f'delete their callbacks before migrating: {", ".join(sorted(set(conflicts)))}'
+        )
+    for start in range(0, len(extra), 1000):
+        PaymentCallback.objects.filter(callback_id__in=extra[start:start + 1000]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_synctombstone_village'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_callbacks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='paymentcallback',
+            constraint=models.UniqueConstraint(fields=('provider', 'provider_transaction_id'), name='unique_callback_per_transaction'),
+        ),
+    ]
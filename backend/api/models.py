@@ -1,8 +1,10 @@
 """
 Django models for Village Water System
 """
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Q
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.utils import timezone
 from datetime import datetime, date
 from decimal import Decimal
 
@@ -105,6 +107,8 @@ class Household(models.Model):
     registered_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='registered_households')
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True, related_name='household')
     registration_date = models.DateTimeField(auto_now_add=True)
+    # Change tracking for device sync; set explicitly in QuerySet.update() calls
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'households'
@@ -112,50 +116,140 @@ class Household(models.Model):
             models.Index(fields=['household_code']),
             models.Index(fields=['national_id']),
             models.Index(fields=['status']),
+            models.Index(fields=['village', 'household_code']),
+            models.Index(fields=['updated_at', 'household_id']),
         ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the village as loaded, to detect moves in save()"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_village = dict(zip(field_names, values)).get('village')
+        return instance
+    
     def save(self, *args, **kwargs):
-        """Auto-generate household code if not provided"""
+        """
+        Auto-generate household code if not provided, and open the account summary.
+        Moving to another village leaves tombstones for devices syncing the old one.
+        """
         if not self.household_code:
-            year = datetime.now().year
-            # Get the last household code for this year
-            last_household = Household.objects.filter(
-                household_code__startswith=f'HH-{year}-'
-            ).order_by('-household_code').first()
-            
-            if last_household:
-                last_number = int(last_household.household_code.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            
-            self.household_code = f'HH-{year}-{new_number:04d}'
+            from .sequences import household_codes
+            self.household_code = household_codes()[0]
         
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        left_village = getattr(self, '_loaded_village', None)
+        moved = not adding and 'village' in self.__dict__ and left_village and left_village != self.village
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                HouseholdAccountSummary.objects.create(household=self, paid_month=date.today().strftime('%Y-%m'))
+            if moved:
+                SyncTombstone.record_move(self, left_village)
+        self._loaded_village = self.village
     
     def __str__(self):
         return f"{self.household_code} - {self.household_name}"
 
 
+class NumberSequence(models.Model):
+    """Counter behind generated numbers (bill, receipt, transaction, household), keyed by prefix"""
+    
+    prefix = models.CharField(max_length=30, primary_key=True)  # e.g. BILL-202610
+    last_value = models.BigIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'number_sequences'
+    
+    def __str__(self):
+        return f"{self.prefix}: {self.last_value}"
+
+
 class TariffRate(models.Model):
     """Tariff Rate model"""
     
     tariff_id = models.AutoField(primary_key=True)
     rate_name = models.CharField(max_length=100)
     rate_per_liter = models.DecimalField(max_digits=10, decimal_places=2)
+    # Block tariff: [{"up_to": "5000", "rate": "0.50"}, {"up_to": null, "rate": "0.80"}]; empty = flat rate_per_liter
+    tiers = models.JSONField(default=list, blank=True)
+    social_discount_min_members = models.IntegerField(null=True, blank=True)
+    social_discount_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     effective_from = models.DateField()
     effective_to = models.DateField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
     set_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     created_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'tariff_rates'
         indexes = [
             models.Index(fields=['is_active']),
             models.Index(fields=['effective_from', 'effective_to']),
+            models.Index(fields=['updated_at', 'tariff_id']),
         ]
     
+    PRICING_FIELDS = [
+        'rate_per_liter', 'tiers', 'social_discount_min_members', 'social_discount_percent',
+        'effective_from', 'effective_to', 'is_active',
+    ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the pricing as loaded, to detect edits in save()"""
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_pricing = tuple(loaded.get(field) for field in cls.PRICING_FIELDS)
+        return instance
+    
+    def _pricing(self):
+        return tuple(getattr(self, field) for field in self.PRICING_FIELDS)
+    
+    @staticmethod
+    def _billing_periods(effective_from, effective_to):
+        """(first, last) YYYY-MM periods a tariff can price; last is None when open-ended"""
+        return (
+            f'{effective_from.year}-{effective_from.month:02d}' if effective_from else None,
+            f'{effective_to.year}-{effective_to.month:02d}' if effective_to else None,
+        )
+    
+    def _mark_bills_for_rebill(self, *ranges):
+        """Flag Pending bills in the given period ranges for re-billing"""
+        affected = Q()
+        for first, last in ranges:
+            period = Q(billing_period__gte=first) if first else Q()
+            if last:
+                period &= Q(billing_period__lte=last)
+            affected |= period
+        Bill.objects.filter(affected, status='Pending', needs_rebill=False).update(
+            needs_rebill=True, updated_at=timezone.now()
+        )
+    
+    def save(self, *args, **kwargs):
+        """Save, flag bills priced by the old or new terms, and invalidate the tariff index"""
+        from .tariff_service import invalidate_tariff_index
+        loaded = getattr(self, '_loaded_pricing', None)
+        changed = loaded is None or loaded != self._pricing()
+        super().save(*args, **kwargs)
+        
+        if changed:
+            ranges = [self._billing_periods(self.effective_from, self.effective_to)]
+            if loaded is not None:
+                old = dict(zip(self.PRICING_FIELDS, loaded))
+                ranges.append(self._billing_periods(old['effective_from'], old['effective_to']))
+            self._mark_bills_for_rebill(*ranges)
+        self._loaded_pricing = self._pricing()
+        invalidate_tariff_index()
+    
+    def delete(self, *args, **kwargs):
+        """Delete, flag bills it priced, and invalidate the tariff index"""
+        from .tariff_service import invalidate_tariff_index
+        periods = self._billing_periods(self.effective_from, self.effective_to)
+        result = super().delete(*args, **kwargs)
+        self._mark_bills_for_rebill(periods)
+        invalidate_tariff_index()
+        return result
+    
     def __str__(self):
         return f"{self.rate_name} - {self.rate_per_liter} RWF/L"
 
@@ -178,7 +272,10 @@ class WaterUsage(models.Model):
     reading_month = models.CharField(max_length=7)  # Format: YYYY-MM
     recorded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    # More than twice the household's average of earlier readings; set from HouseholdUsageStats
+    is_anomaly = models.BooleanField(default=False)
     created_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'water_usage'
@@ -187,20 +284,50 @@ class WaterUsage(models.Model):
             models.Index(fields=['reading_month']),
             models.Index(fields=['household']),
             models.Index(fields=['status']),
+            models.Index(fields=['updated_at', 'usage_id']),
         ]
     
-    def is_anomaly(self):
-        """Check if usage is > 2x the household average"""
-        usages = WaterUsage.objects.filter(household=self.household, usage_id__lt=self.usage_id)
-        if not usages.exists():
-            return False
-        avg = sum(u.liters_used for u in usages) / usages.count()
-        return self.liters_used > (avg * Decimal('2.0')) if avg > 0 else False
-        
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the readings as loaded, to detect corrections in save()"""
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_readings = (loaded.get('previous_reading'), loaded.get('current_reading'))
+        return instance
+    
     def save(self, *args, **kwargs):
-        """Auto-calculate liters used"""
+        """
+        Auto-calculate liters used, flag anomalies against the household's
+        usage statistics and flag the bill of a corrected reading for re-billing
+        """
         self.liters_used = self.current_reading - self.previous_reading
-        super().save(*args, **kwargs)
+        loaded = getattr(self, '_loaded_readings', None)
+        corrected = loaded is not None and loaded != (self.previous_reading, self.current_reading)
+        with transaction.atomic():
+            stats = HouseholdUsageStats.record(self) if self._state.adding else None
+            super().save(*args, **kwargs)
+            if stats:
+                stats.save()
+            elif corrected:
+                HouseholdUsageStats.refresh([self.household_id])
+            # New readings are counted in place; edits are rare and recompute the household
+            if stats:
+                HouseholdAccountSummary.record_usages([self])
+            else:
+                HouseholdAccountSummary.refresh([self.household_id])
+        self._loaded_readings = (self.previous_reading, self.current_reading)
+        
+        if corrected:
+            Bill.objects.filter(usage_id=self.usage_id, status='Pending').update(
+                needs_rebill=True, updated_at=timezone.now()
+            )
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            HouseholdUsageStats.refresh([self.household_id])
+            HouseholdAccountSummary.refresh([self.household_id])
+        return result
     
     def __str__(self):
         return f"{self.household.household_code} - {self.reading_month}: {self.liters_used}L"
@@ -227,50 +354,167 @@ class Bill(models.Model):
     penalty_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # Sum of Completed payments and what is left to pay; maintained with F() updates by Payment
+    amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    balance_due = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     bill_date = models.DateField()
     due_date = models.DateField()
     billing_period = models.CharField(max_length=7)  # Format: YYYY-MM
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    # Set when the usage reading or a tariff behind this bill changed after billing
+    needs_rebill = models.BooleanField(default=False)
     generated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    billing_job = models.ForeignKey('BillingJob', on_delete=models.SET_NULL, null=True, blank=True, related_name='bills')
     generation_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'bills'
+        constraints = [
+            models.UniqueConstraint(fields=['household', 'billing_period'], name='unique_bill_per_household_period'),
+        ]
         indexes = [
+            models.Index(fields=['updated_at', 'bill_id']),
             models.Index(fields=['bill_number']),
             models.Index(fields=['household']),
             models.Index(fields=['status']),
             models.Index(fields=['billing_period']),
+            models.Index(fields=['billing_period', 'needs_rebill']),
+            models.Index(fields=['status', 'due_date']),
+            models.Index(fields=['household', 'balance_due']),
+            models.Index(fields=['household', 'bill_date']),
+            models.Index(fields=['bill_date']),
         ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the charge inputs as loaded, to detect edits in save()"""
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._charge_inputs = (loaded.get('liters_consumed'), loaded.get('rate_applied'))
+        instance._loaded_billed = (
+            loaded.get('household_id'),
+            loaded.get('bill_date'),
+            loaded.get('total_amount') if loaded.get('status') != 'Cancelled' else Decimal('0'),
+        )
+        return instance
+    
+    def _billed(self):
+        """(household_id, bill_date, amount) this bill counts towards balance snapshots"""
+        return (self.household_id, self.bill_date, self.total_amount if self.status != 'Cancelled' else Decimal('0'))
+    
     def save(self, *args, **kwargs):
         """Auto-generate bill number and calculate totals"""
         if not self.bill_number:
-            year = datetime.now().year
-            month = datetime.now().month
-            # Get the last bill number for this month
-            last_bill = Bill.objects.filter(
-                bill_number__startswith=f'BILL-{year}{month:02d}-'
-            ).order_by('-bill_number').first()
-            
-            if last_bill:
-                last_number = int(last_bill.bill_number.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            
-            self.bill_number = f'BILL-{year}{month:02d}-{new_number:04d}'
+            from .sequences import bill_numbers
+            self.bill_number = bill_numbers()[0]
         
-        # Calculate totals
-        self.subtotal = self.liters_consumed * self.rate_applied
+        # Recalculate the subtotal for new bills and when consumption or rate is edited.
+        # Engine-computed subtotals (tiered/prorated tariffs) are kept on other saves.
+        charge_inputs = (self.liters_consumed, self.rate_applied)
+        if self.subtotal is None or charge_inputs != getattr(self, '_charge_inputs', None):
+            self.subtotal = self.liters_consumed * self.rate_applied
         self.total_amount = self.subtotal + self.penalty_amount - self.discount_amount
+        self.balance_due = self.total_amount - self.amount_paid
         
-        super().save(*args, **kwargs)
+        loaded = getattr(self, '_loaded_billed', None)
+        billed = self._billed()
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # New bills are counted in place; edits are rare and recompute the household
+            if adding:
+                HouseholdAccountSummary.record_bills([self])
+            else:
+                HouseholdAccountSummary.refresh([self.household_id])
+            if billed != loaded:
+                BalanceSnapshot.apply_changes(
+                    ([(loaded[0], loaded[1], -loaded[2], Decimal('0'))] if loaded else [])
+                    + [(billed[0], billed[1], billed[2], Decimal('0'))]
+                )
+        self._charge_inputs = charge_inputs
+        self._loaded_billed = billed
+    
+    def delete(self, *args, **kwargs):
+        """Delete, and take the bill and its cascaded payments out of the balance snapshots"""
+        household_id, bill_date, billed = getattr(self, '_loaded_billed', self._billed())
+        with transaction.atomic():
+            paid = list(Payment.objects.filter(bill_id=self.pk, payment_status='Completed').values(
+                'payment_date'
+            ).annotate(total=models.Sum('amount_paid')).order_by().values_list('payment_date', 'total'))
+            result = super().delete(*args, **kwargs)
+            HouseholdAccountSummary.refresh([self.household_id])
+            BalanceSnapshot.apply_changes(
+                [(household_id, bill_date, -billed, Decimal('0'))]
+                + [(household_id, payment_date, Decimal('0'), -total) for payment_date, total in paid]
+            )
+        return result
     
     def __str__(self):
         return f"{self.bill_number} - {self.household.household_code}: {self.total_amount} RWF"
 
 
+class BillingJob(models.Model):
+    """Background billing run, processed out of band by the billing worker"""
+    
+    STATUS_CHOICES = [
+        ('Queued', 'Queued'),
+        ('Running', 'Running'),
+        ('Completed', 'Completed'),
+        ('Failed', 'Failed'),
+    ]
+    
+    job_id = models.AutoField(primary_key=True)
+    billing_period = models.CharField(max_length=7)  # Format: YYYY-MM
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, null=True, blank=True, related_name='billing_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Queued')
+    households_processed = models.IntegerField(default=0)
+    bills_created = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    errors = models.JSONField(default=list, blank=True)
+    shards = models.JSONField(default=list, blank=True)  # Per-shard reports for parallel runs
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='billing_jobs')
+    created_date = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'billing_jobs'
+        indexes = [
+            models.Index(fields=['status', 'created_date']),
+        ]
+    
+    @property
+    def elapsed_seconds(self):
+        """Seconds spent running (so far, if still running)"""
+        if not self.started_at:
+            return None
+        end = self.finished_at or timezone.now()
+        return round((end - self.started_at).total_seconds(), 3)
+    
+    def __str__(self):
+        return f"Billing job {self.job_id} - {self.billing_period} ({self.status})"
+
+
+
+class OverdueSweep(models.Model):
+    """One run of the overdue sweep (Pending bills past due_date -> Overdue)"""
+    
+    sweep_id = models.AutoField(primary_key=True)
+    as_of = models.DateField()
+    bills_updated = models.IntegerField(default=0)
+    penalty_flat = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    penalty_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'overdue_sweeps'
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"Overdue sweep {self.as_of}: {self.bills_updated} bills"
+
 class Payment(models.Model):
     """Payment model"""
     
@@ -301,6 +545,7 @@ class Payment(models.Model):
     received_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='received_payments')
     submitted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='submitted_payments')
     created_date = models.DateTimeField(auto_now_add=True)
+    updated_date = models.DateTimeField(auto_now=True)  # Receipt version
     
     class Meta:
         db_table = 'payments'
@@ -308,58 +553,881 @@ class Payment(models.Model):
             models.Index(fields=['receipt_number']),
             models.Index(fields=['bill']),
             models.Index(fields=['payment_date']),
+            models.Index(fields=['received_by', 'payment_date']),
         ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember what this payment contributed to its bill as loaded"""
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_contribution = (
+            loaded.get('bill_id'),
+            loaded.get('amount_paid') if loaded.get('payment_status') == 'Completed' else Decimal('0'),
+        )
+        instance._loaded_payment_date = loaded.get('payment_date')
+        return instance
+    
+    def _contribution(self):
+        """(bill_id, amount) this payment counts towards its bill's amount_paid"""
+        return (self.bill_id, self.amount_paid if self.payment_status == 'Completed' else Decimal('0'))
+    
+    @staticmethod
+    def apply_to_bill(bill_id, amount):
+        """
+        Add `amount` (negative to reverse) to a bill's amount_paid with F()
+        updates, moving it to Paid when the balance reaches zero and back to
+        Pending/Overdue when a reversal reopens it.
+        """
+        if amount:
+            Payment.apply_to_bills({bill_id: amount})
+    
+    @staticmethod
+    def apply_to_bills(amounts, batch_size=500):
+        """
+        apply_to_bill for many bills at once ({bill_id: amount}): per batch,
+        one UPDATE adds the amounts and one derives balance and status from it
+        """
+        amounts = [(bill_id, amount) for bill_id, amount in amounts.items() if amount]
+        money = models.DecimalField(max_digits=10, decimal_places=2)
+        with transaction.atomic():
+            for start in range(0, len(amounts), batch_size):
+                batch = amounts[start:start + batch_size]
+                if len(batch) == 1:
+                    amount = models.Value(batch[0][1], output_field=money)
+                else:
+                    amount = models.Case(
+                        *[models.When(bill_id=bill_id, then=models.Value(value)) for bill_id, value in batch],
+                        output_field=money
+                    )
+                bills = Bill.objects.filter(pk__in=[bill_id for bill_id, value in batch])
+                before = HouseholdAccountSummary.bill_states(bill_id for bill_id, value in batch)
+                bills.update(amount_paid=models.F('amount_paid') + amount)
+                bills.update(
+                    updated_at=timezone.now(),
+                    balance_due=models.F('total_amount') - models.F('amount_paid'),
+                    status=models.Case(
+                        models.When(amount_paid__gte=models.F('total_amount'), then=models.Value('Paid')),
+                        models.When(status='Paid', due_date__lt=date.today(), then=models.Value('Overdue')),
+                        models.When(status='Paid', then=models.Value('Pending')),
+                        default=models.F('status'),
+                    ),
+                )
+                HouseholdAccountSummary.apply_bill_changes(
+                    before, HouseholdAccountSummary.bill_states(bill_id for bill_id, value in batch)
+                )
+    
     def save(self, *args, **kwargs):
-        """Auto-generate receipt number and transaction reference"""
+        """Auto-generate receipt number and transaction reference, and update the bill's balance"""
+        from .sequences import receipt_numbers, transaction_references
+        
         if not self.receipt_number:
-            year = datetime.now().year
-            month = datetime.now().month
-            # Get the last receipt number for this month
-            last_payment = Payment.objects.filter(
-                receipt_number__startswith=f'RCP-{year}{month:02d}-'
-            ).order_by('-receipt_number').first()
-            
-            if last_payment:
-                last_number = int(last_payment.receipt_number.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            
-            self.receipt_number = f'RCP-{year}{month:02d}-{new_number:04d}'
+            self.receipt_number = receipt_numbers()[0]
         
         # Auto-generate transaction reference if not provided
         if not self.transaction_reference:
-            year = datetime.now().year
-            month = datetime.now().month
-            day = datetime.now().day
-            # Get the last transaction for today
-            last_txn = Payment.objects.filter(
-                transaction_reference__startswith=f'TXN-{year}{month:02d}{day:02d}-'
-            ).order_by('-transaction_reference').first()
+            self.transaction_reference = transaction_references()[0]
+        
+        old_bill_id, old_amount = getattr(self, '_loaded_contribution', (None, Decimal('0')))
+        old_date = getattr(self, '_loaded_payment_date', None)
+        new_bill_id, new_amount = self._contribution()
+        adding = self._state.adding
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if old_bill_id == new_bill_id:
+                self.apply_to_bill(new_bill_id, new_amount - old_amount)
+            else:
+                self.apply_to_bill(old_bill_id, -old_amount)
+                self.apply_to_bill(new_bill_id, new_amount)
             
-            if last_txn:
-                last_number = int(last_txn.transaction_reference.split('-')[-1])
-                new_number = last_number + 1
+            # New payments are counted in place; edits are rare and recompute the household
+            if adding:
+                HouseholdAccountSummary.record_payments([self])
             else:
-                new_number = 1
+                HouseholdAccountSummary.refresh(
+                    Bill.objects.filter(bill_id__in=[old_bill_id, new_bill_id]).values_list('household_id', flat=True)
+                )
+            if (old_bill_id, old_date, old_amount) != (new_bill_id, self.payment_date, new_amount):
+                BalanceSnapshot.apply_payment_changes([
+                    (old_bill_id, old_date, -old_amount), (new_bill_id, self.payment_date, new_amount)
+                ])
+        self._loaded_contribution = (new_bill_id, new_amount)
+        self._loaded_payment_date = self.payment_date
+        
+        if (old_amount or new_amount) and Payment.bill.is_cached(self):
+            self.bill.refresh_from_db(fields=['amount_paid', 'balance_due', 'status'])
+    
+    def delete(self, *args, **kwargs):
+        """Delete and take a completed payment back off its bill"""
+        bill_id, amount = getattr(self, '_loaded_contribution', self._contribution())
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self.apply_to_bill(bill_id, -amount)
+            HouseholdAccountSummary.refresh(Bill.objects.filter(bill_id=bill_id).values_list('household_id', flat=True))
+            BalanceSnapshot.apply_payment_changes([
+                (bill_id, getattr(self, '_loaded_payment_date', self.payment_date), -amount)
+            ])
+        return result
+    
+    def __str__(self):
+        return f"{self.receipt_number} - {self.amount_paid} RWF"
+
+
+
+class HouseholdAccountSummary(models.Model):
+    """
+    One row of account state per household: last reading (latest
+    reading_month, whatever day it was recorded), last bill,
+    outstanding balance, open/overdue bill counts and last payment.
+    The usage, bill and payment write paths keep it current in the same
+    transaction, so lists and dashboards read it instead of aggregating;
+    the rebuild_account_summaries command recomputes it from scratch.
+    """
+    
+    SUMMARY_FIELDS = [
+        'last_reading', 'last_reading_date', 'last_reading_month', 'total_liters_used',
+        'last_bill', 'last_billing_period', 'bills_count', 'pending_bills_count', 'overdue_bills_count',
+        'outstanding_balance', 'payments_count', 'total_paid', 'paid_this_month', 'paid_month',
+        'last_payment', 'last_payment_date', 'last_payment_amount', 'updated_at',
+    ]
+    
+    household = models.OneToOneField(Household, on_delete=models.CASCADE, primary_key=True, related_name='account_summary')
+    last_reading = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    last_reading_date = models.DateField(null=True, blank=True)
+    last_reading_month = models.CharField(max_length=7, blank=True, null=True)
+    total_liters_used = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_bill = models.ForeignKey(Bill, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_billing_period = models.CharField(max_length=7, blank=True, null=True)
+    bills_count = models.IntegerField(default=0)
+    pending_bills_count = models.IntegerField(default=0)
+    overdue_bills_count = models.IntegerField(default=0)
+    outstanding_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payments_count = models.IntegerField(default=0)
+    total_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_this_month = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_month = models.CharField(max_length=7, blank=True, null=True)  # Month paid_this_month covers
+    last_payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_payment_date = models.DateField(null=True, blank=True)
+    last_payment_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'household_accounts'
+        indexes = [
+            models.Index(fields=['outstanding_balance']),
+            models.Index(fields=['overdue_bills_count']),
+        ]
+    
+    def __str__(self):
+        return f"{self.household_id}: {self.outstanding_balance} RWF outstanding"
+    
+    @classmethod
+    def refresh(cls, household_ids=None, batch_size=1000):
+        """
+        Recompute the summaries of the given households (all households when
+        None) from their usages, bills and completed payments, a fixed
+        number of grouped queries per batch
+        """
+        if household_ids is None:
+            household_ids = Household.objects.values_list('household_id', flat=True)
+        household_ids = sorted({household_id for household_id in household_ids if household_id})
+        this_month = date.today().strftime('%Y-%m')
+        
+        for start in range(0, len(household_ids), batch_size):
+            batch = household_ids[start:start + batch_size]
+            with transaction.atomic():
+                # Lock the rows before reading the aggregates: writers updating the
+                # summaries queue up behind the recompute instead of being overwritten
+                locked = set(cls.objects.select_for_update().filter(
+                    household_id__in=batch
+                ).order_by('household_id').values_list('household_id', flat=True))
+                summaries = cls._compute(batch, this_month)
+                cls.objects.bulk_update(
+                    [summary for household_id, summary in summaries.items() if household_id in locked],
+                    cls.SUMMARY_FIELDS,
+                    batch_size=batch_size
+                )
+                cls.objects.bulk_create(
+                    [summary for household_id, summary in summaries.items() if household_id not in locked],
+                    batch_size=batch_size
+                )
+    
+    @classmethod
+    def _compute(cls, batch, this_month):
+        """Summaries of a batch of households, computed from scratch"""
+        now = timezone.now()
+        summaries = {
+            household_id: cls(household_id=household_id, paid_month=this_month, updated_at=now)
+            for household_id in batch
+        }
+        
+        latest = Household.objects.filter(household_id__in=batch).annotate(
+            last_usage_id=models.Subquery(WaterUsage.objects.filter(
+                household=models.OuterRef('pk')
+            ).order_by('-reading_month', '-usage_id').values('usage_id')[:1]),
+            last_bill_id=models.Subquery(Bill.objects.filter(
+                household=models.OuterRef('pk')
+            ).order_by('-billing_period', '-bill_id').values('bill_id')[:1]),
+            last_payment_id=models.Subquery(Payment.objects.filter(
+                bill__household=models.OuterRef('pk'), payment_status='Completed'
+            ).order_by('-payment_date', '-payment_id').values('payment_id')[:1]),
+        ).values_list('household_id', 'last_usage_id', 'last_bill_id', 'last_payment_id')
+        latest = list(latest)
+        
+        usages = WaterUsage.objects.in_bulk([row[1] for row in latest if row[1]])
+        bills = Bill.objects.in_bulk([row[2] for row in latest if row[2]])
+        payments = Payment.objects.in_bulk([row[3] for row in latest if row[3]])
+        for household_id, usage_id, bill_id, payment_id in latest:
+            summary = summaries[household_id]
+            if usage_id:
+                usage = usages[usage_id]
+                summary.last_reading = usage.current_reading
+                summary.last_reading_date = usage.reading_date
+                summary.last_reading_month = usage.reading_month
+            if bill_id:
+                bill = bills[bill_id]
+                summary.last_bill_id = bill_id
+                summary.last_billing_period = bill.billing_period
+            if payment_id:
+                payment = payments[payment_id]
+                summary.last_payment_id = payment_id
+                summary.last_payment_date = payment.payment_date
+                summary.last_payment_amount = payment.amount_paid
+        
+        for row in WaterUsage.objects.filter(household_id__in=batch).values('household_id').annotate(
+            total=models.Sum('liters_used')
+        ).order_by():
+            summaries[row['household_id']].total_liters_used = row['total'] or 0
+        
+        for row in Bill.objects.filter(household_id__in=batch).values('household_id').annotate(
+            bills=models.Count('bill_id'),
+            pending=models.Count('bill_id', filter=Q(status='Pending')),
+            overdue=models.Count('bill_id', filter=Q(status='Overdue')),
+            outstanding=models.Sum('balance_due', filter=~Q(status='Cancelled')),
+        ).order_by():
+            summary = summaries[row['household_id']]
+            summary.bills_count = row['bills']
+            summary.pending_bills_count = row['pending']
+            summary.overdue_bills_count = row['overdue']
+            summary.outstanding_balance = row['outstanding'] or 0
+        
+        month_start = date.today().replace(day=1)
+        for row in Payment.objects.filter(
+            bill__household_id__in=batch, payment_status='Completed'
+        ).values('bill__household_id').annotate(
+            payments=models.Count('payment_id'),
+            total=models.Sum('amount_paid'),
+            month_total=models.Sum('amount_paid', filter=Q(payment_date__gte=month_start)),
+        ).order_by():
+            summary = summaries[row['bill__household_id']]
+            summary.payments_count = row['payments']
+            summary.total_paid = row['total'] or 0
+            summary.paid_this_month = row['month_total'] or 0
+        
+        return summaries
+    
+    @classmethod
+    def apply_deltas(cls, deltas, batch_size=500):
+        """
+        Add {household_id: {counter field: delta}} to the summaries with one
+        UPDATE per batch. Households without a summary row yet get one
+        computed from scratch.
+        """
+        deltas = [(household_id, delta) for household_id, delta in deltas.items() if any(delta.values())]
+        for start in range(0, len(deltas), batch_size):
+            batch = deltas[start:start + batch_size]
+            updates = {}
+            for field in {field for household_id, delta in batch for field in delta}:
+                output_field = cls._meta.get_field(field)
+                whens = [
+                    models.When(household_id=household_id, then=models.Value(delta[field]))
+                    for household_id, delta in batch if delta.get(field)
+                ]
+                if whens:
+                    updates[field] = models.F(field) + models.Case(
+                        *whens, default=models.Value(0), output_field=output_field
+                    )
+            household_ids = [household_id for household_id, delta in batch]
+            updated = cls.objects.filter(household_id__in=household_ids).update(updated_at=timezone.now(), **updates)
+            if updated < len(household_ids):
+                cls._create_missing(household_ids)
+    
+    @classmethod
+    def _create_missing(cls, household_ids):
+        existing = set(cls.objects.filter(household_id__in=household_ids).values_list('household_id', flat=True))
+        cls.refresh([household_id for household_id in household_ids if household_id not in existing])
+    
+    @staticmethod
+    def bill_states(bill_ids):
+        """{bill_id: (household_id, status, balance_due)} for the given bills"""
+        return {
+            bill_id: (household_id, bill_status, balance_due)
+            for bill_id, household_id, bill_status, balance_due in Bill.objects.filter(
+                bill_id__in=list(bill_ids)
+            ).values_list('bill_id', 'household_id', 'status', 'balance_due')
+        }
+    
+    @classmethod
+    def apply_bill_changes(cls, before, after):
+        """Apply the counter changes between two bill_states() snapshots"""
+        deltas = {}
+        for states, sign in ((before, -1), (after, 1)):
+            for household_id, bill_status, balance_due in states.values():
+                delta = deltas.setdefault(household_id, {
+                    'bills_count': 0,
+                    'pending_bills_count': 0,
+                    'overdue_bills_count': 0,
+                    'outstanding_balance': Decimal('0'),
+                })
+                delta['bills_count'] += sign
+                delta['pending_bills_count'] += sign * (bill_status == 'Pending')
+                delta['overdue_bills_count'] += sign * (bill_status == 'Overdue')
+                if bill_status != 'Cancelled':
+                    delta['outstanding_balance'] += sign * balance_due
+        cls.apply_deltas(deltas)
+    
+    @classmethod
+    def record_usages(cls, usages, batch_size=500):
+        """
+        Count newly created usages: total_liters_used and, when of a later
+        (or the same) reading month, the last reading
+        """
+        totals = {}
+        for usage in usages:
+            liters, latest = totals.get(usage.household_id, (Decimal('0'), None))
+            if latest is None or usage.reading_month >= latest.reading_month:
+                latest = usage
+            totals[usage.household_id] = (liters + usage.liters_used, latest)
+        
+        money = models.DecimalField(max_digits=14, decimal_places=2)
+        totals = list(totals.items())
+        for start in range(0, len(totals), batch_size):
+            batch = totals[start:start + batch_size]
+            household_ids = [household_id for household_id, values in batch]
+            
+            def if_newer(value, output_field, field):
+                return models.Case(
+                    *[models.When(
+                        Q(household_id=household_id) & (
+                            Q(last_reading_month__isnull=True) | Q(last_reading_month__lte=values[1].reading_month)
+                        ),
+                        then=models.Value(value(values[1]))
+                    ) for household_id, values in batch],
+                    default=models.F(field),
+                    output_field=output_field
+                )
             
-            self.transaction_reference = f'TXN-{year}{month:02d}{day:02d}-{new_number:04d}'
+            # last_reading_month is compared before it is replaced (MySQL applies SET left to right)
+            updated = cls.objects.filter(household_id__in=household_ids).update(
+                total_liters_used=models.F('total_liters_used') + models.Case(
+                    *[models.When(household_id=household_id, then=models.Value(values[0]))
+                      for household_id, values in batch],
+                    default=models.Value(0),
+                    output_field=money
+                ),
+                last_reading=if_newer(lambda usage: usage.current_reading, money, 'last_reading'),
+                last_reading_date=if_newer(lambda usage: usage.reading_date, models.DateField(), 'last_reading_date'),
+                last_reading_month=if_newer(lambda usage: usage.reading_month, models.CharField(), 'last_reading_month'),
+                updated_at=timezone.now(),
+            )
+            if updated < len(household_ids):
+                cls._create_missing(household_ids)
+    
+    @classmethod
+    def record_bills(cls, bills, batch_size=500):
+        """
+        Count newly created bills (with household_id and bill_id set): bill
+        counters, outstanding balance and, when more recent, last_bill
+        """
+        totals = {}
+        for bill in bills:
+            count, pending, overdue, outstanding, latest = totals.get(bill.household_id, (0, 0, 0, Decimal('0'), None))
+            if latest is None or (bill.billing_period, bill.bill_id) > (latest.billing_period, latest.bill_id):
+                latest = bill
+            totals[bill.household_id] = (
+                count + 1,
+                pending + (bill.status == 'Pending'),
+                overdue + (bill.status == 'Overdue'),
+                outstanding + (bill.balance_due if bill.status != 'Cancelled' else 0),
+                latest,
+            )
         
-        super().save(*args, **kwargs)
+        money = models.DecimalField(max_digits=14, decimal_places=2)
+        totals = list(totals.items())
+        for start in range(0, len(totals), batch_size):
+            batch = totals[start:start + batch_size]
+            household_ids = [household_id for household_id, values in batch]
+            
+            def per_household(position, output_field):
+                return models.Case(
+                    *[models.When(household_id=household_id, then=models.Value(values[position]))
+                      for household_id, values in batch],
+                    default=models.Value(0),
+                    output_field=output_field
+                )
+            
+            def if_newer(value, output_field, field):
+                return models.Case(
+                    *[models.When(
+                        Q(household_id=household_id) & (
+                            Q(last_billing_period__isnull=True) | Q(last_billing_period__lte=values[4].billing_period)
+                        ),
+                        then=models.Value(value(values[4]))
+                    ) for household_id, values in batch],
+                    default=models.F(field),
+                    output_field=output_field
+                )
+            
+            # last_billing_period is compared before it is replaced (MySQL applies SET left to right)
+            updated = cls.objects.filter(household_id__in=household_ids).update(
+                bills_count=models.F('bills_count') + per_household(0, models.IntegerField()),
+                pending_bills_count=models.F('pending_bills_count') + per_household(1, models.IntegerField()),
+                overdue_bills_count=models.F('overdue_bills_count') + per_household(2, models.IntegerField()),
+                outstanding_balance=models.F('outstanding_balance') + per_household(3, money),
+                last_bill_id=if_newer(lambda bill: bill.bill_id, models.IntegerField(), 'last_bill_id'),
+                last_billing_period=if_newer(lambda bill: bill.billing_period, models.CharField(), 'last_billing_period'),
+                updated_at=timezone.now(),
+            )
+            if updated < len(household_ids):
+                cls._create_missing(household_ids)
+    
+    @classmethod
+    def record_payments(cls, payments, batch_size=500):
+        """
+        Count newly created Completed payments: payments_count, total_paid,
+        paid_this_month and, when more recent, last_payment
+        """
+        payments = [payment for payment in payments if payment.payment_status == 'Completed']
+        # bulk_create does not return primary keys on every backend
+        unsaved = {payment.receipt_number: payment for payment in payments if payment.payment_id is None}
+        receipts = list(unsaved)
+        for start in range(0, len(receipts), batch_size):
+            for receipt_number, payment_id in Payment.objects.filter(
+                receipt_number__in=receipts[start:start + batch_size]
+            ).values_list('receipt_number', 'payment_id'):
+                unsaved[receipt_number].payment_id = payment_id
+        uncached = list({payment.bill_id for payment in payments if not Payment.bill.is_cached(payment)})
+        households = {}
+        for start in range(0, len(uncached), batch_size):
+            households.update(Bill.objects.filter(
+                bill_id__in=uncached[start:start + batch_size]
+            ).values_list('bill_id', 'household_id'))
+        for payment in payments:
+            if payment.bill_id not in households:
+                households[payment.bill_id] = payment.bill.household_id
+        
+        this_month = date.today().strftime('%Y-%m')
+        totals = {}
+        for payment in payments:
+            household_id = households[payment.bill_id]
+            count, total, month_total, latest = totals.get(household_id, (0, Decimal('0'), Decimal('0'), None))
+            if str(payment.payment_date)[:7] == this_month:
+                month_total += payment.amount_paid
+            if latest is None or (payment.payment_date, payment.payment_id) > (latest.payment_date, latest.payment_id):
+                latest = payment
+            totals[household_id] = (count + 1, total + payment.amount_paid, month_total, latest)
+        
+        money = models.DecimalField(max_digits=14, decimal_places=2)
+        totals = list(totals.items())
+        for start in range(0, len(totals), batch_size):
+            batch = totals[start:start + batch_size]
+            household_ids = [household_id for household_id, values in batch]
+            
+            def per_household(value, output_field):
+                return models.Case(
+                    *[models.When(household_id=household_id, then=models.Value(value(values)))
+                      for household_id, values in batch],
+                    output_field=output_field
+                )
+            
+            def if_newer(value, output_field, field):
+                return models.Case(
+                    *[models.When(
+                        Q(household_id=household_id) & (
+                            Q(last_payment_date__isnull=True) | Q(last_payment_date__lte=values[3].payment_date)
+                        ),
+                        then=models.Value(value(values[3]))
+                    ) for household_id, values in batch],
+                    default=models.F(field),
+                    output_field=output_field
+                )
+            
+            # MySQL applies SET clauses left to right: paid_this_month reads the old
+            # paid_month, and last_payment_date is compared before it is replaced
+            updated = cls.objects.filter(household_id__in=household_ids).update(
+                payments_count=models.F('payments_count') + per_household(lambda values: values[0], models.IntegerField()),
+                total_paid=models.F('total_paid') + per_household(lambda values: values[1], money),
+                paid_this_month=models.Case(
+                    models.When(paid_month=this_month, then=models.F('paid_this_month') + per_household(
+                        lambda values: values[2], money
+                    )),
+                    default=per_household(lambda values: values[2], money),
+                    output_field=money
+                ),
+                paid_month=models.Value(this_month),
+                last_payment_amount=if_newer(lambda payment: payment.amount_paid, money, 'last_payment_amount'),
+                last_payment_id=if_newer(lambda payment: payment.payment_id, models.IntegerField(), 'last_payment_id'),
+                last_payment_date=if_newer(lambda payment: payment.payment_date, models.DateField(), 'last_payment_date'),
+                updated_at=timezone.now(),
+            )
+            if updated < len(household_ids):
+                cls._create_missing(household_ids)
+
+
+class BalanceSnapshot(models.Model):
+    """
+    A household's cumulative billed and paid totals at a month end.
+    As-of balance queries start from the nearest snapshot and add only the
+    bills and payments dated after it.
+    """
+    
+    snapshot_id = models.BigAutoField(primary_key=True)
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, related_name='balance_snapshots')
+    as_of = models.DateField()
+    billed_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created_date = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'balance_snapshots'
+        constraints = [
+            models.UniqueConstraint(fields=['household', 'as_of'], name='unique_balance_snapshot_per_date'),
+        ]
+        indexes = [
+            models.Index(fields=['as_of']),
+        ]
+    
+    def __str__(self):
+        return f"{self.household_id} @ {self.as_of}: {self.balance} RWF"
+
+    @classmethod
+    def apply_changes(cls, changes, batch_size=500):
+        """
+        Carry bill and payment changes into the snapshots taken since:
+        `changes` are (household_id, date, billed delta, paid delta), and
+        each is added to every snapshot of the household dated on or after
+        its date, creating the missing rows. Changes dated after the latest
+        snapshot cost one query.
+        """
+        changes = [
+            (household_id, day if isinstance(day, date) else date.fromisoformat(str(day)[:10]), billed, paid)
+            for household_id, day, billed, paid in changes
+            if household_id and (billed or paid)
+        ]
+        if not changes:
+            return
+        latest = cls.objects.aggregate(latest=models.Max('as_of'))['latest']
+        changes = [change for change in changes if latest and change[1] <= latest]
+        if not changes:
+            return
         
-        # Update bill status if fully paid
-        total_paid = self.bill.payments.filter(payment_status='Completed').aggregate(
-            total=models.Sum('amount_paid')
-        )['total'] or Decimal('0')
+        snapshot_dates = list(cls.objects.filter(
+            as_of__gte=min(day for household_id, day, billed, paid in changes)
+        ).order_by('as_of').values_list('as_of', flat=True).distinct())
+        totals = {}
+        for household_id, day, billed, paid in changes:
+            for as_of in snapshot_dates:
+                if as_of >= day:
+                    total = totals.setdefault((household_id, as_of), [Decimal('0'), Decimal('0')])
+                    total[0] += billed
+                    total[1] += paid
         
-        if total_paid >= self.bill.total_amount:
-            self.bill.status = 'Paid'
-            self.bill.save()
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [cls(household_id=household_id, as_of=as_of) for household_id, as_of in totals],
+                batch_size=batch_size,
+                update_conflicts=True,
+                # MySQL upserts on any unique key and rejects a conflict target
+                unique_fields=['household', 'as_of'] if connection.features.supports_update_conflicts_with_target else None,
+                update_fields=['as_of'],
+            )
+            money = models.DecimalField(max_digits=14, decimal_places=2)
+            for as_of in snapshot_dates:
+                rows = [(household_id, total) for (household_id, day), total in totals.items() if day == as_of]
+                for start in range(0, len(rows), batch_size):
+                    batch = rows[start:start + batch_size]
+                    
+                    def per_household(value):
+                        return models.Case(
+                            *[models.When(household_id=household_id, then=models.Value(value(total)))
+                              for household_id, total in batch],
+                            default=models.Value(0),
+                            output_field=money
+                        )
+                    
+                    cls.objects.filter(as_of=as_of, household_id__in=[row[0] for row in batch]).update(
+                        billed_total=models.F('billed_total') + per_household(lambda total: total[0]),
+                        paid_total=models.F('paid_total') + per_household(lambda total: total[1]),
+                        balance=models.F('balance') + per_household(lambda total: total[0] - total[1]),
+                    )
+    
+    @classmethod
+    def apply_payment_changes(cls, changes):
+        """apply_changes for (bill_id, payment date, paid delta) entries"""
+        changes = [change for change in changes if change[0] and change[2]]
+        if not changes or not cls.objects.filter(as_of__gte=min(
+            day if isinstance(day, date) else date.fromisoformat(str(day)[:10]) for bill_id, day, paid in changes
+        )).exists():
+            return
+        households = dict(Bill.objects.filter(
+            bill_id__in={bill_id for bill_id, day, paid in changes}
+        ).values_list('bill_id', 'household_id'))
+        cls.apply_changes(
+            (households.get(bill_id), day, Decimal('0'), paid) for bill_id, day, paid in changes
+        )
+
+
+class HouseholdUsageStats(models.Model):
+    """
+    Running statistics of a household's readings: count, total and total of
+    squares of liters used, and the most recent values. Adding a reading
+    updates them and flags the reading in O(1); corrections and deletions
+    rebuild them, and the flags, from the household's usages.
+    """
+    
+    RECENT_READINGS = 12
+    ANOMALY_FACTOR = Decimal('2.0')
+    
+    household = models.OneToOneField(Household, on_delete=models.CASCADE, primary_key=True, related_name='usage_stats')
+    readings_count = models.IntegerField(default=0)
+    liters_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    liters_squared_total = models.DecimalField(max_digits=24, decimal_places=4, default=0)
+    recent_liters = models.JSONField(default=list, blank=True)  # Last RECENT_READINGS values, oldest first
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'household_usage_stats'
     
     def __str__(self):
-        return f"{self.receipt_number} - {self.amount_paid} RWF"
+        return f"{self.household_id}: {self.readings_count} readings, mean {self.mean}L"
+    
+    @property
+    def mean(self):
+        if not self.readings_count:
+            return None
+        return self.liters_total / self.readings_count
+    
+    @property
+    def variance(self):
+        """Population variance of liters used"""
+        if not self.readings_count:
+            return None
+        return max(self.liters_squared_total / self.readings_count - self.mean ** 2, Decimal('0'))
+    
+    def is_anomaly(self, liters):
+        """More than ANOMALY_FACTOR times the mean of the readings so far"""
+        return self.liters_total > 0 and liters * self.readings_count > self.ANOMALY_FACTOR * self.liters_total
+    
+    def add(self, liters):
+        self.readings_count += 1
+        self.liters_total += liters
+        self.liters_squared_total += liters * liters
+        recent = f'{Decimal(liters):.2f}'
+        self.recent_liters = (list(self.recent_liters) + [recent])[-self.RECENT_READINGS:]
+    
+    @classmethod
+    def record(cls, usage):
+        """
+        Flag a new usage against its household's statistics (row locked) and
+        add it; the caller saves the returned stats after the usage
+        """
+        stats = cls.objects.select_for_update().filter(household_id=usage.household_id).first()
+        if stats is None:
+            cls.refresh([usage.household_id])
+            stats = cls.objects.select_for_update().get(household_id=usage.household_id)
+        usage.is_anomaly = stats.is_anomaly(usage.liters_used)
+        stats.add(usage.liters_used)
+        return stats
+    
+    @classmethod
+    def refresh(cls, household_ids=None, batch_size=1000):
+        """
+        Recompute the statistics of the given households (all households when
+        None) and the anomaly flags of their usages, replaying the usages in
+        the order they were recorded
+        """
+        if household_ids is None:
+            household_ids = Household.objects.values_list('household_id', flat=True)
+        household_ids = sorted({household_id for household_id in household_ids if household_id})
+        
+        for start in range(0, len(household_ids), batch_size):
+            batch = household_ids[start:start + batch_size]
+            stats = {household_id: cls(household_id=household_id, recent_liters=[]) for household_id in batch}
+            flagged, cleared = [], []
+            
+            for usage_id, household_id, liters, was_anomaly in WaterUsage.objects.filter(
+                household_id__in=batch
+            ).order_by('household_id', 'usage_id').values_list(
+                'usage_id', 'household_id', 'liters_used', 'is_anomaly'
+            ).iterator(chunk_size=2000):
+                household_stats = stats[household_id]
+                anomaly = household_stats.is_anomaly(liters)
+                if anomaly != was_anomaly:
+                    (flagged if anomaly else cleared).append(usage_id)
+                household_stats.add(liters)
+            
+            with transaction.atomic():
+                for usage_ids, anomaly in ((flagged, True), (cleared, False)):
+                    for chunk in range(0, len(usage_ids), batch_size):
+                        WaterUsage.objects.filter(
+                            usage_id__in=usage_ids[chunk:chunk + batch_size]
+                        ).update(is_anomaly=anomaly, updated_at=timezone.now())
+                cls.objects.filter(household_id__in=batch).delete()
+                cls.objects.bulk_create(stats.values(), batch_size=batch_size)
+
+
+class SyncTombstone(models.Model):
+    """
+    A deleted household, usage, tariff or bill, kept so that offline
+    devices drop it on their next sync. Written by a post_delete handler,
+    and by Household.save for a household and its usages and bills when it
+    moves out of `village` (devices syncing only that village drop them).
+    """
+    
+    MODEL_CHOICES = [
+        ('households', 'Household'),
+        ('usages', 'Water Usage'),
+        ('tariffs', 'Tariff Rate'),
+        ('bills', 'Bill'),
+    ]
+    
+    tombstone_id = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.IntegerField()
+    # Village the row moved out of; null for deleted rows
+    village = models.CharField(max_length=50, blank=True, null=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'sync_tombstones'
+        indexes = [
+            models.Index(fields=['deleted_at', 'tombstone_id']),
+        ]
+    
+    @classmethod
+    def record_move(cls, household, left_village):
+        """
+        Tombstone a household and its usages and bills in the village it left,
+        and touch the usages and bills so devices syncing the new village get them.
+        """
+        now = timezone.now()
+        usages = WaterUsage.objects.filter(household=household)
+        bills = Bill.objects.filter(household=household)
+        cls.objects.bulk_create(
+            [cls(model='households', object_id=household.pk, village=left_village)]
+            + [cls(model='usages', object_id=pk, village=left_village) for pk in usages.values_list('pk', flat=True)]
+            + [cls(model='bills', object_id=pk, village=left_village) for pk in bills.values_list('pk', flat=True)]
+        )
+        usages.update(updated_at=now)
+        bills.update(updated_at=now)
+    
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted {self.deleted_at}"
+
+
+class ReconciliationReport(models.Model):
+    """Result of reconciling a provider statement against recorded payments"""
+    
+    report_id = models.AutoField(primary_key=True)
+    provider = models.CharField(max_length=50)
+    payment_method = models.CharField(max_length=20, blank=True, null=True)
+    date_from = models.DateField()
+    date_to = models.DateField()
+    statement_rows = models.IntegerField(default=0)
+    matched_count = models.IntegerField(default=0)
+    missing_in_system_count = models.IntegerField(default=0)
+    missing_at_provider_count = models.IntegerField(default=0)
+    amount_mismatch_count = models.IntegerField(default=0)
+    statement_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    system_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='reconciliation_reports')
+    created_date = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'reconciliation_reports'
+        ordering = ['-created_date']
+    
+    def __str__(self):
+        return f"{self.provider} {self.date_from} - {self.date_to}"
+
 
+class ReconciliationItem(models.Model):
+    """One line of a reconciliation report"""
+    
+    RESULT_CHOICES = [
+        ('Matched', 'Matched'),
+        ('Missing in System', 'Missing in System'),
+        ('Missing at Provider', 'Missing at Provider'),
+        ('Amount Mismatch', 'Amount Mismatch'),
+    ]
+    
+    item_id = models.AutoField(primary_key=True)
+    report = models.ForeignKey(ReconciliationReport, on_delete=models.CASCADE, related_name='items')
+    result = models.CharField(max_length=20, choices=RESULT_CHOICES)
+    transaction_reference = models.CharField(max_length=100, blank=True, null=True)
+    statement_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    statement_date = models.DateField(null=True, blank=True)
+    system_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='reconciliation_items')
+    statement_line = models.IntegerField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'reconciliation_items'
+        indexes = [
+            models.Index(fields=['report', 'result']),
+        ]
+
+
+class PaymentCallback(models.Model):
+    """
+    Inbox of payment notifications pushed by a Mobile Money provider.
+    Rows are inserted as received and applied to bills later, in batches,
+    by the process_payment_callbacks worker.
+    """
+    
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Processing', 'Processing'),
+        ('Applied', 'Applied'),
+        ('Duplicate', 'Duplicate'),
+        ('Rejected', 'Rejected'),
+    ]
+    
+    callback_id = models.BigAutoField(primary_key=True)
+    provider = models.CharField(max_length=50, default='Mobile Money')
+    provider_transaction_id = models.CharField(max_length=100)
+    bill_number = models.CharField(max_length=30, blank=True, null=True)
+    household_code = models.CharField(max_length=20, blank=True, null=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payer_name = models.CharField(max_length=100, blank=True, null=True)
+    payer_phone = models.CharField(max_length=15, blank=True, null=True)
+    payment_date = models.DateField(null=True, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    claim_token = models.CharField(max_length=32, blank=True, null=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    message = models.TextField(blank=True, null=True)
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='callbacks')
+    received_date = models.DateTimeField(auto_now_add=True)
+    processed_date = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'payment_callbacks'
+        ordering = ['-callback_id']
+        indexes = [
+            models.Index(fields=['status', 'callback_id']),
+            models.Index(fields=['claim_token']),
+            models.Index(fields=['provider_transaction_id']),
+        ]
+        constraints = [
+            # A retried notification is stored (and applied) once
+            models.UniqueConstraint(fields=['provider', 'provider_transaction_id'], name='unique_callback_per_transaction'),
+        ]
+    
+    def __str__(self):
+        return f"{self.provider} {self.provider_transaction_id} - {self.status}"
 
 class SMSNotification(models.Model):
     """SMS Notification Log"""
@@ -92,3 +92,37 @@ class NotificationService:
                 message=f'New bill {bill.bill_number} for {bill.total_amount} RWF. Due: {bill.due_date}',
                 link=f'/bills'
             )
+    
+    @staticmethod
+    def notify_new_bills(bills):
+        """Notify households of a whole billing run in one insert"""
+        notifications = [
+            Notification(
+                user_id=bill.household.user_id,
+                notification_type='new_bill',
+                title='New Bill Generated',
+                message=f'New bill {bill.bill_number} for {bill.total_amount} RWF. Due: {bill.due_date}',
+                link=f'/bills'
+            )
+            for bill in bills
+            if bill.household.user_id
+        ]
+        Notification.objects.bulk_create(notifications, batch_size=1000)
+        return len(notifications)
+    
+    @staticmethod
+    def notify_admin_payments(payments):
+        """Notify households of a batch of recorded payments in one insert"""
+        notifications = [
+            Notification(
+                user_id=payment.bill.household.user_id,
+                notification_type='admin_payment',
+                title='Payment Recorded',
+                message=f'Payment of {payment.amount_paid} RWF recorded for bill {payment.bill.bill_number}',
+                link=f'/payments'
+            )
+            for payment in payments
+            if payment.bill.household.user_id
+        ]
+        Notification.objects.bulk_create(notifications, batch_size=1000)
+        return len(notifications)
@@ -0,0 +1,635 @@
+"""
+Payment posting for Village Water System
+"""
+import csv
+import io
+import logging
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, Count, Max, Min, Q, Sum, Value
+from django.db.models.functions import Cast, Concat, Left, Length, LPad
+from django.utils import timezone
+
+from .models import BalanceSnapshot, Bill, Household, HouseholdAccountSummary, Payment, PaymentCallback
+from .notification_service import NotificationService
+from .sequences import receipt_numbers, transaction_references
+from .sms_service import sms_service
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentImportError(Exception):
+    """Raised when an import file cannot be used at all (e.g. required columns missing)"""
+
+
+class PaymentError(Exception):
+    """Raised when a payment cannot be posted against its bill"""
+
+
+class PaymentService:
+    """
+    Payment posting.
+
+    Single payments are posted under a row lock on their bill. Bulk imports
+    (Mobile Money / bank statements) match rows to bills with a fixed number
+    of lookups, lock those bills, write payments with bulk_create using a
+    reserved block of receipt numbers, and update bill balances and statuses
+    set-wise.
+    Provider callbacks are queued in an inbox and applied the same way.
+    """
+
+    BATCH_SIZE = 1000
+    # Largest amount the DecimalField(max_digits=10, decimal_places=2) amount columns hold
+    MAX_AMOUNT = Decimal('99999999.99')
+
+    # Accepted header spellings -> field
+    COLUMNS = {
+        'bill_number': 'bill_number',
+        'bill': 'bill_number',
+        'household_code': 'household_code',
+        'household': 'household_code',
+        'amount': 'amount',
+        'amount_paid': 'amount',
+        'transaction_reference': 'reference',
+        'reference': 'reference',
+        'transaction_id': 'reference',
+        'payer_name': 'payer_name',
+        'payer_phone': 'payer_phone',
+        'phone': 'payer_phone',
+        'payment_date': 'payment_date',
+        'date': 'payment_date',
+        'payment_method': 'payment_method',
+    }
+
+    @staticmethod
+    def post_payment(bill, amount_paid, **fields):
+        """
+        Post one payment against `bill` (instance or id), Completed unless
+        fields give another payment_status.
+
+        Runs in a transaction that locks only the bill row (SELECT ... FOR
+        UPDATE), so concurrent posters against the same bill queue up and the
+        balance check cannot be raced; payments on other bills are not
+        blocked. Only a Completed payment is checked against the balance, as
+        only it counts towards the bill. The balance is then updated in place.
+        The receipt number and transaction reference are reserved before the
+        bill is locked, so the shared counters are never held behind a bill
+        lock; a rejected payment leaves a gap in the numbering.
+        """
+        bill_id = getattr(bill, 'pk', bill)
+        fields.setdefault('payment_status', 'Completed')
+        if not fields.get('receipt_number'):
+            fields['receipt_number'] = receipt_numbers()[0]
+        if not fields.get('transaction_reference'):
+            fields['transaction_reference'] = transaction_references()[0]
+        with transaction.atomic():
+            locked = Bill.objects.select_for_update().only(
+                'bill_id', 'bill_number', 'status', 'balance_due'
+            ).get(pk=bill_id)
+            if fields['payment_status'] == 'Completed':
+                PaymentService._check_balance(locked, amount_paid)
+
+            payment = Payment(bill_id=bill_id, amount_paid=amount_paid, **fields)
+            payment.save()
+        return payment
+
+    @staticmethod
+    def update_payment(payment, **fields):
+        """
+        Apply `fields` to an existing payment the way post_payment posts one:
+        its old and new bill rows are locked (in bill_id order) and the
+        payment is re-read under the lock before a Completed result is
+        checked against the balance, not counting what it already paid.
+        Returns the saved payment.
+        """
+        new_bill_id = fields['bill'].pk if 'bill' in fields else payment.bill_id
+        with transaction.atomic():
+            bills = Bill.objects.select_for_update().only(
+                'bill_id', 'bill_number', 'status', 'balance_due'
+            ).filter(pk__in={payment.bill_id, new_bill_id}).order_by('bill_id').in_bulk()
+            current = Payment.objects.select_for_update().get(pk=payment.pk)
+            counted_bill_id, counted = current._loaded_contribution
+            for field, value in fields.items():
+                setattr(current, field, value)
+            if current.payment_status == 'Completed':
+                PaymentService._check_balance(
+                    bills[new_bill_id], current.amount_paid, counted if counted_bill_id == new_bill_id else Decimal('0')
+                )
+            current.save()
+        return current
+
+    @staticmethod
+    def _check_balance(bill, amount, already_paid=Decimal('0')):
+        """Raise PaymentError unless `amount` (replacing `already_paid`) fits the locked bill's balance"""
+        if bill.status == 'Cancelled':
+            raise PaymentError(f"Bill {bill.bill_number} is cancelled")
+        remaining = bill.balance_due + already_paid
+        if amount > remaining:
+            raise PaymentError(f"Payment amount ({amount}) exceeds remaining bill amount ({remaining})")
+
+    @classmethod
+    def read_csv(cls, uploaded_file):
+        """
+        Yield one dict per CSV row, reading the upload line by line.
+        Headers are matched case-insensitively against COLUMNS.
+        """
+        stream = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+        reader = csv.reader(stream)
+        header = next(reader, None)
+        if not header:
+            raise PaymentImportError('The file is empty')
+
+        fields = [cls.COLUMNS.get(name.strip().lower().replace(' ', '_')) for name in header]
+        if 'amount' not in fields or not {'bill_number', 'household_code'} & set(fields):
+            raise PaymentImportError('The file needs an amount column and a bill_number or household_code column')
+
+        for values in reader:
+            if not any(value.strip() for value in values):
+                continue
+            yield {
+                field: value.strip()
+                for field, value in zip(fields, values)
+                if field
+            }
+
+    @classmethod
+    def import_rows(cls, rows, received_by=None, payment_method='Mobile Money', notify=True, first_row=2):
+        """
+        Import payment rows (dicts as produced by read_csv). Report rows are
+        numbered from first_row (2: the first line after a CSV header).
+
+        A row naming a bill_number pays that bill; a row naming a
+        household_code pays the household's open bills, oldest first.
+        Rows that fail validation, would overpay, or repeat a transaction
+        reference already on record are reported and skipped; the rest are
+        imported together in one transaction.
+        Returns a summary with a per-row report.
+        """
+        report = []
+        entries = []
+        methods = {choice for choice, label in Payment.PAYMENT_METHOD_CHOICES}
+
+        for row_number, row in enumerate(rows, start=first_row):
+            entry, error = cls._parse_row(row, methods, payment_method)
+            if error:
+                report.append(cls._row_result(row_number, 'error', error, row=row))
+                continue
+            entry['row'] = row_number
+            entries.append(entry)
+
+        payments = []
+        imported = []
+        # Balances are read and spent under row locks on the bills, so a
+        # concurrent post_payment or import cannot overpay them. References
+        # are checked after the locks are taken: an import or callback batch
+        # posting the same transaction to the same bill has committed by then
+        # (READ COMMITTED), so it is seen as a duplicate instead of paid twice
+        with transaction.atomic():
+            bills_by_number, open_bills_by_household = cls._load_bills(entries)
+            known_references = cls._existing_references(
+                [entry['reference'] for entry in entries if entry['reference']]
+            )
+            remaining = {}
+
+            for entry in entries:
+                reference = entry['reference']
+                if reference and reference in known_references:
+                    report.append(cls._row_result(
+                        entry['row'], 'duplicate', f'Transaction {reference} was already imported', entry=entry
+                    ))
+                    continue
+
+                allocations, error = cls._allocate(entry, bills_by_number, open_bills_by_household, remaining)
+                if error:
+                    report.append(cls._row_result(entry['row'], 'error', error, entry=entry))
+                    continue
+
+                if reference:
+                    known_references.add(reference)
+                for bill, amount in allocations:
+                    remaining[bill.bill_id] -= amount
+
+                entry_payments = [
+                    Payment(
+                        bill=bill,
+                        amount_paid=amount,
+                        payment_date=entry['payment_date'],
+                        payment_time=datetime.now().time(),
+                        payment_method=entry['payment_method'],
+                        transaction_reference=reference and (reference if position == 0 else f'{reference}-{position + 1}'),
+                        payer_name=entry['payer_name'] or bill.household.head_of_household,
+                        payer_phone=entry['payer_phone'] or None,
+                        payment_status='Completed',
+                        received_by=received_by,
+                        submitted_by=received_by,
+                    )
+                    for position, (bill, amount) in enumerate(allocations)
+                ]
+                payments.extend(entry_payments)
+                imported.append((entry, entry_payments))
+
+            if payments:
+                for payment, receipt_number in zip(payments, receipt_numbers(len(payments))):
+                    payment.receipt_number = receipt_number
+                unreferenced = [payment for payment in payments if not payment.transaction_reference]
+                if unreferenced:
+                    for payment, reference in zip(unreferenced, transaction_references(len(unreferenced))):
+                        payment.transaction_reference = reference
+
+                Payment.objects.bulk_create(payments, batch_size=cls.BATCH_SIZE)
+
+                totals = defaultdict(Decimal)
+                for payment in payments:
+                    totals[payment.bill_id] += payment.amount_paid
+                Payment.apply_to_bills(totals)
+                HouseholdAccountSummary.record_payments(payments)
+                BalanceSnapshot.apply_changes(
+                    (payment.bill.household_id, payment.payment_date, Decimal('0'), payment.amount_paid)
+                    for payment in payments
+                )
+
+        if payments and notify:
+            try:
+                sms_service.send_payment_confirmations(payments)
+                NotificationService.notify_admin_payments(payments)
+            except Exception as e:
+                logger.error(f"Failed to send payment notifications: {e}")
+
+        report.extend(
+            cls._row_result(entry['row'], 'imported', entry=entry, payments=entry_payments)
+            for entry, entry_payments in imported
+        )
+        report.sort(key=lambda result: result['row'])
+        counts = defaultdict(int)
+        for result in report:
+            counts[result['status']] += 1
+
+        logger.info(
+            f"Payment import: {counts['imported']} rows imported, {counts['duplicate']} duplicates, "
+            f"{counts['error']} errors"
+        )
+
+        return {
+            'rows_read': len(report),
+            'imported': counts['imported'],
+            'duplicates': counts['duplicate'],
+            'errors': counts['error'],
+            'payments_created': len(payments),
+            'total_amount': sum((payment.amount_paid for payment in payments), Decimal('0.00')),
+            'rows': report,
+        }
+
+    @staticmethod
+    def cash_up(date_from, date_to, received_by=None, payment_method=None):
+        """
+        Completed payments taken per collector and payment method between
+        date_from and date_to: count, total and first/last receipt number.
+        Computed by one grouped aggregate query.
+        """
+        payments = Payment.objects.filter(
+            payment_status='Completed',
+            payment_date__gte=date_from,
+            payment_date__lte=date_to
+        )
+        if received_by:
+            payments = payments.filter(received_by_id=received_by)
+        if payment_method:
+            payments = payments.filter(payment_method=payment_method)
+
+        # Receipt numbers (RCP-YYYYMM-N...) grow past four digits within a month,
+        # so order them by month, then length, then text
+        receipt_key = Concat(
+            Left('receipt_number', 10),
+            LPad(Cast(Length('receipt_number'), CharField()), 3, Value('0')),
+            'receipt_number',
+            output_field=CharField()
+        )
+        groups = payments.values(
+            'received_by', 'received_by__username', 'received_by__full_name', 'payment_method'
+        ).annotate(
+            count=Count('payment_id'),
+            total=Sum('amount_paid'),
+            first_receipt=Min(receipt_key),
+            last_receipt=Max(receipt_key),
+        ).order_by('received_by__full_name', 'received_by', 'payment_method')
+
+        collectors = {}
+        for group in groups:
+            collector = collectors.setdefault(group['received_by'], {
+                'received_by': group['received_by'],
+                'username': group['received_by__username'] or 'System',
+                'full_name': group['received_by__full_name'] or 'System',
+                'count': 0,
+                'total': Decimal('0.00'),
+                'methods': [],
+            })
+            collector['count'] += group['count']
+            collector['total'] += group['total']
+            collector['methods'].append({
+                'payment_method': group['payment_method'],
+                'count': group['count'],
+                'total': group['total'],
+                'first_receipt': group['first_receipt'][13:],
+                'last_receipt': group['last_receipt'][13:],
+            })
+
+        collectors = list(collectors.values())
+        return {
+            'date_from': date_from,
+            'date_to': date_to,
+            'count': sum(collector['count'] for collector in collectors),
+            'total': sum((collector['total'] for collector in collectors), Decimal('0.00')),
+            'collectors': collectors,
+        }
+
+    @staticmethod
+    def record_callback(data, provider='Mobile Money'):
+        """
+        Store one provider payment notification in the callback inbox with a
+        single INSERT. Only the shape of the notification is checked here;
+        matching it to bills happens in apply_callbacks. A retry of a
+        transaction already in the inbox returns the stored callback, so
+        each provider transaction is applied once whichever worker claims it.
+        """
+        transaction_id = str(data.get('transaction_id') or data.get('transaction_reference') or '').strip()
+        bill_number = str(data.get('bill_number') or '').strip()
+        household_code = str(data.get('household_code') or '').strip()
+        if not transaction_id:
+            raise PaymentError('transaction_id is required')
+        if not bill_number and not household_code:
+            raise PaymentError('bill_number or household_code is required')
+        try:
+            amount = Decimal(str(data.get('amount', ''))).quantize(Decimal('0.01'))
+            if not amount.is_finite():
+                raise InvalidOperation(amount)
+        except InvalidOperation:
+            raise PaymentError(f"Invalid amount '{data.get('amount', '')}'")
+        if amount <= 0:
+            raise PaymentError('Payment amount must be greater than 0')
+        if amount > PaymentService.MAX_AMOUNT:
+            raise PaymentError(f'Payment amount must not exceed {PaymentService.MAX_AMOUNT}')
+        payment_date = None
+        if data.get('payment_date'):
+            try:
+                payment_date = datetime.strptime(str(data['payment_date'])[:10], '%Y-%m-%d').date()
+            except ValueError:
+                raise PaymentError(f"Invalid payment date '{data['payment_date']}' (use YYYY-MM-DD)")
+
+        try:
+            with transaction.atomic():
+                return PaymentCallback.objects.create(
+                    provider=provider,
+                    provider_transaction_id=transaction_id[:100],
+                    bill_number=bill_number[:30] or None,
+                    household_code=household_code[:20] or None,
+                    amount=amount,
+                    payer_name=str(data.get('payer_name') or '')[:100] or None,
+                    payer_phone=str(data.get('payer_phone') or '')[:15] or None,
+                    payment_date=payment_date,
+                    payload=data,
+                )
+        except IntegrityError:
+            return PaymentCallback.objects.get(provider=provider, provider_transaction_id=transaction_id[:100])
+
+    @staticmethod
+    def release_stale_claims():
+        """
+        Put callbacks claimed more than PAYMENT_CALLBACK_CLAIM_TIMEOUT seconds
+        ago and never finished (the worker died or the batch failed) back to
+        Pending. Returns how many. The timeout must be longer than a batch
+        takes; a reclaimed callback that was applied after all is caught as a
+        duplicate by its transaction id.
+        """
+        stale = timezone.now() - timedelta(seconds=settings.PAYMENT_CALLBACK_CLAIM_TIMEOUT)
+        released = PaymentCallback.objects.filter(
+            Q(claimed_at__lt=stale) | Q(claimed_at__isnull=True), status='Processing'
+        ).update(
+            status='Pending',
+            claim_token=None,
+            claimed_at=None
+        )
+        if released:
+            logger.warning(f"Released {released} payment callbacks from stale claims")
+        return released
+
+    @classmethod
+    def claim_callbacks(cls, batch_size=1000):
+        """
+        Move up to batch_size Pending callbacks to Processing and return them,
+        oldest first, after releasing stale claims. The conditional UPDATE
+        lets several workers share the inbox.
+        """
+        cls.release_stale_claims()
+        pending = PaymentCallback.objects.filter(status='Pending').order_by('callback_id')
+        callback_ids = list(pending.values_list('callback_id', flat=True)[:batch_size])
+        if not callback_ids:
+            return []
+        token = uuid.uuid4().hex
+        PaymentCallback.objects.filter(callback_id__in=callback_ids, status='Pending').update(
+            status='Processing',
+            claim_token=token,
+            claimed_at=timezone.now()
+        )
+        return list(PaymentCallback.objects.filter(claim_token=token).order_by('callback_id'))
+
+    @classmethod
+    def apply_callbacks(cls, callbacks, notify=True):
+        """
+        Apply claimed callbacks as one payment import. Callbacks repeating a
+        provider transaction id (in this batch or already on record) are
+        marked Duplicate, ones that cannot be posted Rejected, and the
+        outcome is written back with one bulk update. Returns the counts.
+        """
+        rows = [
+            {
+                'bill_number': callback.bill_number or '',
+                'household_code': callback.household_code or '',
+                'amount': str(callback.amount),
+                'reference': callback.provider_transaction_id,
+                'payer_name': callback.payer_name or '',
+                'payer_phone': callback.payer_phone or '',
+                'payment_date': callback.payment_date.isoformat() if callback.payment_date else '',
+            }
+            for callback in callbacks
+        ]
+        summary = cls.import_rows(rows, payment_method='Mobile Money', notify=notify, first_row=0)
+
+        receipts = [result['receipt_numbers'][0] for result in summary['rows'] if result['receipt_numbers']]
+        payment_ids = {}
+        for start in range(0, len(receipts), cls.BATCH_SIZE):
+            payment_ids.update(Payment.objects.filter(
+                receipt_number__in=receipts[start:start + cls.BATCH_SIZE]
+            ).values_list('receipt_number', 'payment_id'))
+
+        statuses = {'imported': 'Applied', 'duplicate': 'Duplicate', 'error': 'Rejected'}
+        processed_date = timezone.now()
+        for result in summary['rows']:
+            callback = callbacks[result['row']]
+            callback.status = statuses[result['status']]
+            callback.message = result['message'] or None
+            callback.payment_id = payment_ids.get(result['receipt_numbers'][0]) if result['receipt_numbers'] else None
+            callback.processed_date = processed_date
+        PaymentCallback.objects.bulk_update(
+            callbacks, ['status', 'message', 'payment', 'processed_date'], batch_size=cls.BATCH_SIZE
+        )
+
+        return {
+            'callbacks': len(callbacks),
+            'applied': summary['imported'],
+            'duplicates': summary['duplicates'],
+            'rejected': summary['errors'],
+            'total_amount': summary['total_amount'],
+        }
+
+    @staticmethod
+    def _parse_row(row, methods, default_method):
+        """Validate one row; returns (entry, None) or (None, error message)"""
+        bill_number = row.get('bill_number', '')
+        household_code = row.get('household_code', '')
+        if not bill_number and not household_code:
+            return None, 'Row has neither a bill number nor a household code'
+
+        try:
+            amount = Decimal(row.get('amount', '').replace(',', '')).quantize(Decimal('0.01'))
+            if not amount.is_finite():
+                raise InvalidOperation(amount)
+        except InvalidOperation:
+            return None, f"Invalid amount '{row.get('amount', '')}'"
+        if amount <= 0:
+            return None, 'Payment amount must be greater than 0'
+        if amount > PaymentService.MAX_AMOUNT:
+            return None, f'Payment amount must not exceed {PaymentService.MAX_AMOUNT}'
+
+        payment_date = date.today()
+        if row.get('payment_date'):
+            try:
+                payment_date = datetime.strptime(row['payment_date'][:10], '%Y-%m-%d').date()
+            except ValueError:
+                return None, f"Invalid payment date '{row['payment_date']}' (use YYYY-MM-DD)"
+
+        method = row.get('payment_method') or default_method
+        if method not in methods:
+            return None, f"Unknown payment method '{method}'"
+
+        return {
+            'bill_number': bill_number,
+            'household_code': household_code,
+            'amount': amount,
+            'reference': row.get('reference', ''),
+            'payer_name': row.get('payer_name', ''),
+            'payer_phone': row.get('payer_phone', ''),
+            'payment_date': payment_date,
+            'payment_method': method,
+        }, None
+
+    @classmethod
+    def _existing_references(cls, references):
+        """Transaction references already on record, looked up in batches"""
+        references = list(set(references))
+        found = set()
+        for start in range(0, len(references), cls.BATCH_SIZE):
+            found.update(Payment.objects.filter(
+                transaction_reference__in=references[start:start + cls.BATCH_SIZE]
+            ).values_list('transaction_reference', flat=True))
+        return found
+
+    @classmethod
+    def _load_bills(cls, entries):
+        """
+        Bills named by number, and open bills (oldest first) of the households
+        named by code, locked (SELECT ... FOR UPDATE) in bill_id order so
+        concurrent imports and posters queue up instead of deadlocking.
+        Must run inside a transaction.
+        """
+        numbers = list({entry['bill_number'] for entry in entries if entry['bill_number']})
+        codes = list({entry['household_code'] for entry in entries if entry['household_code'] and not entry['bill_number']})
+
+        bill_ids = set()
+        for start in range(0, len(numbers), cls.BATCH_SIZE):
+            bill_ids.update(Bill.objects.filter(
+                bill_number__in=numbers[start:start + cls.BATCH_SIZE]
+            ).values_list('bill_id', flat=True))
+        for start in range(0, len(codes), cls.BATCH_SIZE):
+            bill_ids.update(Bill.objects.filter(
+                household__household_code__in=codes[start:start + cls.BATCH_SIZE],
+                balance_due__gt=0
+            ).exclude(status='Cancelled').values_list('bill_id', flat=True))
+
+        # Balances are read again from the locked rows
+        bill_ids = sorted(bill_ids)
+        bills = []
+        for start in range(0, len(bill_ids), cls.BATCH_SIZE):
+            bills.extend(Bill.objects.select_for_update().filter(
+                bill_id__in=bill_ids[start:start + cls.BATCH_SIZE]
+            ).order_by('bill_id'))
+        households = {}
+        household_ids = sorted({bill.household_id for bill in bills})
+        for start in range(0, len(household_ids), cls.BATCH_SIZE):
+            households.update(Household.objects.in_bulk(household_ids[start:start + cls.BATCH_SIZE]))
+
+        bills_by_number = {}
+        open_bills_by_household = defaultdict(list)
+        numbers, codes = set(numbers), set(codes)
+        for bill in sorted(bills, key=lambda bill: (bill.due_date, bill.bill_id)):
+            bill.household = households[bill.household_id]
+            if bill.bill_number in numbers:
+                bills_by_number[bill.bill_number] = bill
+            if bill.household.household_code in codes and bill.balance_due > 0 and bill.status != 'Cancelled':
+                open_bills_by_household[bill.household.household_code].append(bill)
+
+        return bills_by_number, open_bills_by_household
+
+    @staticmethod
+    def _allocate(entry, bills_by_number, open_bills_by_household, remaining):
+        """Split a row's amount over bills; returns ([(bill, amount)], None) or (None, error message)"""
+        amount = entry['amount']
+
+        if entry['bill_number']:
+            bill = bills_by_number.get(entry['bill_number'])
+            if bill is None:
+                return None, f"Bill {entry['bill_number']} not found"
+            if bill.status == 'Cancelled':
+                return None, f"Bill {bill.bill_number} is cancelled"
+            if entry['household_code'] and entry['household_code'] != bill.household.household_code:
+                return None, f"Bill {bill.bill_number} does not belong to household {entry['household_code']}"
+            balance = remaining.setdefault(bill.bill_id, bill.balance_due)
+            if amount > balance:
+                return None, f"Payment amount ({amount}) exceeds remaining bill amount ({balance})"
+            return [(bill, amount)], None
+
+        bills = open_bills_by_household.get(entry['household_code'], [])
+        outstanding = sum(remaining.setdefault(bill.bill_id, bill.balance_due) for bill in bills)
+        if not bills or outstanding <= 0:
+            return None, f"No outstanding bill found for household {entry['household_code']}"
+        if amount > outstanding:
+            return None, f"Payment amount ({amount}) exceeds outstanding balance ({outstanding})"
+
+        allocations = []
+        left = amount
+        for bill in bills:
+            share = min(left, remaining[bill.bill_id])
+            if share > 0:
+                allocations.append((bill, share))
+                left -= share
+            if not left:
+                break
+        return allocations, None
+
+    @staticmethod
+    def _row_result(row_number, result, message='', row=None, entry=None, payments=()):
+        source = entry or row or {}
+        return {
+            'row': row_number,
+            'status': result,
+            'message': message,
+            'bill_number': source.get('bill_number', ''),
+            'household_code': source.get('household_code', ''),
+            'amount': str(source.get('amount', '')),
+            'receipt_numbers': [payment.receipt_number for payment in payments],
+            'paid_bills': [payment.bill.bill_number for payment in payments],
+        }
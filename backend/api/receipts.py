@@ -0,0 +1,221 @@
+"""
+Payment receipt PDFs for Village Water System
+
+Receipts are drawn straight onto a reportlab canvas from a page layout
+computed once at import time (no platypus flowables), written once to a
+file cache keyed by receipt number and payment version, and served from
+disk afterwards.
+
+Field collectors get a compact form instead: fixed-width plain text for
+58/80 mm thermal printers, or a short-keyed JSON object, both filled in
+from precompiled templates in a few hundred bytes.
+"""
+import glob
+import io
+import json
+import os
+import tempfile
+import unicodedata
+from functools import lru_cache
+
+from django.conf import settings
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+PAGE_WIDTH, PAGE_HEIGHT = letter
+
+LABELS = [
+    'Receipt Number:', 'Date:', 'Time:', 'Payer Name:', 'Household:', 'Household Code:',
+    'Bill Number:', 'Billing Period:', 'Payment Method:', 'Transaction Ref:', 'Amount Paid:', 'Status:',
+]
+
+# Page template: a two-column table centred under the title
+_ROW_HEIGHT = 28
+_LABEL_WIDTH = 200
+_VALUE_WIDTH = 200
+_TABLE_LEFT = (PAGE_WIDTH - _LABEL_WIDTH - _VALUE_WIDTH) / 2
+_TABLE_TOP = PAGE_HEIGHT - 170
+_TABLE_BOTTOM = _TABLE_TOP - _ROW_HEIGHT * len(LABELS)
+_ROW_TOPS = [_TABLE_TOP - _ROW_HEIGHT * row for row in range(len(LABELS) + 1)]
+_TEXT_BASELINES = [top - _ROW_HEIGHT + 10 for top in _ROW_TOPS[:-1]]
+
+
+def _draw_template(pdf):
+    """Static parts of the receipt: title, label column and grid"""
+    pdf.setFont('Helvetica-Bold', 24)
+    pdf.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 90, 'VILLAGE WATER SYSTEM')
+    pdf.setFont('Helvetica-Bold', 16)
+    pdf.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 120, 'Payment Receipt')
+
+    pdf.setFillColor(colors.lightgrey)
+    pdf.rect(_TABLE_LEFT, _TABLE_BOTTOM, _LABEL_WIDTH, _TABLE_TOP - _TABLE_BOTTOM, stroke=0, fill=1)
+
+    pdf.setStrokeColor(colors.black)
+    pdf.setLineWidth(1)
+    for top in _ROW_TOPS:
+        pdf.line(_TABLE_LEFT, top, _TABLE_LEFT + _LABEL_WIDTH + _VALUE_WIDTH, top)
+    for x in (_TABLE_LEFT, _TABLE_LEFT + _LABEL_WIDTH, _TABLE_LEFT + _LABEL_WIDTH + _VALUE_WIDTH):
+        pdf.line(x, _TABLE_TOP, x, _TABLE_BOTTOM)
+
+    pdf.setFillColor(colors.black)
+    pdf.setFont('Helvetica-Bold', 10)
+    for label, baseline in zip(LABELS, _TEXT_BASELINES):
+        pdf.drawString(_TABLE_LEFT + 6, baseline, label)
+
+    pdf.setFont('Helvetica-Oblique', 10)
+    pdf.drawString(_TABLE_LEFT, _TABLE_BOTTOM - 36, 'Thank you for your payment!')
+
+
+def receipt_values(payment):
+    """Value column of the receipt, in LABELS order"""
+    bill = payment.bill
+    return [
+        payment.receipt_number,
+        str(payment.payment_date),
+        str(payment.payment_time),
+        payment.payer_name,
+        bill.household.household_name,
+        bill.household.household_code,
+        bill.bill_number,
+        bill.billing_period,
+        payment.payment_method,
+        payment.transaction_reference or 'N/A',
+        f"{payment.amount_paid} RWF",
+        payment.payment_status,
+    ]
+
+
+def render_receipt(payment):
+    """Render the receipt PDF and return its bytes"""
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    pdf.setTitle(f"Receipt {payment.receipt_number}")
+    _draw_template(pdf)
+
+    pdf.setFont('Helvetica', 10)
+    for value, baseline in zip(receipt_values(payment), _TEXT_BASELINES):
+        pdf.drawString(_TABLE_LEFT + _LABEL_WIDTH + 6, baseline, str(value)[:40])
+
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def receipt_version(payment):
+    """Changes whenever the payment is saved"""
+    return payment.updated_date.strftime('%Y%m%d%H%M%S%f') if payment.updated_date else '0'
+
+
+def receipt_etag(payment, variant=None):
+    """ETag of one representation (PDF by default) of this version of the receipt"""
+    suffix = f'-{variant}' if variant else ''
+    return f'"{payment.receipt_number}-{receipt_version(payment)}{suffix}"'
+
+
+def _cache_dir(payment):
+    # One directory per receipt prefix (RCP-YYYYMM) keeps directories small
+    prefix = payment.receipt_number.rsplit('-', 1)[0]
+    return os.path.join(str(settings.RECEIPT_CACHE_DIR), prefix)
+
+
+def get_receipt_file(payment):
+    """
+    Path of the cached PDF for this version of the payment, rendering it on
+    first use. Older versions of the same receipt are removed.
+    """
+    directory = _cache_dir(payment)
+    path = os.path.join(directory, f"{payment.receipt_number}-{receipt_version(payment)}.pdf")
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.receipt-', suffix='.pdf')
+    with os.fdopen(fd, 'wb') as receipt_file:
+        receipt_file.write(render_receipt(payment))
+    os.replace(tmp_path, path)
+
+    for stale in glob.glob(os.path.join(directory, f"{glob.escape(payment.receipt_number)}-*.pdf")):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return path
+
+
+# Compact receipts: payment values in this order, as fetched by values_list()
+COMPACT_FIELDS = (
+    'receipt_number', 'payment_date', 'payment_time', 'payer_name',
+    'bill__household__household_name', 'bill__household__household_code',
+    'bill__bill_number', 'bill__billing_period', 'payment_method',
+    'transaction_reference', 'amount_paid', 'payment_status',
+)
+COMPACT_KEYS = ('r', 'd', 't', 'p', 'hn', 'h', 'b', 'bp', 'm', 'x', 'a', 's')
+TEXT_LABELS = (
+    'Receipt', 'Date', 'Time', 'Payer', 'Household', 'Code',
+    'Bill', 'Period', 'Method', 'Ref', 'Amount', 'Status',
+)
+# Characters per line: 58 mm printers (font A), 80 mm printers (font B / font A)
+TEXT_WIDTHS = (32, 42, 48)
+_LABEL_COLUMN = 10
+
+
+def compact_values(payment):
+    """COMPACT_FIELDS of a payment instance (bill and household loaded)"""
+    bill = payment.bill
+    return (
+        payment.receipt_number, payment.payment_date, payment.payment_time, payment.payer_name,
+        bill.household.household_name, bill.household.household_code,
+        bill.bill_number, bill.billing_period, payment.payment_method,
+        payment.transaction_reference, payment.amount_paid, payment.payment_status,
+    )
+
+
+@lru_cache(maxsize=None)
+def _text_template(width):
+    """str.format template for one receipt `width` characters wide"""
+    value_width = width - _LABEL_COLUMN
+    rule = '-' * width
+    lines = [
+        'VILLAGE WATER SYSTEM'.center(width).rstrip(),
+        'Payment Receipt'.center(width).rstrip(),
+        rule,
+    ]
+    for position, label in enumerate(TEXT_LABELS):
+        lines.append(f'{label:<{_LABEL_COLUMN}}{{{position}:>{value_width}.{value_width}}}')
+        if label == 'Method':
+            lines.append(rule)
+    lines += [rule, 'Thank you for your payment!'.center(width).rstrip(), '', '']
+    return '\n'.join(lines)
+
+
+def _printable(value):
+    # Thermal printer code pages have no accents; fold them to plain ASCII
+    return unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
+
+
+def render_receipt_text(values, width=32):
+    """Fixed-width plain text receipt from COMPACT_FIELDS values"""
+    (receipt_number, payment_date, payment_time, payer_name, household_name, household_code,
+     bill_number, billing_period, payment_method, reference, amount, payment_status) = values
+    return _text_template(width).format(*(_printable(str(value)) for value in (
+        receipt_number, payment_date, payment_time.strftime('%H:%M'), payer_name, household_name,
+        household_code, bill_number, billing_period, payment_method, reference or 'N/A',
+        f'{amount} RWF', payment_status,
+    )))
+
+
+def receipt_json(values):
+    """Short-keyed dict of COMPACT_FIELDS values; transaction ref left out when blank"""
+    data = dict(zip(COMPACT_KEYS, values))
+    data['d'] = str(data['d'])
+    data['t'] = data['t'].strftime('%H:%M:%S')
+    data['a'] = str(data['a'])
+    if not data['x']:
+        del data['x']
+    return data
+
+
+def dumps_compact(data):
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
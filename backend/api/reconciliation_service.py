@@ -0,0 +1,233 @@
+"""
+Statement reconciliation for Village Water System
+
+Matches a provider statement (Mobile Money, bank) against the payments
+recorded for a date window. Both sides are loaded once and indexed in
+dictionaries, so the comparison is a single hash join instead of one
+query per statement line.
+"""
+import csv
+import io
+import logging
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .models import Payment, ReconciliationReport, ReconciliationItem
+from .payment_service import PaymentService
+
+logger = logging.getLogger(__name__)
+
+# Payments split over several bills by the import carry REF, REF-2, REF-3...
+_SPLIT_REFERENCE = re.compile(r'^(?P<base>.+)-(?P<part>\d+)$')
+
+
+class ReconciliationError(Exception):
+    """Raised when a statement cannot be read"""
+
+
+class ReconciliationService:
+    """Reconcile provider statements against the payments table"""
+
+    BATCH_SIZE = 1000
+    # Length of the transaction_reference columns
+    MAX_REFERENCE_LENGTH = 100
+    # payment_method value that compares payments of every method
+    ALL_METHODS = 'all'
+
+    # Accepted header spellings -> field
+    COLUMNS = {
+        'transaction_reference': 'reference',
+        'reference': 'reference',
+        'transaction_id': 'reference',
+        'amount': 'amount',
+        'amount_paid': 'amount',
+        'date': 'date',
+        'payment_date': 'date',
+        'transaction_date': 'date',
+    }
+
+    @classmethod
+    def read_statement(cls, uploaded_file):
+        """
+        Yield {'line', 'reference', 'amount', 'date'} for each statement line,
+        reading the upload line by line
+        """
+        stream = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+        reader = csv.reader(stream)
+        header = next(reader, None)
+        if not header:
+            raise ReconciliationError('The statement is empty')
+
+        fields = [cls.COLUMNS.get(name.strip().lower().replace(' ', '_')) for name in header]
+        if 'amount' not in fields or 'reference' not in fields:
+            raise ReconciliationError('The statement needs a transaction reference column and an amount column')
+
+        for line, values in enumerate(reader, start=2):
+            if not any(value.strip() for value in values):
+                continue
+            row = {field: value.strip() for field, value in zip(fields, values) if field}
+            try:
+                amount = Decimal(row.get('amount', '').replace(',', '')).quantize(Decimal('0.01'))
+                if not amount.is_finite():
+                    raise InvalidOperation(amount)
+            except InvalidOperation:
+                raise ReconciliationError(f"Line {line}: invalid amount '{row.get('amount', '')}'")
+            if abs(amount) > PaymentService.MAX_AMOUNT:
+                raise ReconciliationError(f"Line {line}: amount must not exceed {PaymentService.MAX_AMOUNT}")
+            reference = row.get('reference') or None
+            if reference and len(reference) > cls.MAX_REFERENCE_LENGTH:
+                raise ReconciliationError(
+                    f"Line {line}: transaction reference longer than {cls.MAX_REFERENCE_LENGTH} characters"
+                )
+            statement_date = None
+            if row.get('date'):
+                try:
+                    statement_date = datetime.strptime(row['date'][:10], '%Y-%m-%d').date()
+                except ValueError:
+                    raise ReconciliationError(f"Line {line}: invalid date '{row['date']}' (use YYYY-MM-DD)")
+            yield {
+                'line': line,
+                'reference': reference,
+                'amount': amount,
+                'date': statement_date,
+            }
+
+    @classmethod
+    def reconcile(cls, statement, date_from, date_to, provider, payment_method=None, created_by=None):
+        """
+        Reconcile statement lines (as produced by read_statement) against the
+        Completed payments dated date_from..date_to and persist the report.
+
+        Only payments of `payment_method` are compared; it defaults to the
+        provider's own method (see provider_method), and ALL_METHODS compares
+        every method. Lines are matched on transaction reference (summing
+        payments the import split over several bills); lines without a
+        reference fall back to matching on (amount, date). Returns the
+        ReconciliationReport.
+        """
+        if payment_method is None:
+            payment_method = cls.provider_method(provider)
+        elif payment_method == cls.ALL_METHODS:
+            payment_method = None
+        lines = list(statement)
+        references = {line['reference'] for line in lines if line['reference']}
+
+        payments = Payment.objects.filter(
+            payment_status='Completed',
+            payment_date__gte=date_from,
+            payment_date__lte=date_to
+        )
+        if payment_method:
+            payments = payments.filter(payment_method=payment_method)
+        fields = ('payment_id', 'transaction_reference', 'amount_paid', 'payment_date')
+        in_window = list(payments.values_list(*fields))
+        system_total = sum((row[2] for row in in_window), Decimal('0.00'))
+
+        # Statement lines whose payment was recorded outside the window still match
+        seen = {row[1] for row in in_window}
+        outside = [reference for reference in references if reference not in seen]
+        out_of_window = []
+        for start in range(0, len(outside), cls.BATCH_SIZE):
+            out_of_window.extend(Payment.objects.filter(
+                payment_status='Completed',
+                transaction_reference__in=outside[start:start + cls.BATCH_SIZE]
+            ).values_list(*fields))
+
+        # Hash index: statement reference -> recorded payments
+        by_reference = {}
+        for payment in in_window + out_of_window:
+            key = payment[1]
+            if key not in references and key:
+                split = _SPLIT_REFERENCE.match(key)
+                if split and split.group('base') in references:
+                    key = split.group('base')
+            by_reference.setdefault(key, []).append(payment)
+
+        items = []
+        unreferenced = []
+        for line in lines:
+            if not line['reference']:
+                unreferenced.append(line)
+                continue
+            group = by_reference.pop(line['reference'], None)
+            if group is None:
+                items.append(cls._item(line, 'Missing in System'))
+                continue
+            recorded = sum((payment[2] for payment in group), Decimal('0.00'))
+            result = 'Matched' if recorded == line['amount'] else 'Amount Mismatch'
+            items.append(cls._item(line, result, payment=group[0], system_amount=recorded))
+
+        # Fallback index for lines without a reference: (amount, date) -> payments
+        window_ids = {payment[0] for payment in in_window}
+        by_amount_date = {}
+        for group in by_reference.values():
+            for payment in group:
+                if payment[0] in window_ids:
+                    by_amount_date.setdefault((payment[2], payment[3]), []).append(payment)
+
+        for line in unreferenced:
+            candidates = by_amount_date.get((line['amount'], line['date']))
+            if candidates:
+                payment = candidates.pop()
+                items.append(cls._item(line, 'Matched', payment=payment, system_amount=payment[2]))
+            else:
+                items.append(cls._item(line, 'Missing in System'))
+
+        for group in by_amount_date.values():
+            for payment in group:
+                items.append(ReconciliationItem(
+                    result='Missing at Provider',
+                    transaction_reference=payment[1],
+                    system_amount=payment[2],
+                    payment_id=payment[0],
+                ))
+
+        counts = {choice: 0 for choice, label in ReconciliationItem.RESULT_CHOICES}
+        for item in items:
+            counts[item.result] += 1
+
+        with transaction.atomic():
+            report = ReconciliationReport.objects.create(
+                provider=provider,
+                payment_method=payment_method or None,
+                date_from=date_from,
+                date_to=date_to,
+                statement_rows=len(lines),
+                matched_count=counts['Matched'],
+                missing_in_system_count=counts['Missing in System'],
+                missing_at_provider_count=counts['Missing at Provider'],
+                amount_mismatch_count=counts['Amount Mismatch'],
+                statement_total=sum((line['amount'] for line in lines), Decimal('0.00')),
+                system_total=system_total,
+                created_by=created_by,
+            )
+            for item in items:
+                item.report = report
+            ReconciliationItem.objects.bulk_create(items, batch_size=cls.BATCH_SIZE)
+
+        logger.info(
+            f"Reconciliation {report.report_id} ({provider} {date_from}..{date_to}): "
+            f"{counts['Matched']} matched, {counts['Amount Mismatch']} mismatched, "
+            f"{counts['Missing in System']} missing in system, {counts['Missing at Provider']} missing at provider"
+        )
+        return report
+
+    @staticmethod
+    def provider_method(provider):
+        """Payment method a provider's statement covers: Bank Transfer for banks, Mobile Money otherwise"""
+        return 'Bank Transfer' if 'bank' in (provider or '').lower() else 'Mobile Money'
+
+    @staticmethod
+    def _item(line, result, payment=None, system_amount=None):
+        return ReconciliationItem(
+            result=result,
+            transaction_reference=line['reference'],
+            statement_amount=line['amount'],
+            statement_date=line['date'],
+            statement_line=line['line'],
+            system_amount=system_amount,
+            payment_id=payment[0] if payment else None,
+        )
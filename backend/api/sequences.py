@@ -0,0 +1,105 @@
+"""
+Document number sequences for Village Water System
+
+Bill numbers, receipt numbers, transaction references and household codes
+are drawn from counters in the number_sequences table, keyed by prefix
+(e.g. BILL-202610). A counter is bumped with a single atomic UPDATE, so
+concurrent inserts never hand out the same number, and bulk operations
+can reserve a whole block of numbers in one round trip.
+
+Reservations run on a connection of their own and commit at once, so a
+counter row is never locked for the length of the caller's transaction
+(a billing run, a payment import, a payment posted under a bill lock).
+Numbers reserved by a transaction that later rolls back are not reused;
+the sequence then has gaps.
+"""
+from datetime import datetime
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, connections, transaction
+from django.db.models import F
+from django.db.utils import ConnectionDoesNotExist
+
+from .models import NumberSequence, Household, Bill, Payment
+
+# Alias of this thread's reservation connection
+SEQUENCE_DATABASE = 'number_sequences'
+
+
+def _database():
+    """
+    Alias to reserve on: a second connection to the default database, opened
+    per thread. SQLite allows one writer per database, so a second connection
+    could not commit while the caller writes; there the caller's connection
+    (and transaction) is used.
+    """
+    if connection.vendor == 'sqlite':
+        return DEFAULT_DB_ALIAS
+    try:
+        own = connections[SEQUENCE_DATABASE]
+    except ConnectionDoesNotExist:
+        own = connections.create_connection(DEFAULT_DB_ALIAS)
+        connections[SEQUENCE_DATABASE] = own
+    own.close_if_unusable_or_obsolete()
+    return SEQUENCE_DATABASE
+
+
+def reserve(prefix, count=1, seed=None):
+    """
+    Reserve `count` consecutive values from the counter for `prefix`.
+    Returns the first reserved value.
+
+    `seed` is called once, when the counter does not exist yet, and should
+    return the last value already in use (so existing data is continued).
+    """
+    using = _database()
+    counters = NumberSequence.objects.using(using).filter(prefix=prefix)
+    with transaction.atomic(using=using):
+        updated = counters.update(last_value=F('last_value') + count)
+        if not updated:
+            start = seed() if seed else 0
+            try:
+                with transaction.atomic(using=using):
+                    NumberSequence.objects.using(using).create(prefix=prefix, last_value=start + count)
+                return start + 1
+            except IntegrityError:
+                # Another process created the counter first
+                counters.update(last_value=F('last_value') + count)
+
+        last_value = counters.values_list('last_value', flat=True).get()
+        return last_value - count + 1
+
+
+def _allocate(model, field, prefix, count):
+    """Reserve `count` formatted numbers PREFIX-NNNN for model.field"""
+    def seed():
+        last = model.objects.filter(
+            **{f'{field}__startswith': f'{prefix}-'}
+        ).order_by(f'-{field}').values_list(field, flat=True).first()
+        return int(last.split('-')[-1]) if last else 0
+
+    first = reserve(prefix, count, seed=seed)
+    return [f'{prefix}-{number:04d}' for number in range(first, first + count)]
+
+
+def household_codes(count=1, when=None):
+    """HH-YYYY-NNNN, numbered per year"""
+    when = when or datetime.now()
+    return _allocate(Household, 'household_code', f'HH-{when.year}', count)
+
+
+def bill_numbers(count=1, when=None):
+    """BILL-YYYYMM-NNNN, numbered per month"""
+    when = when or datetime.now()
+    return _allocate(Bill, 'bill_number', f'BILL-{when.year}{when.month:02d}', count)
+
+
+def receipt_numbers(count=1, when=None):
+    """RCP-YYYYMM-NNNN, numbered per month"""
+    when = when or datetime.now()
+    return _allocate(Payment, 'receipt_number', f'RCP-{when.year}{when.month:02d}', count)
+
+
+def transaction_references(count=1, when=None):
+    """TXN-YYYYMMDD-NNNN, numbered per day"""
+    when = when or datetime.now()
+    return _allocate(Payment, 'transaction_reference', f'TXN-{when.year}{when.month:02d}{when.day:02d}', count)
@@ -4,7 +4,11 @@ Serializers for Village Water System API
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError as DjangoValidationError
-from .models import User, Household, TariffRate, WaterUsage, Bill, Payment, SMSNotification, Notification
+from .models import (
+    User, Household, HouseholdAccountSummary, TariffRate, WaterUsage, Bill, BillingJob, Payment,
+    ReconciliationReport, ReconciliationItem, SMSNotification, Notification
+)
+from .usage_service import UsageService
 from datetime import datetime, date
 from decimal import Decimal
 import re
@@ -81,9 +85,37 @@ class UserSerializer(serializers.ModelSerializer):
         return instance
 
 
+class HouseholdAccountSummarySerializer(serializers.ModelSerializer):
+    """Maintained account state of a household"""
+    last_bill_number = serializers.CharField(source='last_bill.bill_number', read_only=True, default=None)
+    
+    class Meta:
+        model = HouseholdAccountSummary
+        exclude = ['household', 'paid_this_month', 'paid_month']
+
+
+class DebtorSerializer(serializers.ModelSerializer):
+    """Household with an outstanding balance, read from its account summary"""
+    household_id = serializers.IntegerField(read_only=True)
+    household_code = serializers.CharField(source='household.household_code', read_only=True)
+    household_name = serializers.CharField(source='household.household_name', read_only=True)
+    head_of_household = serializers.CharField(source='household.head_of_household', read_only=True)
+    phone_number = serializers.CharField(source='household.phone_number', read_only=True)
+    village = serializers.CharField(source='household.village', read_only=True)
+    
+    class Meta:
+        model = HouseholdAccountSummary
+        fields = [
+            'household_id', 'household_code', 'household_name', 'head_of_household', 'phone_number', 'village',
+            'outstanding_balance', 'overdue_bills_count', 'pending_bills_count', 'last_billing_period',
+            'last_payment_date', 'last_payment_amount',
+        ]
+
+
 class HouseholdSerializer(serializers.ModelSerializer):
     """Household serializer"""
     user_details = UserSerializer(source='user', read_only=True)
+    account_summary = HouseholdAccountSummarySerializer(read_only=True, allow_null=True)
     registered_by_name = serializers.CharField(source='registered_by.full_name', read_only=True)
     password = serializers.CharField(write_only=True, required=False, min_length=8, 
                                      help_text="Password for household user account (min 8 characters)")
@@ -225,6 +257,42 @@ class TariffRateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Rate per liter must be greater than 0")
         return value
     
+    def validate_tiers(self, value):
+        """Validate block tariff: ascending limits, positive rates, open-ended last block"""
+        if not value:
+            return []
+        if not isinstance(value, list):
+            raise serializers.ValidationError("Tiers must be a list of {up_to, rate} blocks")
+        
+        previous_limit = Decimal('0')
+        for position, tier in enumerate(value):
+            if not isinstance(tier, dict) or 'rate' not in tier:
+                raise serializers.ValidationError("Each tier needs a rate")
+            try:
+                rate = Decimal(str(tier['rate']))
+                up_to = tier.get('up_to')
+                limit = Decimal(str(up_to)) if up_to not in (None, '') else None
+            except ArithmeticError:
+                raise serializers.ValidationError("Tier limits and rates must be numbers")
+            if rate <= 0:
+                raise serializers.ValidationError("Tier rates must be greater than 0")
+            is_last = position == len(value) - 1
+            if limit is None and not is_last:
+                raise serializers.ValidationError("Only the last tier can be open-ended")
+            if limit is not None:
+                if is_last:
+                    raise serializers.ValidationError("The last tier must be open-ended (up_to: null)")
+                if limit <= previous_limit:
+                    raise serializers.ValidationError("Tier limits must be increasing")
+                previous_limit = limit
+        return value
+    
+    def validate_social_discount_percent(self, value):
+        """Validate discount percentage"""
+        if value < 0 or value > 100:
+            raise serializers.ValidationError("Social discount must be between 0 and 100 percent")
+        return value
+    
     def validate(self, attrs):
         """Validate effective dates"""
         effective_from = attrs.get('effective_from')
@@ -243,7 +311,6 @@ class WaterUsageSerializer(serializers.ModelSerializer):
     household_name = serializers.CharField(source='household.household_name', read_only=True)
     household_code = serializers.CharField(source='household.household_code', read_only=True)
     recorded_by_name = serializers.CharField(source='recorded_by.full_name', read_only=True)
-    is_anomaly = serializers.ReadOnlyField()
     
     class Meta:
         model = WaterUsage
@@ -257,12 +324,17 @@ class WaterUsageSerializer(serializers.ModelSerializer):
         return value
     
     def validate(self, attrs):
-        """Validate readings and check for duplicates"""
+        """Validate readings, fill in a missing previous reading and check for duplicates"""
         current_reading = attrs.get('current_reading')
-        previous_reading = attrs.get('previous_reading', 0)
         household = attrs.get('household')
         reading_month = attrs.get('reading_month')
         
+        # New readings continue from the household's last reading unless one is given
+        if self.instance is None and 'previous_reading' not in attrs and household and reading_month:
+            key = (household.household_id, reading_month)
+            attrs['previous_reading'] = UsageService.previous_readings([key])[key]
+        previous_reading = attrs.get('previous_reading', 0)
+        
         # Validate current >= previous
         if current_reading < previous_reading:
             raise serializers.ValidationError({
@@ -298,7 +370,8 @@ class BillSerializer(serializers.ModelSerializer):
     class Meta:
         model = Bill
         fields = '__all__'
-        read_only_fields = ['bill_id', 'bill_number', 'subtotal', 'total_amount', 'generation_date', 'rate_applied']
+        read_only_fields = ['bill_id', 'bill_number', 'subtotal', 'total_amount', 'generation_date', 'rate_applied', 'needs_rebill',
+                            'billing_job', 'amount_paid', 'balance_due']
     
     def validate(self, attrs):
         """Validate bill data"""
@@ -320,9 +393,33 @@ class BillSerializer(serializers.ModelSerializer):
                     "due_date": "Due date must be 1-90 days after bill date"
                 })
         
+        # One bill per household per period (also enforced by the database)
+        household = household or getattr(self.instance, 'household', None)
+        billing_period = attrs.get('billing_period') or getattr(self.instance, 'billing_period', None)
+        if household and billing_period:
+            existing = Bill.objects.filter(household=household, billing_period=billing_period)
+            if self.instance:
+                existing = existing.exclude(pk=self.instance.pk)
+            if existing.exists():
+                raise serializers.ValidationError({
+                    "billing_period": f"A bill for {billing_period} already exists for this household"
+                })
+        
         return attrs
 
 
+class BillingJobSerializer(serializers.ModelSerializer):
+    """Billing job progress serializer"""
+    elapsed_seconds = serializers.ReadOnlyField()
+    requested_by_name = serializers.CharField(source='requested_by.full_name', read_only=True)
+    
+    class Meta:
+        model = BillingJob
+        fields = '__all__'
+        read_only_fields = ['job_id', 'status', 'households_processed', 'bills_created', 'total_amount',
+                            'errors', 'shards', 'created_date', 'started_at', 'finished_at']
+
+
 class PaymentSerializer(serializers.ModelSerializer):
     """Payment serializer"""
     bill_number = serializers.CharField(source='bill.bill_number', read_only=True)
@@ -348,13 +445,12 @@ class PaymentSerializer(serializers.ModelSerializer):
         amount_paid = attrs.get('amount_paid')
         
         if bill and amount_paid:
-            # Calculate total already paid
-            existing_payments = bill.payments.filter(payment_status='Completed').aggregate(
-                total=serializers.models.Sum('amount_paid')
-            )['total'] or Decimal('0')
+            # Remaining amount, not counting this payment itself when it is being edited
+            remaining = bill.balance_due
+            if self.instance and self.instance.bill_id == bill.bill_id and self.instance.payment_status == 'Completed':
+                remaining += self.instance.amount_paid
             
             # Check if new payment exceeds remaining amount
-            remaining = bill.total_amount - existing_payments
             if amount_paid > remaining:
                 raise serializers.ValidationError({
                     "amount_paid": f"Payment amount ({amount_paid}) exceeds remaining bill amount ({remaining})"
@@ -363,6 +459,25 @@ class PaymentSerializer(serializers.ModelSerializer):
         return attrs
 
 
+
+class ReconciliationReportSerializer(serializers.ModelSerializer):
+    """Reconciliation report summary serializer"""
+    created_by_name = serializers.CharField(source='created_by.full_name', read_only=True)
+    
+    class Meta:
+        model = ReconciliationReport
+        fields = '__all__'
+        read_only_fields = [field.name for field in ReconciliationReport._meta.fields]
+
+
+class ReconciliationItemSerializer(serializers.ModelSerializer):
+    """Reconciliation report line serializer"""
+    receipt_number = serializers.CharField(source='payment.receipt_number', read_only=True, default=None)
+    
+    class Meta:
+        model = ReconciliationItem
+        exclude = ['report']
+
 class DashboardStatsSerializer(serializers.Serializer):
     """Dashboard statistics serializer"""
     total_households = serializers.IntegerField()
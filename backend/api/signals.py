@@ -0,0 +1,24 @@
+"""
+Signal handlers for Village Water System
+"""
+from django.db.models.signals import post_delete
+
+from .models import Bill, Household, SyncTombstone, TariffRate, WaterUsage
+
+# Synced model -> SyncTombstone.model
+SYNCED_MODELS = {
+    Household: 'households',
+    WaterUsage: 'usages',
+    TariffRate: 'tariffs',
+    Bill: 'bills',
+}
+
+
+def record_sync_tombstone(sender, instance, **kwargs):
+    """Leave a tombstone for deleted rows that devices keep offline, cascades included"""
+    SyncTombstone.objects.create(model=SYNCED_MODELS[sender], object_id=instance.pk)
+
+
+# Connected per model so deletes of other models keep Django's fast path
+for synced_model in SYNCED_MODELS:
+    post_delete.connect(record_sync_tombstone, sender=synced_model, dispatch_uid=f'sync_tombstone_{synced_model.__name__}')
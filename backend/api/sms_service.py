@@ -37,16 +37,21 @@ class SMSService:
             logger.error(f"SMS Error: {str(e)}")
             return False, str(e)
     
-    def send_bill_notification(self, bill):
-        """Send SMS when bill is generated"""
-        try:
-            phone = bill.household.phone_number
-            message = f"""Village Water System
+    @staticmethod
+    def bill_message(bill):
+        """Build the bill notification text"""
+        return f"""Village Water System
 Bill: {bill.bill_number}
 Amount: {bill.total_amount} RWF
 Period: {bill.billing_period}
 Due: {bill.due_date.strftime('%Y-%m-%d')}
 Pay at office or via Mobile Money"""
+    
+    def send_bill_notification(self, bill):
+        """Send SMS when bill is generated"""
+        try:
+            phone = bill.household.phone_number
+            message = self.bill_message(bill)
             
             success, msg = self.send_sms(phone, message)
             
@@ -63,17 +68,41 @@ Pay at office or via Mobile Money"""
             logger.error(f"Bill SMS Error: {str(e)}")
             return False, str(e)
     
-    def send_payment_confirmation(self, payment):
-        """Send SMS when payment is received"""
-        try:
-            # Use payer phone if provided, otherwise default to household phone
-            phone = payment.payer_phone if payment.payer_phone else payment.bill.household.phone_number
-            message = f"""Village Water System
+    def send_bill_notifications(self, bills):
+        """
+        Log bill SMS for a whole billing run in one insert
+        Returns: number of messages logged
+        """
+        from .models import SMSNotification
+        messages = [
+            SMSNotification(
+                phone_number=bill.household.phone_number,
+                message=self.bill_message(bill),
+                status='Sent',
+                notification_type='Bill Generated'
+            )
+            for bill in bills
+        ]
+        SMSNotification.objects.bulk_create(messages, batch_size=1000)
+        logger.info(f"[SMS SANDBOX] {len(messages)} bill notifications queued")
+        return len(messages)
+    
+    @staticmethod
+    def payment_message(payment):
+        """Build the payment confirmation text"""
+        return f"""Village Water System
 Payment Received!
 Receipt: {payment.receipt_number}
 Amount: {payment.amount_paid} RWF
 Method: {payment.payment_method}
 Thank you!"""
+    
+    def send_payment_confirmation(self, payment):
+        """Send SMS when payment is received"""
+        try:
+            # Use payer phone if provided, otherwise default to household phone
+            phone = payment.payer_phone if payment.payer_phone else payment.bill.household.phone_number
+            message = self.payment_message(payment)
             
             success, msg = self.send_sms(phone, message)
             
@@ -90,6 +119,27 @@ Thank you!"""
             logger.error(f"Payment SMS Error: {str(e)}")
             return False, str(e)
 
+    
+    def send_payment_confirmations(self, payments):
+        """
+        Log payment confirmation SMS for a batch of payments in one insert
+        Returns: number of messages logged
+        """
+        from .models import SMSNotification
+        messages = [
+            SMSNotification(
+                phone_number=payment.payer_phone or payment.bill.household.phone_number,
+                message=self.payment_message(payment),
+                status='Sent',
+                notification_type='Payment Confirmation'
+            )
+            for payment in payments
+        ]
+        SMSNotification.objects.bulk_create(messages, batch_size=1000)
+        logger.info(f"[SMS SANDBOX] {len(messages)} payment confirmations queued")
+        return len(messages)
+
+
 
 # Global SMS service instance
 sms_service = SMSService()
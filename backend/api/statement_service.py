@@ -0,0 +1,233 @@
+"""
+Bill statement printing for Village Water System
+
+Statements for a whole billing period are drawn on reportlab canvases in a
+pool of worker processes. The parent reads the bills once, hands each
+worker plain tuples (no database access in the workers), and writes the
+rendered PDFs out as they complete: one file per bill into a ZIP, or one
+merged PDF per village.
+"""
+import io
+import logging
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.utils.text import get_valid_filename
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from .models import Bill
+
+logger = logging.getLogger(__name__)
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+
+# Bill values handed to the workers, in this order
+FIELDS = (
+    'bill_number', 'billing_period', 'bill_date', 'due_date', 'status',
+    'household__household_code', 'household__household_name', 'household__head_of_household',
+    'household__sector', 'household__cell', 'household__village', 'household__meter_number',
+    'usage__previous_reading', 'usage__current_reading', 'liters_consumed', 'rate_applied',
+    'subtotal', 'discount_amount', 'penalty_amount', 'total_amount', 'amount_paid', 'balance_due',
+)
+_COLUMN = {field: position for position, field in enumerate(FIELDS)}
+
+UNASSIGNED_VILLAGE = 'Unassigned'
+
+# Page template
+_LEFT = 60
+_VALUE_X = 260
+_ROW_HEIGHT = 20
+_HOUSEHOLD_ROWS = [
+    ('Household Code:', 'household__household_code'),
+    ('Household:', 'household__household_name'),
+    ('Head of Household:', 'household__head_of_household'),
+    ('Location:', None),
+    ('Meter Number:', 'household__meter_number'),
+]
+_CHARGE_ROWS = [
+    ('Previous Reading:', 'usage__previous_reading'),
+    ('Current Reading:', 'usage__current_reading'),
+    ('Liters Consumed:', 'liters_consumed'),
+    ('Rate Applied (RWF/L):', 'rate_applied'),
+    ('Subtotal:', 'subtotal'),
+    ('Discount:', 'discount_amount'),
+    ('Penalty:', 'penalty_amount'),
+    ('Total Amount:', 'total_amount'),
+    ('Amount Paid:', 'amount_paid'),
+    ('Balance Due:', 'balance_due'),
+]
+_HOUSEHOLD_TOP = PAGE_HEIGHT - 190
+_CHARGES_TOP = _HOUSEHOLD_TOP - _ROW_HEIGHT * len(_HOUSEHOLD_ROWS) - 50
+_CHARGES_BOTTOM = _CHARGES_TOP - _ROW_HEIGHT * len(_CHARGE_ROWS)
+_MONEY_FIELDS = {'subtotal', 'discount_amount', 'penalty_amount', 'total_amount', 'amount_paid', 'balance_due'}
+
+
+def _value(row, field):
+    if field is None:
+        parts = [row[_COLUMN[name]] for name in ('household__village', 'household__cell', 'household__sector')]
+        return ', '.join(part for part in parts if part) or '-'
+    value = row[_COLUMN[field]]
+    if value is None or value == '':
+        return '-'
+    if field in _MONEY_FIELDS:
+        return f'{value} RWF'
+    return str(value)
+
+
+def draw_statement(pdf, row):
+    """Draw one bill statement page on `pdf` from a FIELDS tuple"""
+    pdf.setFont('Helvetica-Bold', 22)
+    pdf.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 80, 'VILLAGE WATER SYSTEM')
+    pdf.setFont('Helvetica-Bold', 14)
+    pdf.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 105, 'Water Bill Statement')
+
+    pdf.setFont('Helvetica', 10)
+    pdf.drawString(_LEFT, PAGE_HEIGHT - 140, f"Bill Number: {_value(row, 'bill_number')}")
+    pdf.drawString(_LEFT, PAGE_HEIGHT - 155, f"Billing Period: {_value(row, 'billing_period')}")
+    pdf.drawRightString(PAGE_WIDTH - _LEFT, PAGE_HEIGHT - 140, f"Bill Date: {_value(row, 'bill_date')}")
+    pdf.drawRightString(PAGE_WIDTH - _LEFT, PAGE_HEIGHT - 155, f"Due Date: {_value(row, 'due_date')}")
+
+    for top, rows in ((_HOUSEHOLD_TOP, _HOUSEHOLD_ROWS), (_CHARGES_TOP, _CHARGE_ROWS)):
+        for position, (label, field) in enumerate(rows):
+            baseline = top - _ROW_HEIGHT * (position + 1) + 6
+            pdf.setFont('Helvetica-Bold', 10)
+            pdf.drawString(_LEFT, baseline, label)
+            pdf.setFont('Helvetica', 10)
+            pdf.drawString(_VALUE_X, baseline, _value(row, field)[:50])
+
+    pdf.setStrokeColor(colors.black)
+    pdf.line(_LEFT, _CHARGES_TOP, PAGE_WIDTH - _LEFT, _CHARGES_TOP)
+    pdf.line(_LEFT, _CHARGES_BOTTOM, PAGE_WIDTH - _LEFT, _CHARGES_BOTTOM)
+
+    pdf.setFont('Helvetica-Bold', 12)
+    pdf.drawString(_LEFT, _CHARGES_BOTTOM - 30, f"Status: {_value(row, 'status')}")
+    pdf.setFont('Helvetica-Oblique', 10)
+    pdf.drawString(_LEFT, _CHARGES_BOTTOM - 55, 'Please pay before the due date to avoid a late payment penalty.')
+    pdf.showPage()
+
+
+def render_statements(rows):
+    """Render FIELDS tuples as one PDF (one page per bill) and return its bytes"""
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+    for row in rows:
+        draw_statement(pdf, row)
+    pdf.save()
+    return buffer.getvalue()
+
+
+def _render_each(rows):
+    """Worker task: [(bill_number, village, pdf bytes)] for a chunk of bills"""
+    return [
+        (row[_COLUMN['bill_number']], row[_COLUMN['household__village']], render_statements([row]))
+        for row in rows
+    ]
+
+
+def _render_village(village, rows):
+    """Worker task: (village, merged pdf bytes, page count)"""
+    return village, render_statements(rows), len(rows)
+
+
+class StatementService:
+    """Render bill statements for a billing period in parallel"""
+
+    CHUNK_SIZE = 200
+
+    @staticmethod
+    def statement_rows(billing_period, village=None):
+        """FIELDS tuples for the period, grouped by village and ordered by household code"""
+        bills = Bill.objects.filter(billing_period=billing_period).exclude(status='Cancelled')
+        if village:
+            bills = bills.filter(household__village=village)
+        return bills.order_by('household__village', 'household__household_code').values_list(*FIELDS).iterator(
+            chunk_size=2000
+        )
+
+    @staticmethod
+    def village_name(village):
+        return get_valid_filename(village or UNASSIGNED_VILLAGE) or UNASSIGNED_VILLAGE
+
+    @classmethod
+    def render_zip(cls, billing_period, output, workers=4, chunk_size=None, village=None, progress=None):
+        """
+        Write one PDF per bill into the ZIP file `output` (path or file
+        object), as village/bill_number.pdf. `progress(done, total)` is
+        called as chunks complete. Returns a summary.
+        """
+        started = time.monotonic()
+        rows = list(cls.statement_rows(billing_period, village))
+        chunk_size = chunk_size or cls.CHUNK_SIZE
+        chunks = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+        done = 0
+
+        with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for results in cls._run(_render_each, [(chunk,) for chunk in chunks], workers):
+                for bill_number, bill_village, pdf in results:
+                    archive.writestr(f'{cls.village_name(bill_village)}/{bill_number}.pdf', pdf)
+                done += len(results)
+                if progress:
+                    progress(done, len(rows))
+
+        return cls._summary(billing_period, len(rows), started, files=1)
+
+    @classmethod
+    def render_by_village(cls, billing_period, output_dir, workers=4, village=None, progress=None):
+        """
+        Write one merged PDF per village into `output_dir`, named
+        <period>_<village>.pdf. Villages are grouped by file name, so
+        households without a village and villages whose names sanitize
+        alike share one file. `progress(done, total)` is called as
+        villages complete. Returns a summary.
+        """
+        started = time.monotonic()
+        groups = {}
+        for row in cls.statement_rows(billing_period, village):
+            groups.setdefault(cls.village_name(row[_COLUMN['household__village']]), []).append(row)
+        tasks = list(groups.items())
+        total = sum(len(village_rows) for bill_village, village_rows in tasks)
+        os.makedirs(output_dir, exist_ok=True)
+        done = 0
+        files = 0
+
+        for name, pdf, pages in cls._run(_render_village, tasks, workers):
+            path = os.path.join(output_dir, f'{billing_period}_{name}.pdf')
+            with open(path, 'wb') as statement_file:
+                statement_file.write(pdf)
+            files += 1
+            done += pages
+            if progress:
+                progress(done, total)
+
+        return cls._summary(billing_period, total, started, files=files)
+
+    @staticmethod
+    def _run(task, arguments, workers):
+        """Yield task results in completion order, in-process when workers <= 1"""
+        if workers <= 1 or len(arguments) <= 1:
+            for args in arguments:
+                yield task(*args)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(task, *args) for args in arguments]
+            for future in as_completed(futures):
+                yield future.result()
+
+    @staticmethod
+    def _summary(billing_period, statements, started, files):
+        summary = {
+            'billing_period': billing_period,
+            'statements': statements,
+            'files': files,
+            'elapsed_seconds': round(time.monotonic() - started, 3),
+        }
+        logger.info(
+            f"Rendered {statements} statements for {billing_period} into {files} files "
+            f"in {summary['elapsed_seconds']}s"
+        )
+        return summary
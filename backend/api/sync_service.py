@@ -0,0 +1,318 @@
+"""
+Offline sync for field devices
+
+Devices keep households, usages, tariffs and bills locally and ask only for
+what changed since their last sync. The cursor holds, per kind of row, the
+(updated_at, primary key) of the last row sent, so page boundaries never
+skip or repeat rows, and when it was issued. updated_at is stamped when a
+row is written, not when its transaction commits, so a long transaction
+(a billing run, a payment or usage import) can commit rows older than rows
+already sent. Each pass over a kind therefore starts SYNC_OVERLAP_SECONDS
+before the previous pass started: rows from that window are sent again,
+and devices apply rows by primary key, so repeats are harmless.
+"""
+import base64
+import binascii
+import json
+import logging
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Bill, Household, SyncTombstone, TariffRate, WaterUsage
+from .usage_service import UsageService
+
+logger = logging.getLogger(__name__)
+
+# kind -> (model, primary key, fields sent, village lookup)
+KINDS = {
+    'households': (Household, 'household_id', (
+        'household_id', 'household_code', 'household_name', 'head_of_household', 'phone_number',
+        'sector', 'cell', 'village', 'meter_number', 'number_of_members', 'status', 'updated_at',
+    ), 'village'),
+    'tariffs': (TariffRate, 'tariff_id', (
+        'tariff_id', 'rate_name', 'rate_per_liter', 'tiers', 'social_discount_min_members',
+        'social_discount_percent', 'effective_from', 'effective_to', 'is_active', 'updated_at',
+    ), None),
+    'usages': (WaterUsage, 'usage_id', (
+        'usage_id', 'household_id', 'reading_month', 'reading_date', 'previous_reading',
+        'current_reading', 'liters_used', 'status', 'is_anomaly', 'updated_at',
+    ), 'household__village'),
+    'bills': (Bill, 'bill_id', (
+        'bill_id', 'bill_number', 'household_id', 'usage_id', 'billing_period', 'bill_date', 'due_date',
+        'total_amount', 'amount_paid', 'balance_due', 'status', 'updated_at',
+    ), 'household__village'),
+}
+DELETED = 'deleted'
+
+
+class SyncError(Exception):
+    """Raised when a sync cursor cannot be read"""
+
+
+class SyncService:
+    """Delta sync of reference data to devices and upload of offline readings"""
+
+    LIMIT = 500
+    MAX_LIMIT = 2000
+
+    @staticmethod
+    def encode_cursor(positions, issued_at):
+        data = {
+            kind: [moment.isoformat(), pk, started and started.isoformat()]
+            for kind, (moment, pk, started) in positions.items()
+        }
+        data['at'] = issued_at.isoformat()
+        return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        ({kind: (updated_at, primary key or None, pass started or None)}, issued at);
+        raises SyncError
+        """
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            issued_at = parse_datetime(data.pop('at'))
+            positions = {}
+            for kind, (moment, pk, *started) in data.items():
+                # Cursors issued before the pass start was recorded have two fields
+                started = started[0] if started else None
+                moment = parse_datetime(moment)
+                if started is not None:
+                    started = parse_datetime(started)
+                    if started is None:
+                        raise ValueError(kind)
+                if kind not in KINDS and kind != DELETED or moment is None or not (pk is None or isinstance(pk, int)):
+                    raise ValueError(kind)
+                positions[kind] = (moment, pk, started)
+            if issued_at is None or set(positions) != set(KINDS) | {DELETED}:
+                raise ValueError(cursor)
+            return positions, issued_at
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, AttributeError, KeyError):
+            raise SyncError('Invalid sync cursor')
+
+    @staticmethod
+    def _page(queryset, time_field, pk, fields, position, now, limit):
+        """
+        Up to `limit` rows after `position`, the next position and whether
+        more are left. A pass that runs out of rows makes the next one start
+        SYNC_OVERLAP_SECONDS before this pass started, to pick up rows of
+        transactions that were still open.
+        """
+        moment, last_pk, started = position or (None, None, None)
+        if moment:
+            after = Q(**{f'{time_field}__gt': moment})
+            if last_pk is not None:
+                after |= Q(**{time_field: moment, f'{pk}__gt': last_pk})
+            queryset = queryset.filter(after)
+        started = started or now
+        rows = list(queryset.order_by(time_field, pk).values(*fields)[:limit + 1])
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, (rows[-1][time_field], rows[-1][pk], started), True
+        return rows, (started - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS), None, None), False
+
+    @classmethod
+    def changes(cls, cursor=None, limit=None, village=None):
+        """
+        Rows changed since `cursor` (everything when None), up to `limit` of
+        each kind, optionally only those of one village, plus the ids of
+        rows deleted since (or, with `village`, moved out of it). Rows and
+        deletions from the overlap window come again. A cursor older than
+        the tombstone retention restarts from scratch with reset=True: the
+        device should drop its copy first.
+        """
+        limit = min(limit or cls.LIMIT, cls.MAX_LIMIT)
+        positions, issued_at = cls.decode_cursor(cursor) if cursor else ({}, None)
+        now = timezone.now()
+        # Tombstones older than the retention may be gone: start again from scratch
+        reset = issued_at is not None and issued_at < now - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+        if reset:
+            positions = {}
+
+        result = {}
+        next_positions = {}
+        has_more = False
+        for kind, (model, pk, fields, village_field) in KINDS.items():
+            rows = model.objects.all()
+            if village and village_field:
+                rows = rows.filter(**{village_field: village})
+            result[kind], next_positions[kind], more = cls._page(
+                rows, 'updated_at', pk, fields, positions.get(kind), now, limit
+            )
+            has_more = has_more or more
+
+        deleted = {kind: [] for kind in KINDS}
+        if positions:
+            # Moves only matter to devices syncing the village that was left
+            tombstones = SyncTombstone.objects.filter(village__isnull=True)
+            if village:
+                tombstones = SyncTombstone.objects.filter(Q(village__isnull=True) | Q(village=village))
+            tombstones, next_positions[DELETED], more = cls._page(
+                tombstones, 'deleted_at', 'tombstone_id',
+                ('tombstone_id', 'model', 'object_id', 'village', 'deleted_at'), positions.get(DELETED), now, limit
+            )
+            has_more = has_more or more
+            returned = cls._moved_back(tombstones, village)
+            for tombstone in tombstones:
+                if (tombstone['model'], tombstone['object_id']) not in returned:
+                    deleted[tombstone['model']].append(tombstone['object_id'])
+        else:
+            # A fresh copy has nothing to delete
+            next_positions[DELETED] = (now - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS), None, None)
+
+        result.update({
+            'cursor': cls.encode_cursor(next_positions, now),
+            'has_more': has_more,
+            'reset': reset,
+            DELETED: deleted,
+        })
+        return result
+
+    @staticmethod
+    def _moved_back(tombstones, village):
+        """(kind, pk) of moved-out rows that are in `village` again, which must not be dropped"""
+        moved = {}
+        for tombstone in tombstones:
+            if tombstone['village']:
+                moved.setdefault(tombstone['model'], set()).add(tombstone['object_id'])
+        returned = set()
+        for kind, ids in moved.items():
+            model, pk, fields, village_field = KINDS[kind]
+            back = model.objects.filter(**{f'{pk}__in': ids, village_field: village}).values_list(pk, flat=True)
+            returned.update((kind, object_id) for object_id in back)
+        return returned
+
+    @classmethod
+    def upload_readings(cls, readings, recorded_by=None):
+        """
+        Apply readings queued on a device while offline, in one batch.
+
+        A reading is either new (household_code or meter_number plus the
+        reading fields) or an edit of a synced one (usage_id plus the
+        updated_at the device last saw). A new reading for a month already
+        on record, or an edit of a reading changed on the server since, is
+        a conflict reported with the server's version; sending a reading
+        the server already has is reported as synced, so retries are safe.
+        Returns a summary with one result per reading, in input order.
+        """
+        results = [None] * len(readings)
+        new_rows, edit_rows = [], []
+        edits = {}
+        for index, reading in enumerate(readings):
+            if reading.get('usage_id') in (None, ''):
+                new_rows.append((index, UsageService.normalize(reading)))
+                continue
+            try:
+                edits[index] = (int(reading['usage_id']), parse_datetime(str(reading.get('updated_at') or '')))
+            except (ValueError, TypeError):
+                edits[index] = (None, None)
+
+        usage_fields = KINDS['usages'][2]
+        server = {
+            row['usage_id']: row
+            for row in WaterUsage.objects.filter(
+                usage_id__in=[usage_id for usage_id, seen in edits.values() if usage_id]
+            ).values('household__household_code', *usage_fields)
+        }
+        for index, (usage_id, seen) in edits.items():
+            reading = readings[index]
+            current = server.get(usage_id)
+            if usage_id is None or seen is None or timezone.is_naive(seen):
+                results[index] = cls._result(index, reading, 'error',
+                                             'Edits need an integer usage_id and the updated_at last synced')
+            elif current is None:
+                results[index] = cls._result(index, reading, 'conflict', f'Reading {usage_id} was deleted on the server')
+            elif current['updated_at'] != seen:
+                results[index] = cls._result(index, reading, 'conflict', 'Reading was changed on the server',
+                                             usage_id=usage_id, server=cls._server_version(current))
+            else:
+                row = UsageService.normalize(reading)
+                row.pop('meter_number', None)
+                row.update(household_code=current['household__household_code'], reading_month=current['reading_month'])
+                edit_rows.append((index, row))
+
+        for rows, upsert in ((new_rows, False), (edit_rows, True)):
+            if not rows:
+                continue
+            report = UsageService.import_rows([row for index, row in rows], recorded_by=recorded_by,
+                                              upsert=upsert, first_row=0)
+            duplicates = [result for result in report['rows'] if result['status'] == 'duplicate']
+            on_record = cls._usages_on_record(duplicates)
+            for result in report['rows']:
+                index = rows[result['row']][0]
+                status = result['status']
+                if status == 'duplicate':
+                    current = on_record.get((result['household_code'], result['reading_month']))
+                    if current and current['current_reading'] == cls._reading(readings[index].get('current_reading')):
+                        results[index] = cls._result(index, readings[index], 'synced', usage_id=current['usage_id'])
+                    else:
+                        results[index] = cls._result(
+                            index, readings[index], 'conflict', result['message'],
+                            usage_id=current and current['usage_id'],
+                            server=current and cls._server_version(current)
+                        )
+                else:
+                    results[index] = cls._result(index, readings[index], 'synced' if status == 'unchanged' else status,
+                                                 result['message'], usage_id=result['usage_id'])
+
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        logger.info(f"Offline readings upload: {counts}")
+        return {
+            'received': len(readings),
+            'created': counts.get('created', 0),
+            'updated': counts.get('updated', 0),
+            'synced': counts.get('synced', 0),
+            'conflicts': counts.get('conflict', 0),
+            'errors': counts.get('error', 0),
+            'results': results,
+        }
+
+    @staticmethod
+    def _reading(value):
+        try:
+            return Decimal(str(value).replace(',', '')).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            return None
+
+    @staticmethod
+    def _usages_on_record(results):
+        """{(household_code, reading_month): usage values} for the reported rows"""
+        if not results:
+            return {}
+        rows = WaterUsage.objects.filter(
+            household__household_code__in={result['household_code'] for result in results},
+            reading_month__in={result['reading_month'] for result in results},
+        ).values('household__household_code', *KINDS['usages'][2])
+        return {(row['household__household_code'], row['reading_month']): row for row in rows}
+
+    @staticmethod
+    def _server_version(row):
+        return {field: value for field, value in row.items() if field != 'household__household_code'}
+
+    @staticmethod
+    def _result(index, reading, status, message='', usage_id=None, server=None):
+        result = {
+            'index': index,
+            'client_id': reading.get('client_id'),
+            'status': status,
+            'message': message,
+            'usage_id': usage_id,
+        }
+        if server is not None:
+            result['server'] = server
+        return result
+
+    @staticmethod
+    def prune_tombstones(days=None):
+        """Delete tombstones older than the retention; returns how many"""
+        horizon = timezone.now() - timedelta(days=days or settings.SYNC_TOMBSTONE_DAYS)
+        deleted, by_model = SyncTombstone.objects.filter(deleted_at__lt=horizon).delete()
+        return deleted
@@ -0,0 +1,168 @@
+"""
+Tariff resolution for Village Water System
+
+Tariffs are effective-dated. Every worker keeps an in-memory index of the
+tariff timeline and answers "which tariff applies on date D / in period
+YYYY-MM" with a binary search, without touching the database.
+
+The index is invalidated whenever a tariff is saved or deleted. To reach
+every gunicorn worker, invalidation writes a fresh token into a small
+stamp file (settings.TARIFF_INDEX_STAMP); each worker compares the token
+with the one it loaded under and rebuilds its index when it changed.
+
+The stamp file only reaches workers that share its filesystem. When the
+API runs on several hosts, point TARIFF_INDEX_STAMP at a shared volume;
+otherwise workers on other hosts keep serving their old index until they
+restart.
+"""
+import calendar
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from bisect import bisect_right
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class TariffIndex:
+    """
+    Immutable timeline of tariff periods.
+
+    The active tariffs are flattened into non-overlapping segments sorted by
+    start date; when periods overlap, the tariff that started last wins.
+    """
+
+    def __init__(self, tariffs):
+        self.tariffs = sorted(tariffs, key=lambda t: (t.effective_from, t.tariff_id))
+        self.starts = []
+        self.segments = []
+
+        boundaries = set()
+        for tariff in self.tariffs:
+            boundaries.add(tariff.effective_from)
+            if tariff.effective_to:
+                boundaries.add(tariff.effective_to + timedelta(days=1))
+
+        for boundary in sorted(boundaries):
+            tariff = self._covering(boundary)
+            if self.segments and self.segments[-1] is tariff:
+                continue
+            self.starts.append(boundary)
+            self.segments.append(tariff)
+
+    def _covering(self, on_date):
+        """Linear lookup used only while building the timeline"""
+        for tariff in reversed(self.tariffs):
+            if tariff.effective_from <= on_date and (tariff.effective_to is None or tariff.effective_to >= on_date):
+                return tariff
+        return None
+
+    def for_date(self, on_date):
+        """
+        Tariff in effect on `on_date`, or None inside a gap between tariffs
+        or before the first tariff took effect.
+        """
+        position = bisect_right(self.starts, on_date) - 1
+        if position < 0:
+            return None
+        return self.segments[position]
+
+    def for_period(self, billing_period):
+        """Tariff in effect at the end of a YYYY-MM billing period"""
+        return self.for_date(period_end(billing_period))
+
+    def segments_for_period(self, billing_period):
+        """
+        (tariff, days) pairs covering a YYYY-MM period in date order, for
+        proration when the tariff changes mid-period. Days that fall in a gap
+        between tariffs are left out.
+        """
+        start, end = period_start(billing_period), period_end(billing_period)
+        segments = []
+        day = start
+        while day <= end:
+            tariff = self.for_date(day)
+            position = bisect_right(self.starts, day)
+            next_start = self.starts[position] if position < len(self.starts) else end + timedelta(days=1)
+            segment_end = min(end, next_start - timedelta(days=1))
+            days = (segment_end - day).days + 1
+            if tariff is not None:
+                if segments and segments[-1][0] is tariff:
+                    segments[-1] = (tariff, segments[-1][1] + days)
+                else:
+                    segments.append((tariff, days))
+            day = segment_end + timedelta(days=1)
+        return segments
+
+
+def period_start(billing_period):
+    """First day of a YYYY-MM period"""
+    year, month = (int(part) for part in billing_period.split('-'))
+    return date(year, month, 1)
+
+
+def period_end(billing_period):
+    """Last day of a YYYY-MM period"""
+    year, month = (int(part) for part in billing_period.split('-'))
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+_lock = threading.Lock()
+_cache = {'index': None, 'stamp': None}
+
+
+def _stamp_path():
+    return str(getattr(settings, 'TARIFF_INDEX_STAMP', os.path.join(tempfile.gettempdir(), 'tariff_index.stamp')))
+
+
+def _read_stamp():
+    """Token last written by invalidate_tariff_index (None if never invalidated)"""
+    try:
+        with open(_stamp_path()) as stamp_file:
+            return stamp_file.read()
+    except FileNotFoundError:
+        return None
+
+
+def _touch_stamp():
+    """Atomically replace the stamp file with a new token"""
+    path = _stamp_path()
+    directory = os.path.dirname(path) or '.'
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tariff_index.')
+        with os.fdopen(fd, 'w') as stamp_file:
+            stamp_file.write(uuid.uuid4().hex)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"Could not update tariff index stamp {path}: {e}")
+
+
+def get_tariff_index():
+    """Current tariff index, rebuilt from the database only after an invalidation"""
+    stamp = _read_stamp()
+    index = _cache['index']
+    if index is not None and _cache['stamp'] == stamp:
+        return index
+
+    with _lock:
+        if _cache['index'] is None or _cache['stamp'] != stamp:
+            from .models import TariffRate
+            tariffs = TariffRate.objects.filter(is_active=True).select_related('set_by')
+            _cache['index'] = TariffIndex(list(tariffs))
+            _cache['stamp'] = stamp
+        return _cache['index']
+
+
+def invalidate_tariff_index():
+    """
+    Drop this worker's index now and signal every other worker once the
+    surrounding transaction commits.
+    """
+    _cache['index'] = None
+    transaction.on_commit(_touch_stamp)
@@ -9,8 +9,8 @@ from .views import (
     register, login, logout, get_user,
     UserViewSet, HouseholdViewSet, TariffRateViewSet,
     WaterUsageViewSet, BillViewSet, PaymentViewSet,
-    dashboard_stats, dashboard_charts, SMSNotificationViewSet,
-    NotificationViewSet, health_check
+    dashboard_stats, dashboard_charts, dashboard_receivables, SMSNotificationViewSet,
+    NotificationViewSet, ReconciliationViewSet, payment_callback, sync_changes, sync_readings, health_check
 )
 
 
@@ -22,6 +22,7 @@ router.register(r'tariffs', TariffRateViewSet, basename='tariff')
 router.register(r'usage', WaterUsageViewSet, basename='usage')
 router.register(r'bills', BillViewSet, basename='bill')
 router.register(r'payments', PaymentViewSet, basename='payment')
+router.register(r'reconciliations', ReconciliationViewSet, basename='reconciliation')
 router.register(r'sms', SMSNotificationViewSet, basename='sms')
 router.register(r'notifications', NotificationViewSet, basename='notification')
 
@@ -39,6 +40,14 @@ urlpatterns = [
     # Dashboard endpoints
     path('dashboard/stats/', dashboard_stats, name='dashboard_stats'),
     path('dashboard/charts/', dashboard_charts, name='dashboard_charts'),
+    path('dashboard/receivables/', dashboard_receivables, name='dashboard_receivables'),
+    
+    # Offline device sync
+    path('sync/changes/', sync_changes, name='sync_changes'),
+    path('sync/readings/', sync_readings, name='sync_readings'),
+    
+    # Mobile Money provider callbacks (token-authenticated, before the payments router)
+    path('payments/callback/', payment_callback, name='payment_callback'),
     
     # Include router URLs
     path('', include(router.urls)),
@@ -0,0 +1,498 @@
+"""
+Bulk meter readings for Village Water System
+"""
+import csv
+import io
+import logging
+import re
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Bill, Household, HouseholdAccountSummary, HouseholdUsageStats, WaterUsage
+
+logger = logging.getLogger(__name__)
+
+READING_MONTH = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+
+class UsageImportError(Exception):
+    """Raised when an upload cannot be used at all (e.g. required columns missing)"""
+
+
+class UsageService:
+    """
+    Bulk meter readings.
+
+    A round of readings is matched to households and to readings already on
+    record with a fixed number of set lookups, written with bulk_create
+    (bulk_update for upserts), and the anomaly flags, usage statistics and
+    account summaries of the affected households are updated together.
+
+    Missing previous readings are taken from the last reading kept on each
+    household's account summary.
+    """
+
+    BATCH_SIZE = 1000
+    # Largest reading the DecimalField(max_digits=10, decimal_places=2) reading columns hold
+    MAX_READING = Decimal('99999999.99')
+
+    # Accepted header spellings -> field
+    COLUMNS = {
+        'household_code': 'household_code',
+        'household': 'household_code',
+        'meter_number': 'meter_number',
+        'meter': 'meter_number',
+        'previous_reading': 'previous_reading',
+        'previous': 'previous_reading',
+        'current_reading': 'current_reading',
+        'current': 'current_reading',
+        'reading': 'current_reading',
+        'reading_date': 'reading_date',
+        'date': 'reading_date',
+        'reading_month': 'reading_month',
+        'month': 'reading_month',
+    }
+
+    @classmethod
+    def normalize(cls, row):
+        """Map a row's keys onto COLUMNS and its values onto stripped strings"""
+        normalized = {}
+        for name, value in row.items():
+            field = cls.COLUMNS.get(str(name).strip().lower().replace(' ', '_'))
+            if field and value is not None:
+                normalized[field] = str(value).strip()
+        return normalized
+
+    @classmethod
+    def read_csv(cls, uploaded_file):
+        """
+        Yield one dict per CSV row, reading the upload line by line.
+        Headers are matched case-insensitively against COLUMNS.
+        """
+        stream = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+        reader = csv.reader(stream)
+        header = next(reader, None)
+        if not header:
+            raise UsageImportError('The file is empty')
+
+        fields = [cls.COLUMNS.get(name.strip().lower().replace(' ', '_')) for name in header]
+        if 'current_reading' not in fields or not {'household_code', 'meter_number'} & set(fields):
+            raise UsageImportError(
+                'The file needs a current_reading column and a household_code or meter_number column'
+            )
+
+        for values in reader:
+            if not any(value.strip() for value in values):
+                continue
+            yield {
+                field: value.strip()
+                for field, value in zip(fields, values)
+                if field
+            }
+
+    @classmethod
+    def import_rows(cls, rows, recorded_by=None, upsert=False, first_row=2):
+        """
+        Import reading rows (dicts as produced by read_csv or normalize).
+
+        Rows are matched to households by household_code or meter_number.
+        A row without a previous_reading continues from the household's
+        last reading before its month. A row for a household and month
+        already on record is reported as a duplicate, or with `upsert`
+        replaces that reading. Invalid rows are reported and skipped; the
+        rest are written in one transaction.
+        Returns a summary with a per-row report.
+        """
+        report = []
+        entries = []
+        for row_number, row in enumerate(rows, start=first_row):
+            entry, error = cls._parse_row(row)
+            if error:
+                report.append(cls._row_result(row_number, 'error', error, source=row))
+                continue
+            entry['row'] = row_number
+            entries.append(entry)
+
+        households_by_code, households_by_meter = cls._load_households(entries)
+        matched = []
+        for entry in entries:
+            household, error = cls._match_household(entry, households_by_code, households_by_meter)
+            if error:
+                report.append(cls._row_result(entry['row'], 'error', error, source=entry))
+                continue
+            entry['household'] = household
+            matched.append(entry)
+
+        matched = cls._fill_previous_readings(matched, report)
+        existing = cls._existing_usages(matched, load=upsert)
+        seen = {}
+        created = []
+        updated = []
+        results = []
+        for entry in matched:
+            key = (entry['household'].household_id, entry['reading_month'])
+            if key in seen:
+                report.append(cls._row_result(
+                    entry['row'], 'duplicate',
+                    f"Reading for {entry['household'].household_code} in {entry['reading_month']} "
+                    f"repeats row {seen[key]}",
+                    source=entry
+                ))
+                continue
+            seen[key] = entry['row']
+
+            usage = existing.get(key)
+            if usage is not None and not upsert:
+                report.append(cls._row_result(
+                    entry['row'], 'duplicate',
+                    f"Usage record already exists for {entry['household'].household_code} in {entry['reading_month']}",
+                    source=entry
+                ))
+                continue
+
+            if usage is None:
+                usage = WaterUsage(
+                    household=entry['household'],
+                    reading_month=entry['reading_month'],
+                    recorded_by=recorded_by,
+                )
+                created.append(usage)
+                result = 'created'
+            elif (usage.previous_reading, usage.current_reading, usage.reading_date) == (
+                entry['previous_reading'], entry['current_reading'], entry['reading_date']
+            ):
+                results.append((entry, 'unchanged', usage))
+                continue
+            else:
+                updated.append(usage)
+                result = 'updated'
+            usage.previous_reading = entry['previous_reading']
+            usage.current_reading = entry['current_reading']
+            usage.liters_used = entry['current_reading'] - entry['previous_reading']
+            usage.reading_date = entry['reading_date']
+            results.append((entry, result, usage))
+
+        if created or updated:
+            cls._write(created, updated)
+
+        report.extend(
+            cls._row_result(entry['row'], result, source=entry, usage=usage)
+            for entry, result, usage in results
+        )
+        report.sort(key=lambda result: result['row'])
+        counts = defaultdict(int)
+        for result in report:
+            counts[result['status']] += 1
+
+        logger.info(
+            f"Usage import: {counts['created']} created, {counts['updated']} updated, "
+            f"{counts['duplicate']} duplicates, {counts['error']} errors"
+        )
+
+        return {
+            'rows_read': len(report),
+            'created': counts['created'],
+            'updated': counts['updated'],
+            'unchanged': counts['unchanged'],
+            'duplicates': counts['duplicate'],
+            'errors': counts['error'],
+            'anomalies': sum(1 for result in report if result['is_anomaly']),
+            'rows': report,
+        }
+
+    @classmethod
+    def _write(cls, created, updated):
+        """
+        Insert and update readings in one transaction. New readings of
+        households without corrections are flagged against their locked
+        usage statistics in upload order; households with corrections have
+        their statistics and flags rebuilt afterwards.
+        """
+        corrected = {usage.household_id for usage in updated}
+
+        with transaction.atomic():
+            stats = cls._lock_stats({usage.household_id for usage in created} - corrected)
+            for usage in created:
+                household_stats = stats.get(usage.household_id)
+                if household_stats is not None:
+                    usage.is_anomaly = household_stats.is_anomaly(usage.liters_used)
+                    household_stats.add(usage.liters_used)
+
+            WaterUsage.objects.bulk_create(created, batch_size=cls.BATCH_SIZE)
+            now = timezone.now()
+            for household_stats in stats.values():
+                household_stats.updated_at = now
+            HouseholdUsageStats.objects.bulk_update(
+                stats.values(),
+                ['readings_count', 'liters_total', 'liters_squared_total', 'recent_liters', 'updated_at'],
+                batch_size=cls.BATCH_SIZE
+            )
+
+            if updated:
+                for usage in updated:
+                    usage.updated_at = now
+                WaterUsage.objects.bulk_update(
+                    updated,
+                    ['previous_reading', 'current_reading', 'liters_used', 'reading_date', 'updated_at'],
+                    batch_size=cls.BATCH_SIZE
+                )
+                usage_ids = [usage.usage_id for usage in updated]
+                for start in range(0, len(usage_ids), cls.BATCH_SIZE):
+                    Bill.objects.filter(
+                        usage_id__in=usage_ids[start:start + cls.BATCH_SIZE], status='Pending'
+                    ).update(needs_rebill=True, updated_at=now)
+                HouseholdUsageStats.refresh(corrected, batch_size=cls.BATCH_SIZE)
+                flags = {}
+                for start in range(0, len(usage_ids), cls.BATCH_SIZE):
+                    flags.update(WaterUsage.objects.filter(
+                        usage_id__in=usage_ids[start:start + cls.BATCH_SIZE]
+                    ).values_list('usage_id', 'is_anomaly'))
+                for usage in updated:
+                    usage.is_anomaly = flags[usage.usage_id]
+
+            HouseholdAccountSummary.record_usages(
+                [usage for usage in created if usage.household_id not in corrected], batch_size=cls.BATCH_SIZE
+            )
+            HouseholdAccountSummary.refresh(corrected, batch_size=cls.BATCH_SIZE)
+
+        # bulk_create does not return primary keys on every backend
+        unsaved = {(usage.household_id, usage.reading_month): usage for usage in created if usage.usage_id is None}
+        if unsaved:
+            for household_id, reading_month, usage_id in cls._usage_keys(unsaved):
+                if (household_id, reading_month) in unsaved:
+                    unsaved[household_id, reading_month].usage_id = usage_id
+
+    @classmethod
+    def _lock_stats(cls, household_ids):
+        """Usage statistics of the households, locked; missing rows are built first"""
+        household_ids = sorted(household_ids)
+        stats = {}
+        for start in range(0, len(household_ids), cls.BATCH_SIZE):
+            stats.update(
+                (household_stats.household_id, household_stats)
+                for household_stats in HouseholdUsageStats.objects.select_for_update().filter(
+                    household_id__in=household_ids[start:start + cls.BATCH_SIZE]
+                )
+            )
+        missing = [household_id for household_id in household_ids if household_id not in stats]
+        if missing:
+            HouseholdUsageStats.refresh(missing, batch_size=cls.BATCH_SIZE)
+            for start in range(0, len(missing), cls.BATCH_SIZE):
+                stats.update(
+                    (household_stats.household_id, household_stats)
+                    for household_stats in HouseholdUsageStats.objects.select_for_update().filter(
+                        household_id__in=missing[start:start + cls.BATCH_SIZE]
+                    )
+                )
+        return stats
+
+    @staticmethod
+    def _parse_row(row):
+        """Validate one row; returns (entry, None) or (None, error message)"""
+        household_code = row.get('household_code', '')
+        meter_number = row.get('meter_number', '')
+        if not household_code and not meter_number:
+            return None, 'Row has neither a household code nor a meter number'
+
+        if not row.get('current_reading'):
+            return None, 'Current reading is required'
+        readings = {'previous_reading': None}
+        for field in ('current_reading', 'previous_reading'):
+            value = row.get(field)
+            if not value:
+                continue
+            try:
+                readings[field] = Decimal(value.replace(',', '')).quantize(Decimal('0.01'))
+                if not readings[field].is_finite():
+                    raise InvalidOperation(value)
+            except InvalidOperation:
+                return None, f"Invalid {field.replace('_', ' ')} '{value}'"
+            if readings[field] < 0:
+                return None, f"{field.replace('_', ' ').capitalize()} cannot be negative"
+            if readings[field] > UsageService.MAX_READING:
+                return None, f"{field.replace('_', ' ').capitalize()} must not exceed {UsageService.MAX_READING}"
+        if readings['previous_reading'] is not None and readings['current_reading'] < readings['previous_reading']:
+            return None, 'Current reading must be greater than or equal to previous reading'
+
+        reading_date = date.today()
+        if row.get('reading_date'):
+            try:
+                reading_date = datetime.strptime(row['reading_date'][:10], '%Y-%m-%d').date()
+            except ValueError:
+                return None, f"Invalid reading date '{row['reading_date']}' (use YYYY-MM-DD)"
+
+        reading_month = row.get('reading_month') or reading_date.strftime('%Y-%m')
+        if not READING_MONTH.match(reading_month):
+            return None, f"Invalid reading month '{reading_month}' (use YYYY-MM)"
+
+        return {
+            'household_code': household_code,
+            'meter_number': meter_number,
+            'previous_reading': readings['previous_reading'],
+            'current_reading': readings['current_reading'],
+            'reading_date': reading_date,
+            'reading_month': reading_month,
+        }, None
+
+    @classmethod
+    def previous_readings(cls, keys):
+        """
+        {(household_id, reading_month): last current_reading before that month}
+        for the given pairs; 0 when the household has no earlier reading
+        """
+        return {key: reading for key, (month, reading) in cls._readings_before(keys).items()}
+
+    @classmethod
+    def _readings_before(cls, keys):
+        """
+        {(household_id, reading_month): (month, current_reading) of the last
+        reading before that month}, ('', 0) when there is none. Pairs after
+        the household's last reading are answered from the account summaries
+        in one query per batch; back-filled months look up their own
+        predecessor.
+        """
+        keys = set(keys)
+        household_ids = sorted({household_id for household_id, reading_month in keys})
+        latest = {}
+        for start in range(0, len(household_ids), cls.BATCH_SIZE):
+            latest.update(
+                (household_id, (last_month, last_reading))
+                for household_id, last_month, last_reading in HouseholdAccountSummary.objects.filter(
+                    household_id__in=household_ids[start:start + cls.BATCH_SIZE]
+                ).values_list('household_id', 'last_reading_month', 'last_reading')
+            )
+
+        previous = {}
+        for household_id, reading_month in keys:
+            last_month, last_reading = latest.get(household_id, (None, None))
+            if last_month is None or last_month < reading_month:
+                previous[household_id, reading_month] = (last_month or '', last_reading or Decimal('0.00'))
+                continue
+            earlier = WaterUsage.objects.filter(
+                household_id=household_id, reading_month__lt=reading_month
+            ).order_by('-reading_month', '-usage_id').values_list('reading_month', 'current_reading').first()
+            previous[household_id, reading_month] = earlier or ('', Decimal('0.00'))
+        return previous
+
+    @classmethod
+    def _fill_previous_readings(cls, entries, report):
+        """
+        Fill missing previous readings from the household's last reading, or
+        from an earlier month in the same upload; entries whose current
+        reading is below it are reported and dropped
+        """
+        missing = [entry for entry in entries if entry['previous_reading'] is None]
+        if not missing:
+            return entries
+
+        stored = cls._readings_before(
+            (entry['household'].household_id, entry['reading_month']) for entry in missing
+        )
+        uploaded = defaultdict(dict)
+        for entry in entries:
+            uploaded[entry['household'].household_id].setdefault(entry['reading_month'], entry['current_reading'])
+
+        kept = []
+        for entry in entries:
+            if entry['previous_reading'] is None:
+                household_id, reading_month = entry['household'].household_id, entry['reading_month']
+                # Readings in this upload win over the stored reading of the same month
+                candidates = [
+                    (month, reading) for month, reading in uploaded[household_id].items() if month < reading_month
+                ] + [stored[household_id, reading_month]]
+                entry['previous_reading'] = max(candidates, key=lambda candidate: candidate[0])[1]
+                if entry['current_reading'] < entry['previous_reading']:
+                    report.append(cls._row_result(
+                        entry['row'], 'error',
+                        f"Current reading {entry['current_reading']} is below the last reading "
+                        f"{entry['previous_reading']}",
+                        source=entry
+                    ))
+                    continue
+            kept.append(entry)
+        return kept
+
+    @classmethod
+    def _load_households(cls, entries):
+        """Households named by code and by meter number, one query per batch each"""
+        codes = list({entry['household_code'] for entry in entries if entry['household_code']})
+        meters = list({entry['meter_number'] for entry in entries if entry['meter_number'] and not entry['household_code']})
+
+        by_code = {}
+        for start in range(0, len(codes), cls.BATCH_SIZE):
+            for household in Household.objects.filter(household_code__in=codes[start:start + cls.BATCH_SIZE]):
+                by_code[household.household_code] = household
+
+        by_meter = {}
+        for start in range(0, len(meters), cls.BATCH_SIZE):
+            for household in Household.objects.filter(meter_number__in=meters[start:start + cls.BATCH_SIZE]):
+                by_meter[household.meter_number] = household
+
+        return by_code, by_meter
+
+    @staticmethod
+    def _match_household(entry, households_by_code, households_by_meter):
+        """The row's household; returns (household, None) or (None, error message)"""
+        if entry['household_code']:
+            household = households_by_code.get(entry['household_code'])
+            if household is None:
+                return None, f"Household {entry['household_code']} not found"
+            if entry['meter_number'] and entry['meter_number'] != household.meter_number:
+                return None, f"Meter {entry['meter_number']} does not belong to household {household.household_code}"
+            return household, None
+
+        household = households_by_meter.get(entry['meter_number'])
+        if household is None:
+            return None, f"No household has meter {entry['meter_number']}"
+        return household, None
+
+    @classmethod
+    def _usage_keys(cls, keys):
+        """(household_id, reading_month, usage_id) of readings on record for the given pairs"""
+        household_ids = sorted({household_id for household_id, reading_month in keys})
+        months = {reading_month for household_id, reading_month in keys}
+        for start in range(0, len(household_ids), cls.BATCH_SIZE):
+            yield from WaterUsage.objects.filter(
+                household_id__in=household_ids[start:start + cls.BATCH_SIZE],
+                reading_month__in=months
+            ).values_list('household_id', 'reading_month', 'usage_id')
+
+    @classmethod
+    def _existing_usages(cls, entries, load=False):
+        """
+        {(household_id, reading_month): usage} of readings already on record;
+        the values are full instances with `load`, else just usage ids
+        """
+        keys = {(entry['household'].household_id, entry['reading_month']) for entry in entries}
+        existing = {
+            (household_id, reading_month): usage_id
+            for household_id, reading_month, usage_id in cls._usage_keys(keys)
+            if (household_id, reading_month) in keys
+        }
+        if load and existing:
+            usage_ids = list(existing.values())
+            usages = {}
+            for start in range(0, len(usage_ids), cls.BATCH_SIZE):
+                usages.update(WaterUsage.objects.in_bulk(usage_ids[start:start + cls.BATCH_SIZE]))
+            existing = {key: usages[usage_id] for key, usage_id in existing.items()}
+        return existing
+
+    @staticmethod
+    def _row_result(row_number, result, message='', source=None, usage=None):
+        source = source or {}
+        household = source.get('household')
+        return {
+            'row': row_number,
+            'status': result,
+            'message': message,
+            'household_code': household.household_code if household else source.get('household_code', ''),
+            'meter_number': source.get('meter_number', ''),
+            'reading_month': source.get('reading_month', ''),
+            'usage_id': usage.usage_id if usage else None,
+            'liters_used': str(usage.liters_used) if usage else '',
+            'is_anomaly': usage.is_anomaly if usage else False,
+        }
@@ -2,18 +2,25 @@
 API Views for Village Water System
 """
 from rest_framework import viewsets, status, generics
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
 from django.contrib.auth import authenticate
-from django.db.models import Sum, Count, Q
+from django.db import IntegrityError
+from django.db.models import Sum, Count, F, Q
 from django.utils import timezone
 from datetime import datetime, timedelta, date
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 import os
 import csv
-from django.http import HttpResponse
+import hmac
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
@@ -22,16 +29,32 @@ from reportlab.lib.styles import getSampleStyleSheet
 
 
 
-from .models import User, Household, TariffRate, WaterUsage, Bill, Payment, SMSNotification, Notification
+from .models import (
+    User, Household, HouseholdAccountSummary, TariffRate, WaterUsage, Bill, BillingJob, Payment,
+    ReconciliationReport, SMSNotification, Notification
+)
 from .serializers import (
-    UserSerializer, HouseholdSerializer, TariffRateSerializer,
-    WaterUsageSerializer, BillSerializer, PaymentSerializer,
+    UserSerializer, HouseholdSerializer, DebtorSerializer, TariffRateSerializer,
+    WaterUsageSerializer, BillSerializer, BillingJobSerializer, PaymentSerializer,
     DashboardStatsSerializer, RevenueChartSerializer,
     BillStatusChartSerializer, TopConsumerSerializer,
-    SMSNotificationSerializer, NotificationSerializer
+    SMSNotificationSerializer, NotificationSerializer,
+    ReconciliationReportSerializer, ReconciliationItemSerializer
 )
 from .sms_service import SMSService
 from .notification_service import NotificationService
+from .tariff_service import get_tariff_index
+from .tariff_calculator import ChargeCalculator
+from .balance_service import BalanceService, month_end, previous_month_end
+from .billing_service import BillingService, BillingError
+from .payment_service import PaymentService, PaymentImportError, PaymentError
+from .sync_service import SyncService, SyncError
+from .usage_service import UsageService, UsageImportError
+from .reconciliation_service import ReconciliationService, ReconciliationError
+from .receipts import (
+    COMPACT_FIELDS, TEXT_WIDTHS, compact_values, dumps_compact, get_receipt_file, receipt_etag, receipt_json,
+    render_receipt_text
+)
 from .permissions import IsAdminUser, IsManagerOrAdmin, IsHouseholdOwner
 from .sms_service import sms_service
 
@@ -262,7 +285,9 @@ class HouseholdViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Filter households based on user role"""
         user = self.request.user
-        queryset = Household.objects.all()
+        queryset = Household.objects.select_related(
+            'user', 'registered_by', 'account_summary', 'account_summary__last_bill'
+        )
         
         # Household users can only see their own household
         if user.role == 'Household':
@@ -275,6 +300,12 @@ class HouseholdViewSet(viewsets.ModelViewSet):
         if status_filter:
             queryset = queryset.filter(status=status_filter)
         
+        # Balance filters read the maintained account summary
+        if self.request.query_params.get('has_balance') in ('true', '1'):
+            queryset = queryset.filter(account_summary__outstanding_balance__gt=0)
+        if self.request.query_params.get('overdue') in ('true', '1'):
+            queryset = queryset.filter(account_summary__overdue_bills_count__gt=0)
+        
         if search:
             queryset = queryset.filter(
                 Q(household_code__icontains=search) |
@@ -288,6 +319,46 @@ class HouseholdViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """Set registered_by to current user"""
         serializer.save(registered_by=self.request.user)
+    
+    @action(detail=True, methods=['get'])
+    def balance(self, request, pk=None):
+        """
+        What the household owed at the end of ?as_of=YYYY-MM-DD (default today),
+        from the nearest month-end snapshot plus the bills and payments since
+        """
+        household = self.get_object()
+        try:
+            as_of = _as_of_date(request)
+        except ValueError:
+            return Response({'error': 'as_of must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        result = BalanceService.household_balance(household.household_id, as_of)
+        result['household_code'] = household.household_code
+        return Response(result, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsManagerOrAdmin])
+    def debtors(self, request):
+        """
+        Households owing money, largest balance first, read from the account summaries.
+        Optional ?min_balance=, ?overdue=true and ?village=
+        """
+        summaries = HouseholdAccountSummary.objects.select_related('household')
+        try:
+            min_balance = Decimal(request.query_params.get('min_balance') or '0')
+        except InvalidOperation:
+            return Response({'error': 'min_balance must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        summaries = summaries.filter(outstanding_balance__gt=min_balance)
+        if request.query_params.get('overdue') in ('true', '1'):
+            summaries = summaries.filter(overdue_bills_count__gt=0)
+        village = request.query_params.get('village')
+        if village:
+            summaries = summaries.filter(household__village=village)
+        summaries = summaries.order_by('-outstanding_balance', 'household_id')
+        
+        page = self.paginate_queryset(summaries)
+        if page is not None:
+            return self.get_paginated_response(DebtorSerializer(page, many=True).data)
+        return Response(DebtorSerializer(summaries, many=True).data)
 
     @action(detail=False, methods=['get'], permission_classes=[IsManagerOrAdmin])
     def export_csv(self, request):
@@ -366,7 +437,7 @@ class TariffRateViewSet(viewsets.ModelViewSet):
     
     def get_permissions(self):
         """Allow all authenticated users to view, but only managers/admins to modify"""
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'current', 'estimate']:
             return [IsAuthenticated()]
         return [IsManagerOrAdmin()]
     
@@ -396,6 +467,69 @@ class TariffRateViewSet(viewsets.ModelViewSet):
         except Exception as e:
             print(f"Failed to send tariff notification: {e}")
 
+    def _resolve_tariff(self, request):
+        """Resolve ?date=YYYY-MM-DD or ?period=YYYY-MM (default today) against the tariff index"""
+        index = get_tariff_index()
+        period = request.query_params.get('period')
+        on_date = request.query_params.get('date')
+        
+        try:
+            if period:
+                return index.for_period(period)
+            if on_date:
+                return index.for_date(datetime.strptime(on_date, '%Y-%m-%d').date())
+        except ValueError:
+            raise ValidationError({'error': 'Use date=YYYY-MM-DD or period=YYYY-MM'})
+        return index.for_date(date.today())
+
+    @action(detail=False, methods=['get'])
+    def current(self, request):
+        """Tariff in effect on a date or for a billing period"""
+        tariff = self._resolve_tariff(request)
+        if not tariff:
+            return Response({'error': 'No active tariff rate found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(TariffRateSerializer(tariff).data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def estimate(self, request):
+        """
+        Estimate a bill for ?liters= (and optional ?members=) for ?period=YYYY-MM
+        (prorated across tariff changes) or on ?date= / today
+        """
+        try:
+            liters = Decimal(request.query_params.get('liters', '')).quantize(Decimal('0.01'))
+            members = int(request.query_params.get('members', 1))
+        except (ArithmeticError, ValueError):
+            return Response({'error': 'liters and members must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        period = request.query_params.get('period')
+        if period:
+            try:
+                segments = get_tariff_index().segments_for_period(period)
+            except ValueError:
+                return Response({'error': 'Use period=YYYY-MM'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            tariff = self._resolve_tariff(request)
+            segments = [(tariff, 1)] if tariff else []
+        
+        if not segments:
+            return Response({'error': 'No active tariff rate found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        calculator = ChargeCalculator(segments)
+        charges = calculator.calculate([liters], [members])
+        tariff = calculator.primary_tariff
+        
+        return Response({
+            'tariff_id': tariff.tariff_id,
+            'rate_name': tariff.rate_name,
+            'rate_per_liter': tariff.rate_per_liter,
+            'liters': liters,
+            'rate_applied': charges['rate_applied'][0],
+            'subtotal': charges['subtotal'][0],
+            'discount_amount': charges['discount'][0],
+            'estimated_amount': charges['total'][0]
+        }, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['get'], permission_classes=[IsManagerOrAdmin])
     def export_csv(self, request):
         """Export tariff rates to CSV"""
@@ -475,7 +609,7 @@ class WaterUsageViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Filter water usage based on user role"""
         user = self.request.user
-        queryset = WaterUsage.objects.all()
+        queryset = WaterUsage.objects.select_related('household', 'recorded_by')
         
         # Household users can only see their own usage
         if user.role == 'Household':
@@ -515,6 +649,65 @@ class WaterUsageViewSet(viewsets.ModelViewSet):
                 raise PermissionDenied(f"Error recording usage: {str(e)}")
         else:
             serializer.save(recorded_by=user)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsManagerOrAdmin])
+    def bulk(self, request):
+        """
+        Record a round of meter readings in one request: a CSV file in the
+        "file" field, or a JSON array of readings (optionally as
+        {"readings": [...], "upsert": true}). Returns a per-row report.
+        """
+        data = request.data
+        upload = request.FILES.get('file')
+        options = data if isinstance(data, dict) else {}
+        upsert = str(request.query_params.get('upsert', options.get('upsert', 'false'))).lower() in ('true', '1', 'yes')
+        
+        try:
+            if upload:
+                rows, first_row = UsageService.read_csv(upload), 2
+            else:
+                readings = data.get('readings') if isinstance(data, dict) else data
+                if not isinstance(readings, list) or not all(isinstance(row, dict) for row in readings):
+                    return Response(
+                        {'error': 'Send a CSV file in the "file" field or a JSON array of readings'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                rows, first_row = (UsageService.normalize(row) for row in readings), 1
+            result = UsageService.import_rows(rows, recorded_by=request.user, upsert=upsert, first_row=first_row)
+        except (UsageImportError, UnicodeDecodeError, csv.Error) as e:
+            return Response({'error': f'Could not read the file: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        except IntegrityError:
+            return Response(
+                {'error': 'Some of these readings were recorded by another upload at the same time; send the batch again'},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        return Response(result, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'], url_path='last-readings', permission_classes=[IsManagerOrAdmin])
+    def last_readings(self, request):
+        """
+        Last meter reading of every household in ?village= (optionally
+        ?cell=, ?sector= and ?status=), from the account summaries in one
+        query, for field devices to preload before a reading round
+        """
+        village = request.query_params.get('village')
+        if not village:
+            return Response({'error': 'village is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        households = Household.objects.filter(village=village)
+        for field in ('cell', 'sector', 'status'):
+            if request.query_params.get(field):
+                households = households.filter(**{field: request.query_params[field]})
+        
+        readings = list(households.order_by('household_code').values(
+            'household_id', 'household_code', 'household_name', 'meter_number', 'status',
+            last_reading=F('account_summary__last_reading'),
+            last_reading_date=F('account_summary__last_reading_date'),
+            last_reading_month=F('account_summary__last_reading_month'),
+        ))
+        return Response({'village': village, 'count': len(readings), 'households': readings},
+                        status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'], permission_classes=[IsManagerOrAdmin])
     def export_csv(self, request):
@@ -619,8 +812,13 @@ class BillViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(status=status_filter)
         if billing_period:
             queryset = queryset.filter(billing_period=billing_period)
+        billing_job = self.request.query_params.get('billing_job', None)
+        if billing_job:
+            queryset = queryset.filter(billing_job_id=billing_job)
+        if self.request.query_params.get('outstanding') in ('true', '1'):
+            queryset = queryset.filter(balance_due__gt=0).exclude(status='Cancelled')
         
-        return queryset.order_by('-bill_date')
+        return queryset.select_related('household', 'generated_by', 'tariff').order_by('-bill_date', '-bill_id')
     
     def perform_create(self, serializer):
         """Set generated_by to current user and validate household"""
@@ -671,85 +869,90 @@ class BillViewSet(viewsets.ModelViewSet):
                 'error': 'Billing period is required (format: YYYY-MM)'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get active tariff rate
-        tariff = TariffRate.objects.filter(is_active=True).first()
-        if not tariff:
+        try:
+            BillingService.validate_period(billing_period)
+        except BillingError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if household_id and not Household.objects.filter(household_id=household_id).exists():
             return Response({
-                'error': 'No active tariff rate found'
+                'error': 'Household not found'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get households
-        if household_id:
-            households = Household.objects.filter(household_id=household_id, status='Active')
-        else:
-            households = Household.objects.filter(status='Active')
+        if str(request.data.get('dry_run', '')).lower() in ('true', '1', 'yes'):
+            return self._preview_monthly_bills(request, billing_period, household_id)
         
-        bills_created = []
-        errors = []
+        # Queue the run; the billing worker (process_billing_jobs) picks it up
+        job = BillingJob.objects.create(
+            billing_period=billing_period,
+            household_id=household_id or None,
+            requested_by=request.user
+        )
         
-        for household in households:
-            try:
-                # Check if bill already exists
-                existing_bill = Bill.objects.filter(
-                    household=household,
-                    billing_period=billing_period
-                ).first()
-                
-                if existing_bill:
-                    errors.append(f"Bill already exists for {household.household_code}")
-                    continue
-                
-                # Get water usage for this period
-                usage = WaterUsage.objects.filter(
-                    household=household,
-                    reading_month=billing_period
-                ).first()
-                
-                if not usage:
-                    errors.append(f"No usage record found for {household.household_code}")
-                    continue
-                
-                # Calculate bill
-                liters_consumed = usage.liters_used
-                rate_applied = tariff.rate_per_liter
-                subtotal = liters_consumed * rate_applied
-                
-                # Create bill
-                bill = Bill.objects.create(
-                    household=household,
-                    usage=usage,
-                    tariff=tariff,
-                    liters_consumed=liters_consumed,
-                    rate_applied=rate_applied,
-                    subtotal=subtotal,
-                    total_amount=subtotal,
-                    bill_date=date.today(),
-                    due_date=date.today() + timedelta(days=30),
-                    billing_period=billing_period,
-                    generated_by=request.user
-                )
-                
-                # Update usage status
-                usage.status = 'Billed'
-                usage.save()
-                
-                # Send SMS and In-App notification
-                try:
-                    sms_service.send_bill_notification(bill)
-                    NotificationService.notify_new_bill(bill)
-                except Exception as e:
-                    print(f"Failed to send notifications: {e}")
-                
-                bills_created.append(BillSerializer(bill).data)
-                
-            except Exception as e:
-                errors.append(f"Error for {household.household_code}: {str(e)}")
+        return Response({
+            'message': f'Billing job {job.job_id} queued for {billing_period}',
+            'job_id': job.job_id,
+            'status': job.status,
+            'errors': []
+        }, status=status.HTTP_202_ACCEPTED)
+
+    def _preview_monthly_bills(self, request, billing_period, household_id):
+        """Dry run of generate_monthly_bills, streamed as NDJSON with a summary trailer"""
+        tariff = None
+        tariff_id = request.data.get('tariff_id')
+        if tariff_id:
+            if request.user.role not in ['Admin', 'Manager']:
+                return Response({'error': 'Only managers can preview a different tariff'}, status=status.HTTP_403_FORBIDDEN)
+            tariff = TariffRate.objects.filter(tariff_id=tariff_id).first()
+            if tariff is None:
+                return Response({'error': 'Tariff rate not found'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        service = BillingService(billing_period, household_id=household_id or None)
+        try:
+            lines = service.preview(tariff=tariff)
+        except BillingError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        response = StreamingHttpResponse(
+            (json.dumps(line, cls=DjangoJSONEncoder) + '\n' for line in lines),
+            content_type='application/x-ndjson'
+        )
+        response['Content-Disposition'] = f'inline; filename="billing_preview_{billing_period}.ndjson"'
+        return response
+
+    @action(detail=False, methods=['post'], permission_classes=[IsManagerOrAdmin])
+    def rebill(self, request):
+        """Recompute Pending bills flagged after reading corrections or tariff edits"""
+        billing_period = request.data.get('billing_period')
+        if not billing_period:
+            return Response({
+                'error': 'Billing period is required (format: YYYY-MM)'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            service = BillingService(billing_period, household_id=request.data.get('household_id') or None)
+            result = service.rebill()
+        except BillingError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
-            'message': f'{len(bills_created)} bills generated successfully',
-            'bills': bills_created,
-            'errors': errors
-        }, status=status.HTTP_201_CREATED if bills_created else status.HTTP_400_BAD_REQUEST)
+            'message': f"{result['bills_updated']} bills re-billed for {billing_period}",
+            **result
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>\d+)', permission_classes=[IsAuthenticated])
+    def job_status(self, request, job_id=None):
+        """Report progress of a billing job"""
+        jobs = BillingJob.objects.select_related('requested_by')
+        if request.user.role == 'Household':
+            jobs = jobs.filter(requested_by=request.user)
+        
+        try:
+            job = jobs.get(job_id=job_id)
+        except BillingJob.DoesNotExist:
+            return Response({'error': 'Billing job not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response(BillingJobSerializer(job).data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'], permission_classes=[IsManagerOrAdmin])
     def export_csv(self, request):
@@ -834,7 +1037,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Filter payments based on user role"""
         user = self.request.user
-        queryset = Payment.objects.all()
+        queryset = Payment.objects.select_related('bill__household', 'received_by', 'submitted_by')
         
         # Household users can only see their own payments
         if user.role == 'Household':
@@ -874,13 +1077,20 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 from rest_framework.exceptions import PermissionDenied
                 raise PermissionDenied("Household not found")
         
-        # Set payment details
-        payment = serializer.save(
+        # Set payment details and post it under a lock on the bill row,
+        # so concurrent payments cannot overpay the bill
+        fields = dict(serializer.validated_data)
+        fields.update(
             submitted_by=user,
             received_by=user if user.role in ['Admin', 'Manager'] else None,
             payment_date=date.today(),
             payment_time=datetime.now().time()
         )
+        try:
+            payment = PaymentService.post_payment(fields.pop('bill'), fields.pop('amount_paid'), **fields)
+        except PaymentError as e:
+            raise ValidationError({'amount_paid': str(e)})
+        serializer.instance = payment
         
         # Send SMS confirmation
         try:
@@ -905,6 +1115,64 @@ class PaymentViewSet(viewsets.ModelViewSet):
             import traceback
             traceback.print_exc()
 
+    def perform_update(self, serializer):
+        """Save edits under a lock on the bill rows, like new payments, so they cannot overpay"""
+        try:
+            serializer.instance = PaymentService.update_payment(serializer.instance, **serializer.validated_data)
+        except PaymentError as e:
+            raise ValidationError({'amount_paid': str(e)})
+    
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsManagerOrAdmin])
+    def import_payments(self, request):
+        """Import a CSV of Mobile Money / bank statement payments"""
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': 'Upload the statement as a CSV file in the "file" field'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        payment_method = request.data.get('payment_method') or 'Mobile Money'
+        notify = str(request.data.get('notify', 'true')).lower() not in ('false', '0', 'no')
+        
+        try:
+            result = PaymentService.import_rows(
+                PaymentService.read_csv(upload),
+                received_by=request.user,
+                payment_method=payment_method,
+                notify=notify
+            )
+        except (PaymentImportError, UnicodeDecodeError, csv.Error) as e:
+            return Response({'error': f'Could not read the file: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(result, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'], url_path='cash-up', permission_classes=[IsManagerOrAdmin])
+    def cash_up(self, request):
+        """
+        End-of-day settlement: completed payments per collector and payment method.
+        ?date=YYYY-MM-DD (default today) or ?date_from=&date_to=; optional
+        ?received_by=<user id> and ?payment_method=
+        """
+        try:
+            day = request.query_params.get('date')
+            date_from = request.query_params.get('date_from') or day
+            date_to = request.query_params.get('date_to') or day
+            date_from = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else date.today()
+            date_to = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else date_from
+        except ValueError:
+            return Response({'error': 'Dates must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+        if date_to < date_from:
+            return Response({'error': 'date_to must not be before date_from'}, status=status.HTTP_400_BAD_REQUEST)
+        received_by = request.query_params.get('received_by')
+        if received_by and not received_by.isdigit():
+            return Response({'error': 'received_by must be a user id'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        result = PaymentService.cash_up(
+            date_from,
+            date_to,
+            received_by=received_by,
+            payment_method=request.query_params.get('payment_method')
+        )
+        return Response(result, status=status.HTTP_200_OK)
+    
     @action(detail=False, methods=['get'], permission_classes=[IsManagerOrAdmin])
     def export_csv(self, request):
         """Export payments to CSV"""
@@ -974,61 +1242,205 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
     def download_receipt(self, request, pk=None):
-        """Download receipt for a single payment"""
+        """
+        Download receipt for a single payment.
+        The PDF is rendered once per payment version and served from the
+        receipt cache; clients sending a matching If-None-Match get a 304.
+        """
         payment = self.get_object()
         
         # Check permissions: User must be admin/manager or the household owner
         if request.user.role == 'Household':
-            if payment.bill.household.user != request.user:
+            if payment.bill.household.user_id != request.user.pk:
                 return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
         
-        response = HttpResponse(content_type='application/pdf')
-        filename = f"Receipt_{payment.receipt_number}.pdf"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        etag = receipt_etag(payment)
+        if _etag_matches(request, etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+        
+        response = FileResponse(
+            open(get_receipt_file(payment), 'rb'),
+            as_attachment=True,
+            filename=f"Receipt_{payment.receipt_number}.pdf",
+            content_type='application/pdf'
+        )
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def receipt(self, request, pk=None):
+        """
+        Compact receipt for field collectors: ?as=text (default, fixed-width
+        for thermal printers, ?width=32|42|48) or ?as=json
+        """
+        payment = self.get_object()
         
-        doc = SimpleDocTemplate(response, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
+        if request.user.role == 'Household':
+            if payment.bill.household.user_id != request.user.pk:
+                return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
         
-        # Header
-        elements.append(Paragraph("VILLAGE WATER SYSTEM", styles['Title']))
-        elements.append(Paragraph("Payment Receipt", styles['Heading2']))
-        elements.append(Paragraph(" ", styles['Normal']))
+        try:
+            representation, width = _compact_receipt_options(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        etag = receipt_etag(payment, 'json' if representation == 'json' else f'txt{width}')
+        if _etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        elif representation == 'json':
+            response = HttpResponse(dumps_compact(receipt_json(compact_values(payment))),
+                                    content_type='application/json')
+        else:
+            response = HttpResponse(render_receipt_text(compact_values(payment), width),
+                                    content_type='text/plain; charset=utf-8')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsManagerOrAdmin])
+    def receipts(self, request):
+        """
+        Compact receipts of every payment a collector took on one day, in the
+        order taken. ?date=YYYY-MM-DD (default today), ?received_by=<user id>
+        (default the caller), ?as=text|json, ?width=32|42|48
+        """
+        try:
+            representation, width = _compact_receipt_options(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            day = request.query_params.get('date')
+            day = datetime.strptime(day, '%Y-%m-%d').date() if day else date.today()
+        except ValueError:
+            return Response({'error': 'date must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+        received_by = request.query_params.get('received_by') or str(request.user.pk)
+        if not received_by.isdigit():
+            return Response({'error': 'received_by must be a user id'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        rows = Payment.objects.filter(
+            received_by_id=received_by, payment_date=day
+        ).order_by('payment_time', 'payment_id').values_list(*COMPACT_FIELDS)
+        
+        if representation == 'json':
+            body = dumps_compact({
+                'date': str(day),
+                'received_by': int(received_by),
+                'receipts': [receipt_json(row) for row in rows],
+            })
+            return HttpResponse(body, content_type='application/json')
+        
+        body = '\n'.join(render_receipt_text(row, width) for row in rows)
+        response = HttpResponse(body, content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'inline; filename="receipts_{received_by}_{day}.txt"'
+        return response
+
+
+def _etag_matches(request, etag):
+    """True when If-None-Match already names this ETag"""
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    client_etags = parse_etags(if_none_match)
+    return '*' in client_etags or etag in client_etags
+
+
+def _compact_receipt_options(request):
+    """(representation, width) from ?as= and ?width=; raises ValueError"""
+    representation = request.query_params.get('as', 'text')
+    if representation not in ('text', 'json'):
+        raise ValueError("as must be 'text' or 'json'")
+    width = request.query_params.get('width', str(TEXT_WIDTHS[0]))
+    if not width.isdigit() or int(width) not in TEXT_WIDTHS:
+        raise ValueError(f"width must be one of {', '.join(str(w) for w in TEXT_WIDTHS)}")
+    return representation, int(width)
+
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def payment_callback(request):
+    """
+    Mobile Money payment notification from the provider.
+    The notification is stored in the callback inbox with one insert and
+    acknowledged immediately; process_payment_callbacks applies it to bills.
+    """
+    expected = settings.PAYMENT_CALLBACK_TOKEN
+    supplied = request.META.get('HTTP_X_CALLBACK_TOKEN', '')
+    if not expected or not hmac.compare_digest(supplied.encode(), expected.encode()):
+        return Response({'error': 'Invalid callback token'}, status=status.HTTP_403_FORBIDDEN)
+    
+    if not isinstance(request.data, dict):
+        return Response({'error': 'Expected a JSON object'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        callback = PaymentService.record_callback(
+            request.data,
+            provider=request.query_params.get('provider', 'Mobile Money')[:50]
+        )
+    except PaymentError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'status': 'accepted',
+        'callback_id': callback.callback_id
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+class ReconciliationViewSet(viewsets.ReadOnlyModelViewSet):
+    """Provider statement reconciliation reports (Admin/Manager)"""
+    queryset = ReconciliationReport.objects.all()
+    serializer_class = ReconciliationReportSerializer
+    permission_classes = [IsManagerOrAdmin]
+    
+    def get_queryset(self):
+        return ReconciliationReport.objects.select_related('created_by').order_by('-created_date')
+    
+    def create(self, request):
+        """Reconcile an uploaded statement CSV against payments in a date window"""
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': 'Upload the statement as a CSV file in the "file" field'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Receipt Details
-        data = [
-            ['Receipt Number:', payment.receipt_number],
-            ['Date:', str(payment.payment_date)],
-            ['Time:', str(payment.payment_time)],
-            ['Payer Name:', payment.payer_name],
-            ['Household:', payment.bill.household.household_name],
-            ['Household Code:', payment.bill.household.household_code],
-            ['Bill Number:', payment.bill.bill_number],
-            ['Billing Period:', payment.bill.billing_period],
-            ['Payment Method:', payment.payment_method],
-            ['Transaction Ref:', payment.transaction_reference or 'N/A'],
-            ['Amount Paid:', f"{payment.amount_paid} RWF"],
-            ['Status:', payment.payment_status],
-        ]
-        
-        table = Table(data, colWidths=[200, 200])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
+        try:
+            date_from = datetime.strptime(request.data.get('date_from', ''), '%Y-%m-%d').date()
+            date_to = datetime.strptime(request.data.get('date_to', ''), '%Y-%m-%d').date()
+        except ValueError:
+            return Response({'error': 'date_from and date_to are required (format: YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
         
-        elements.append(table)
-        elements.append(Paragraph(" ", styles['Normal']))
-        elements.append(Paragraph("Thank you for your payment!", styles['Italic']))
+        payment_method = request.data.get('payment_method') or None
+        methods = {choice for choice, label in Payment.PAYMENT_METHOD_CHOICES} | {ReconciliationService.ALL_METHODS}
+        if payment_method and payment_method not in methods:
+            return Response({'error': f"Unknown payment_method '{payment_method}'"}, status=status.HTTP_400_BAD_REQUEST)
         
-        doc.build(elements)
-        return response
-
+        try:
+            report = ReconciliationService.reconcile(
+                ReconciliationService.read_statement(upload),
+                date_from,
+                date_to,
+                provider=request.data.get('provider') or 'Mobile Money',
+                payment_method=payment_method,
+                created_by=request.user
+            )
+        except (ReconciliationError, UnicodeDecodeError, csv.Error) as e:
+            return Response({'error': f'Could not read the statement: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(ReconciliationReportSerializer(report).data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['get'])
+    def items(self, request, pk=None):
+        """Paginated report lines, optionally filtered by ?result="""
+        report = self.get_object()
+        items = report.items.select_related('payment').order_by('item_id')
+        result = request.query_params.get('result')
+        if result:
+            items = items.filter(result=result)
+        
+        page = self.paginate_queryset(items)
+        serializer = ReconciliationItemSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 class SMSNotificationViewSet(viewsets.ReadOnlyModelViewSet):
     """SMS Notification logs (All authenticated users, filtered by household)"""
@@ -1071,24 +1483,29 @@ def dashboard_stats(request):
     """Get dashboard statistics"""
     user = request.user
     
-    # Base querysets
+    # Household users read their maintained account summary
     if user.role == 'Household':
-        try:
-            household = user.household
-            households = Household.objects.filter(household_id=household.household_id)
-            bills = Bill.objects.filter(household=household)
-            payments = Payment.objects.filter(bill__household=household)
-            water_usage = WaterUsage.objects.filter(household=household)
-        except:
-            households = Household.objects.none()
-            bills = Bill.objects.none()
-            payments = Payment.objects.none()
-            water_usage = WaterUsage.objects.none()
-    else:
-        households = Household.objects.all()
-        bills = Bill.objects.all()
-        payments = Payment.objects.all()
-        water_usage = WaterUsage.objects.all()
+        summary = HouseholdAccountSummary.objects.select_related('household').filter(household__user=user).first()
+        if summary is None:
+            stats = dict.fromkeys(DashboardStatsSerializer().fields, 0)
+        else:
+            this_month = datetime.now().strftime('%Y-%m')
+            stats = {
+                'total_households': 1,
+                'active_connections': 1 if summary.household.status == 'Active' else 0,
+                'monthly_revenue': summary.paid_this_month if summary.paid_month == this_month else Decimal('0'),
+                'pending_bills': summary.pending_bills_count,
+                'total_bills': summary.bills_count,
+                'total_payments': summary.payments_count,
+                'total_water_consumed': summary.total_liters_used,
+            }
+        return Response(DashboardStatsSerializer(stats).data, status=status.HTTP_200_OK)
+    
+    # Base querysets
+    households = Household.objects.all()
+    bills = Bill.objects.all()
+    payments = Payment.objects.all()
+    water_usage = WaterUsage.objects.all()
     
     # Calculate statistics
     total_households = households.count()
@@ -1122,6 +1539,35 @@ def dashboard_stats(request):
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+def _as_of_date(request):
+    """?as_of=YYYY-MM-DD, default today; raises ValueError"""
+    as_of = request.query_params.get('as_of')
+    return datetime.strptime(as_of, '%Y-%m-%d').date() if as_of else date.today()
+
+
+@api_view(['GET'])
+@permission_classes([IsManagerOrAdmin])
+def dashboard_receivables(request):
+    """
+    Total receivables at ?as_of=YYYY-MM-DD (default today), or at each month
+    end from ?from=YYYY-MM to ?to=YYYY-MM (default last month)
+    """
+    try:
+        if request.query_params.get('from'):
+            first = month_end(datetime.strptime(request.query_params['from'], '%Y-%m').strftime('%Y-%m'))
+            last = request.query_params.get('to')
+            last = month_end(datetime.strptime(last, '%Y-%m').strftime('%Y-%m')) if last else previous_month_end()
+            month_ends = [first]
+            while month_ends[-1] < last and len(month_ends) < 120:
+                month_ends.append(month_end((month_ends[-1] + timedelta(days=1)).strftime('%Y-%m')))
+            return Response([BalanceService.receivables(as_of) for as_of in month_ends], status=status.HTTP_200_OK)
+        as_of = _as_of_date(request)
+    except ValueError:
+        return Response({'error': 'Use YYYY-MM-DD for as_of and YYYY-MM for from/to'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response(BalanceService.receivables(as_of), status=status.HTTP_200_OK)
+
+
 @api_view(['GET'])
 @permission_classes([IsManagerOrAdmin])
 def dashboard_charts(request):
@@ -1175,6 +1621,53 @@ def dashboard_charts(request):
     }, status=status.HTTP_200_OK)
 
 
+# ============================================
+# Device Sync
+# ============================================
+
+@api_view(['GET'])
+@permission_classes([IsManagerOrAdmin])
+def sync_changes(request):
+    """
+    Households, usages, tariffs and bills changed since ?cursor= (omit it for
+    a full copy), at most ?limit= of each kind, optionally only ?village=.
+    Call again with the returned cursor while has_more is true.
+    """
+    limit = request.query_params.get('limit')
+    if limit is not None and (not limit.isdigit() or not 0 < int(limit) <= SyncService.MAX_LIMIT):
+        return Response({'error': f'limit must be between 1 and {SyncService.MAX_LIMIT}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        result = SyncService.changes(
+            cursor=request.query_params.get('cursor') or None,
+            limit=int(limit) if limit else None,
+            village=request.query_params.get('village') or None
+        )
+    except SyncError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response(result, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsManagerOrAdmin])
+def sync_readings(request):
+    """Upload readings queued offline as {"readings": [...]}; returns one result per reading"""
+    readings = request.data.get('readings') if isinstance(request.data, dict) else request.data
+    if not isinstance(readings, list) or not all(isinstance(reading, dict) for reading in readings):
+        return Response({'error': 'Send the queued readings as a JSON array'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        result = SyncService.upload_readings(readings, recorded_by=request.user)
+    except IntegrityError:
+        return Response(
+            {'error': 'Some of these readings were recorded by another upload at the same time; send the batch again'},
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    return Response(result, status=status.HTTP_200_OK)
+
+
 class NotificationViewSet(viewsets.ModelViewSet):
     """Notification views"""
     serializer_class = NotificationSerializer
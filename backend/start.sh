@@ -3,6 +3,13 @@
 # Exit on error
 set -e
 
+# "start.sh worker" runs the billing worker in the foreground, as its own
+# service, so the process supervisor restarts it if it dies
+if [ "$1" = "worker" ]; then
+    echo "🧾 Starting billing worker..."
+    exec python manage.py process_billing_jobs
+fi
+
 echo "🚀 Starting Village Water System Backend..."
 
 # Run migrations
@@ -12,4 +19,4 @@ python manage.py migrate --noinput
 
 # Start Gunicorn
 echo "🌐 Starting Gunicorn on port $PORT..."
-gunicorn VillageWaterSystem.wsgi --bind 0.0.0.0:$PORT --workers 2 --timeout 120
+exec gunicorn VillageWaterSystem.wsgi --bind 0.0.0.0:$PORT --workers 2 --timeout 120